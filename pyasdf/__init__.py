@@ -16,8 +16,8 @@ from ._internal_init import *
 
 if _PYASDF_SETUP_ is False:
     __all__ = ['AsdfFile', 'AsdfType', 'AsdfExtension',
-               'Stream', 'open', 'test', 'commands',
-               'ValidationError']
+               'Stream', 'open', 'open_async', 'open_many', 'scan', 'test',
+               'commands', 'ValidationError']
 
     try:
         import yaml as _
@@ -46,3 +46,6 @@ if _PYASDF_SETUP_ is False:
         pass
 
     open = AsdfFile.open
+    open_async = AsdfFile.open_async
+    open_many = AsdfFile.open_many
+    scan = AsdfFile.scan
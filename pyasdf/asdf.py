@@ -5,19 +5,30 @@ from __future__ import absolute_import, division, unicode_literals, print_functi
 
 import datetime
 import copy
+import functools
 import io
+import itertools
+import multiprocessing
 import re
+import threading
 
 import numpy as np
 
+import six
+from six.moves import cPickle as pickle
+from six.moves import queue
+
 from .extern import semver
 
 from . import block
 from . import constants
 from . import extension
+from . import external_cache
 from . import generic_io
+from . import lazy
 from . import reference
 from . import schema
+from . import tagged
 from . import treeutil
 from . import util
 from . import version
@@ -25,6 +36,7 @@ from . import versioning
 from . import yamlutil
 
 from .tags.core import AsdfObject, Software, HistoryEntry
+from .tags.core.ndarray import NDArrayType
 
 
 def get_asdf_library_info():
@@ -40,6 +52,96 @@ def get_asdf_library_info():
     })
 
 
+def _run_in_executor(func, loop=None, executor=None):
+    """
+    Run `func` in an executor, returning an `asyncio.Future` for its
+    result.  The I/O done by `func` is still blocking, but it blocks
+    a thread of the executor rather than the event loop.
+    """
+    try:
+        import asyncio
+    except ImportError:
+        raise ImportError(
+            "Asynchronous reading requires the asyncio module, which is "
+            "available on Python 3.4 and later.")
+
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    return loop.run_in_executor(executor, func)
+
+
+def _copy_to_new_asdf(asdffile, node):
+    # Used to copy the tree for ``AsdfFile(other)``, which shares the
+    # values in it except where the ``copy_to_new_asdf`` hooks replace
+    # them
+    hook = asdffile.type_index.get_hook_for_type(
+        'copy_to_new_asdf', type(node), asdffile.version_string)
+    if hook is not None:
+        return hook(node, asdffile)
+    return node
+
+
+def _copy_leaf(asdffile, node):
+    # Used to copy the tree for `AsdfFile.copy`
+    if isinstance(node, NDArrayType):
+        array = node._make_array_copy()
+        asdffile.blocks.set_array_storage(
+            asdffile.blocks[array], node.block.array_storage)
+        return array
+    elif isinstance(node, (dict, list, tuple)):
+        return node
+    return copy.deepcopy(node)
+
+
+def _open_many_worker(args):
+    # Runs in the worker processes of AsdfFile.open_many.  Any
+    # exception is sent back to be raised in the parent process.  The
+    # result is pickled here, so that one that can't be pickled is
+    # reported as an error too: on Python 2, the pool drops a result
+    # that fails to pickle, and the parent would wait for it forever.
+    cls, path, fields, mode, extensions, do_not_fill_defaults = args
+    try:
+        if mode == 'metadata':
+            value = cls.scan(path, fields=fields, extensions=extensions)
+        else:
+            self = cls(extensions=extensions)
+            value = cls._open_impl(
+                self, path, do_not_fill_defaults=do_not_fill_defaults,
+                _get_tagged_tree=True)
+        return path, True, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        try:
+            return path, False, pickle.dumps(e, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return path, False, pickle.dumps(
+                RuntimeError("{0}: {1}".format(type(e).__name__, e)),
+                pickle.HIGHEST_PROTOCOL)
+
+
+def _strip_tag(node):
+    if isinstance(node, tagged.Tagged):
+        if isinstance(node, tagged.TaggedString):
+            return six.text_type(node)
+        return node.data
+    return node
+
+
+def _open_handle(handle, read_tree=True):
+    # Unpickles an `AsdfFile`, or with ``read_tree=False``, the file
+    # that a pickled `NDArrayType` reads its block from
+    return handle._open(read_tree)
+
+
+class _BlocksHandle(object):
+    # Shared by the arrays of a file when they are pickled, so that
+    # they share the file they are unpickled into as well
+    def __init__(self, handle):
+        self._handle = handle
+
+    def __reduce__(self):
+        return (_open_handle, (self._handle, False))
+
+
 class AsdfFile(versioning.VersionedMixin):
     """
     The main class that represents a ASDF file.
@@ -82,7 +184,17 @@ class AsdfFile(versioning.VersionedMixin):
         self._fd = None
         self._external_asdf_by_uri = {}
         self._blocks = block.BlockManager(self)
+        # Serializes the block I/O done by the asynchronous methods
+        self._async_lock = threading.RLock()
         self._uri = None
+        # The tagged tree the tree was last converted to, and which
+        # parts of it are known to be valid
+        self._tagged_tree_cache = yamlutil.TaggedTreeCache()
+        # Where the tree is in the file it was read from, and the
+        # options it was opened with, for `get_handle`
+        self._tree_range = None
+        self._open_options = None
+        self._blocks_handle = None
         if tree is None:
             self.tree = {}
         elif isinstance(tree, AsdfFile):
@@ -92,9 +204,7 @@ class AsdfFile(versioning.VersionedMixin):
             self._uri = tree.uri
             # Set directly to self._tree (bypassing property), since
             # we can assume the other AsdfFile is already valid.
-            self._tree = tree.tree
-            self.run_modifying_hook('copy_to_new_asdf', validate=False)
-            self.find_references()
+            self._copy_tree_from(tree, _copy_to_new_asdf)
         else:
             self.tree = tree
             self.find_references()
@@ -116,7 +226,8 @@ class AsdfFile(versioning.VersionedMixin):
             self._fd.__exit__(type, value, traceback)
             self._fd = None
         for external in self._external_asdf_by_uri.values():
-            external.__exit__(type, value, traceback)
+            if not external_cache.release(external):
+                external.__exit__(type, value, traceback)
         self._external_asdf_by_uri.clear()
         self._blocks.close()
 
@@ -137,19 +248,112 @@ class AsdfFile(versioning.VersionedMixin):
             self._fd.close()
             self._fd = None
         for external in self._external_asdf_by_uri.values():
-            external.close()
+            if not external_cache.release(external):
+                external.close()
         self._external_asdf_by_uri.clear()
         self._blocks.close()
 
     def copy(self):
-        return self.__class__(
-            copy.deepcopy(self._tree),
-            self._uri,
-            self._extensions
-        )
+        """
+        Make a copy of the file.
+
+        The tree is copied in full, except that arrays memory-mapped
+        from a file opened read-only are copied as private mappings of
+        the same part of the file, which share their memory with the
+        originals until they are modified.
+
+        Returns
+        -------
+        asdffile : AsdfFile
+        """
+        asdffile = self.__class__(uri=self._uri, extensions=self._extensions)
+        asdffile._copy_tree_from(self, _copy_leaf)
+        return asdffile
 
     __copy__ = __deepcopy__ = copy
 
+    def _copy_tree_from(self, other, copy_leaf):
+        # Copy the tree of the other file to this one, finding the
+        # references in it in the same pass.  The tree of the other
+        # file is left as it is.
+        def copy_node(node, json_id):
+            if isinstance(node, dict) and '$ref' in node:
+                return reference.Reference(
+                    node['$ref'], json_id, asdffile=self)
+            return copy_leaf(self, node)
+
+        tree = treeutil.walk_and_modify(other._tree, copy_node)
+        if isinstance(tree, tagged.TaggedDict):
+            # The root of a lazy tree is tagged
+            tree = tree.data
+        self._tree = AsdfObject(tree)
+
+    def get_handle(self, include_tree=False):
+        """
+        Get a small, picklable handle to the file, which can be used to
+        open it again, for example in another process.
+
+        The handle records the URI of the file, and where its tree and
+        the blocks found so far are in it, so that the file can be
+        opened without reading its structure again.  It refers to the
+        file as it is stored: changes to the tree or the arrays that
+        haven't been written with `update` are not included.
+
+        Pickling an `AsdfFile` pickles it as its handle, and unpickling
+        opens the file again.  Likewise, arrays in the tree that are
+        stored in the file are pickled as references to their blocks,
+        and only the ones that are used are read (or memory mapped)
+        once unpickled.
+
+        Parameters
+        ----------
+        include_tree : bool, optional
+            When `True`, include the YAML tree in the handle, so that it
+            doesn't have to be read from the file again.  This is most
+            useful for remote files.
+
+        Returns
+        -------
+        handle : AsdfFileHandle
+
+        Raises
+        ------
+        ValueError :
+            The file wasn't opened from a URI.
+        """
+        fd = self._fd
+        if fd is None or fd.uri is None or self._open_options is None:
+            raise ValueError(
+                "Only files opened from a URI have a handle")
+
+        tree = None
+        if include_tree and self._tree_range is not None:
+            start, end = self._tree_range
+            tree = fd.read_range(start, end - start)
+
+        extensions = [
+            x for x in self._extensions._extensions
+            if not isinstance(x, extension.BuiltinExtension)]
+
+        return AsdfFileHandle(
+            self.__class__, fd.uri, fd.mode, extensions or None,
+            self._open_options, self._tree_range,
+            self._blocks.get_stored_offsets(fd), tree)
+
+    def _get_blocks_handle(self):
+        # Used to pickle the arrays read from the file.  `None` if
+        # there is no handle.
+        if self._blocks_handle is None:
+            try:
+                handle = self.get_handle()
+            except ValueError:
+                return None
+            self._blocks_handle = _BlocksHandle(handle)
+        return self._blocks_handle
+
+    def __reduce__(self):
+        return (_open_handle, (self.get_handle(),))
+
     @property
     def uri(self):
         """
@@ -200,7 +404,9 @@ class AsdfFile(versioning.VersionedMixin):
         """
         Open an external ASDF file, from the given (possibly relative)
         URI.  There is a cache (internal to this ASDF file) that ensures
-        each external ASDF file is loaded only once.
+        each external ASDF file is loaded only once.  The files can
+        also be shared with other ASDF files in the process, by
+        setting `external_cache.cache`.
 
         Parameters
         ----------
@@ -227,9 +433,15 @@ class AsdfFile(versioning.VersionedMixin):
 
         asdffile = self._external_asdf_by_uri.get(resolved_uri)
         if asdffile is None:
-            asdffile = self.open(
-                resolved_uri,
-                do_not_fill_defaults=do_not_fill_defaults)
+            cache = external_cache.cache
+            if cache is not None:
+                asdffile = cache.acquire(
+                    resolved_uri, self.open,
+                    do_not_fill_defaults=do_not_fill_defaults)
+            else:
+                asdffile = self.open(
+                    resolved_uri,
+                    do_not_fill_defaults=do_not_fill_defaults)
             self._external_asdf_by_uri[resolved_uri] = asdffile
         return asdffile
 
@@ -255,10 +467,31 @@ class AsdfFile(versioning.VersionedMixin):
         """
         return self._comments
 
-    def _validate(self, tree):
-        tagged_tree = yamlutil.custom_tree_to_tagged_tree(
-            tree, self)
-        schema.validate(tagged_tree, self)
+    def _validate(self, tree, validate='full'):
+        # Validates the tree and returns the tagged tree it was
+        # converted to, which is shared with the cache and must not be
+        # modified.  The parts of the tree that are the same as when it
+        # was last converted keep their tagged nodes, and those that
+        # were found to be valid then aren't validated again, so only
+        # the parts that changed (and the nodes above them) are.
+        cache = self._tagged_tree_cache
+        tagged_tree = cache.convert(tree, self)
+        validated = cache.validated
+        if validate == 'none' or validated in ('full', validate):
+            return tagged_tree
+
+        self._valid_subtrees = cache.valid_subtrees
+        try:
+            if validate == 'full':
+                schema.validate(tagged_tree, self)
+            else:
+                schema.validate_structure(tagged_tree, self)
+                schema.validate_large_literals(
+                    tagged_tree, cache.valid_subtrees)
+        finally:
+            del self._valid_subtrees
+        cache.set_validated(self, validate)
+        return tagged_tree
 
     def validate(self):
         """
@@ -419,14 +652,7 @@ class AsdfFile(versioning.VersionedMixin):
         return None
 
     @classmethod
-    def _open_impl(cls, self, fd, uri=None, mode='r',
-                   validate_checksums=False,
-                   do_not_fill_defaults=False,
-                   _get_yaml_content=False):
-        fd = generic_io.get_file(fd, mode=mode, uri=uri)
-
-        self._fd = fd
-
+    def _read_header(cls, self, fd):
         try:
             header_line = fd.read_until(b'\r?\n', 2, "newline", include=True)
         except ValueError:
@@ -442,22 +668,61 @@ class AsdfFile(versioning.VersionedMixin):
         if version is not None:
             self.version = version
 
+    @classmethod
+    def _open_impl(cls, self, fd, uri=None, mode='r',
+                   validate_checksums=False,
+                   do_not_fill_defaults=False,
+                   lazy_tree=False,
+                   _get_yaml_content=False,
+                   _get_tagged_tree=False,
+                   _tagged_tree=None,
+                   _handle=None):
+        fd = generic_io.get_file(fd, mode=mode, uri=uri)
+
+        self._fd = fd
+        self._open_options = (do_not_fill_defaults, lazy_tree)
+
+        cls._read_header(self, fd)
+
+        if _handle is not None and not fd.seekable():
+            _handle = None
+
         yaml_token = fd.read(4)
         yaml_content = b''
         tree = {}
         has_blocks = False
-        if yaml_token == b'%YAM':
+        if yaml_token == b'%YAM' and _handle is not None:
+            # Where the tree and the blocks are is already known
+            tree_start, tree_end = _handle._tree_range
+            content = _handle.tree
+            if content is None:
+                content = fd.read_range(tree_start, tree_end - tree_start)
+            tree = yamlutil.load_tree(content, self)
+            self._tree_range = _handle._tree_range
+            if _handle.block_offsets:
+                self._blocks.add_unloaded_blocks(fd, _handle.block_offsets)
+            else:
+                fd.seek(tree_end)
+                has_blocks = fd.seek_until(
+                    constants.BLOCK_MAGIC, 4, include=True)
+        elif yaml_token == b'%YAM':
+            if fd.seekable():
+                tree_start = fd.tell() - len(yaml_token)
             reader = fd.reader_until(
                 constants.YAML_END_MARKER_REGEX, 7, 'End of YAML marker',
                 include=True, initial_content=yaml_token)
 
             if _get_yaml_content:
                 yaml_content = reader.read()
+            elif _tagged_tree is not None:
+                tree = _tagged_tree
             else:
                 # We parse the YAML content into basic data structures
                 # now, but we don't do anything special with it until
                 # after the blocks have been read
                 tree = yamlutil.load_tree(reader, self)
+                if fd.seekable():
+                    self._tree_range = (tree_start, fd.tell())
             has_blocks = fd.seek_until(constants.BLOCK_MAGIC, 4, include=True)
         elif yaml_token == constants.BLOCK_MAGIC:
             has_blocks = True
@@ -469,15 +734,34 @@ class AsdfFile(versioning.VersionedMixin):
             fd.close()
             return yaml_content
 
+        # For open_many: the worker processes only fill in the defaults
+        # and validate, and return the tagged tree
+        if _get_tagged_tree:
+            fd.close()
+            if not do_not_fill_defaults:
+                schema.fill_defaults(tree, self)
+            schema.validate(tree, self)
+            return tree
+
         if has_blocks:
             self._blocks.read_internal_blocks(
                 fd, past_magic=True, validate_checksums=validate_checksums)
             self._blocks.read_block_index(fd, self)
 
+        if lazy_tree:
+            # The post_read hooks are run as each subtree is converted
+            self._tree = lazy.make_lazy_tree(
+                tree, self, do_not_fill_defaults=do_not_fill_defaults)
+            return self
+
         tree = reference.find_references(tree, self)
-        if not do_not_fill_defaults:
-            schema.fill_defaults(tree, self)
-        self._validate(tree)
+        if _tagged_tree is None:
+            if not do_not_fill_defaults:
+                schema.fill_defaults(tree, self)
+            # Not through the cache, which would keep the tree as read
+            # from the file alive
+            schema.validate(
+                yamlutil.custom_tree_to_tagged_tree(tree, self), self)
         tree = yamlutil.tagged_tree_to_custom_tree(tree, self)
 
         self._tree = tree
@@ -489,7 +773,8 @@ class AsdfFile(versioning.VersionedMixin):
     def open(cls, fd, uri=None, mode='r',
              validate_checksums=False,
              extensions=None,
-             do_not_fill_defaults=False):
+             do_not_fill_defaults=False,
+             lazy_tree=False):
         """
         Open an existing ASDF file.
 
@@ -519,6 +804,15 @@ class AsdfFile(versioning.VersionedMixin):
         do_not_fill_defaults : bool, optional
             When `True`, do not fill in missing default values.
 
+        lazy_tree : bool, optional
+            When `True`, the tree is not converted to custom types
+            when the file is opened.  Instead, ``tree`` is a
+            `lazy.LazyDict`, and each node is converted (and
+            validated) the first time it is accessed.  This makes
+            opening files with large trees much faster when only some
+            of the tree is used.  The file must be kept open until
+            all of the nodes that are needed have been accessed.
+
         Returns
         -------
         asdffile : AsdfFile
@@ -529,7 +823,355 @@ class AsdfFile(versioning.VersionedMixin):
         return cls._open_impl(
             self, fd, uri=uri, mode=mode,
             validate_checksums=validate_checksums,
-            do_not_fill_defaults=do_not_fill_defaults)
+            do_not_fill_defaults=do_not_fill_defaults,
+            lazy_tree=lazy_tree)
+
+    @classmethod
+    def scan(cls, fd, fields=None, uri=None, extensions=None):
+        """
+        Quickly read the metadata in an ASDF file, for example to
+        build a catalog of many files.
+
+        Only the header, the YAML tree and the block headers are
+        read.  Unlike `open`, the tree is not validated, missing
+        default values are not filled in, and nothing is converted
+        to custom types.
+
+        Parameters
+        ----------
+        fd : string or file-like object
+            May be a string ``file`` or ``http`` URI, or a Python
+            file-like object.
+
+        fields : list of str, optional
+            The top-level keys of the tree to read.  When provided,
+            all other keys are skipped, and parsing of the YAML stops
+            as soon as they have all been found, if the YAML parser
+            in use allows it.
+
+        uri : string, optional
+            The URI of the file.  Only required if the URI can not be
+            automatically determined from `fd`.
+
+        extensions : list of AsdfExtension
+            A list of extensions to the ASDF to support when reading
+            and writing ASDF files.  See `asdftypes.AsdfExtension` for
+            more information.
+
+        Returns
+        -------
+        tree : dict
+            The tree, made only of dicts, lists, strings and numbers.
+            Tags are dropped.
+
+        blocks : list of dict or None
+            A summary of each of the internal blocks, in order, with
+            the keys ``offset``, ``allocated_size``, ``used_size``,
+            ``data_size`` and ``compression``.  The sizes are those in
+            the block headers, which don't include the headers
+            themselves.  The summary is taken from the block index when
+            the file has one.  `None` if the file is not seekable, since
+            the blocks could then only be found by reading all of their
+            data.
+        """
+        self = cls(extensions=extensions)
+        self._fd = fd = generic_io.get_file(fd, mode='r', uri=uri)
+
+        try:
+            cls._read_header(self, fd)
+
+            yaml_token = fd.read(4)
+            tree = {}
+            has_blocks = False
+            if yaml_token == b'%YAM':
+                reader = fd.reader_until(
+                    constants.YAML_END_MARKER_REGEX, 7, 'End of YAML marker',
+                    include=True, initial_content=yaml_token)
+                tree = yamlutil.load_tree(reader, self, fields=fields)
+                if fd.seekable():
+                    has_blocks = fd.seek_until(
+                        constants.BLOCK_MAGIC, 4, include=True)
+            elif yaml_token == constants.BLOCK_MAGIC:
+                has_blocks = True
+            elif yaml_token != b'':
+                raise IOError(
+                    "ASDF file appears to contain garbage after header.")
+
+            blocks = None
+            if fd.seekable():
+                if has_blocks:
+                    self._blocks.read_internal_blocks(fd, past_magic=True)
+                    self._blocks.read_block_index(fd, self)
+                    self._blocks.finish_reading_internal_blocks()
+                blocks = [
+                    {'offset': block.offset,
+                     'allocated_size': block.allocated,
+                     'used_size': block._size,
+                     'data_size': block._data_size,
+                     'compression': block.compression}
+                    for block in self._blocks.internal_blocks]
+        finally:
+            self.close()
+
+        return treeutil.walk_and_modify(tree, _strip_tag), blocks
+
+    @classmethod
+    def open_many(cls, paths, workers=None, fields=None, mode='full',
+                  ordered=True, max_pending=None, extensions=None,
+                  do_not_fill_defaults=False, errors='raise'):
+        """
+        Open many ASDF files, parsing their trees in parallel in a
+        pool of processes.
+
+        Parsing the YAML and validating the tree are done in the
+        worker processes.  In ``'full'`` mode, the validated tree is
+        sent back to this process, where it is converted to custom
+        types.  The file is then opened again, but only to read its
+        block headers, so array data is memory mapped or read lazily
+        in this process, rather than copied from the workers.
+
+        Parameters
+        ----------
+        paths : iterable of str
+            The paths or URIs of the files to open.  It is consumed
+            only as the workers need more files to read.
+
+        workers : int, optional
+            The number of worker processes.  Defaults to the number
+            of CPUs.
+
+        fields : list of str, optional
+            Only in ``'metadata'`` mode: the top-level keys of the
+            trees to read.  See `scan`.
+
+        mode : str, optional
+            ``'full'`` (default) yields an `AsdfFile` for each path,
+            just like `open`.  Each must be closed by the caller.
+            ``'metadata'`` yields the ``(tree, blocks)`` tuple returned
+            by `scan`.
+
+        ordered : bool, optional
+            When `True` (default), the results are yielded in the
+            order of ``paths``.  Otherwise, they are yielded as soon
+            as they are ready.
+
+        max_pending : int, optional
+            The maximum number of files that are read ahead of the
+            consumer of the results.  Once this many results are
+            waiting, no more files are given to the workers until some
+            of them are consumed.  Defaults to twice the number of
+            workers.
+
+        extensions, do_not_fill_defaults
+            See `open`.  The extensions must be picklable.
+
+        errors : str, optional
+            What to do when a file can not be opened.  ``'raise'``
+            (default) raises the exception when the result of the
+            file is reached, which ends the iteration.  ``'yield'``
+            yields the exception in place of the result, and goes on
+            with the other files.  With ``ordered=True``, the position
+            of the exception tells which file it is for.
+
+        Returns
+        -------
+        results : iterator
+            An `AsdfFile` or ``(tree, blocks)`` tuple for each path.
+        """
+        if mode not in ('full', 'metadata'):
+            raise ValueError(
+                "mode must be 'full' or 'metadata', got {0!r}".format(mode))
+        if errors not in ('raise', 'yield'):
+            raise ValueError(
+                "errors must be 'raise' or 'yield', got {0!r}".format(errors))
+        if fields is not None and mode != 'metadata':
+            raise ValueError("fields is only supported in 'metadata' mode")
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if max_pending is None:
+            max_pending = 2 * workers
+        max_pending = max(max_pending, 1)
+        # The pool pickles the arguments for the workers in a thread of
+        # its own, which on Python 2 can't report a failure, so they
+        # are checked here
+        pickle.dumps((cls, fields, extensions), pickle.HIGHEST_PROTOCOL)
+
+        return cls._open_many(
+            paths, workers, fields, mode, ordered, max_pending,
+            extensions, do_not_fill_defaults, errors)
+
+    @classmethod
+    def _open_many(cls, paths, workers, fields, mode, ordered, max_pending,
+                   extensions, do_not_fill_defaults, errors):
+        # A generator, separate from open_many so that the arguments
+        # are checked when open_many is called
+        results = queue.Queue()
+        paths = enumerate(paths)
+        # The number of results that are being worked on or have not
+        # yet been yielded
+        pending = [0]
+
+        def submit():
+            for i, path in itertools.islice(paths, 1):
+                kwargs = {}
+                if six.PY3:
+                    # Errors in the pool itself, since the worker sends
+                    # back its own errors
+                    kwargs['error_callback'] = (
+                        lambda e, i=i, path=path:
+                        results.put((i, (path, False, e))))
+                pool.apply_async(
+                    _open_many_worker,
+                    ((cls, path, fields, mode, extensions,
+                      do_not_fill_defaults),),
+                    callback=lambda result, i=i: results.put((i, result)),
+                    **kwargs)
+                pending[0] += 1
+
+        def get_result(path, success, value):
+            if isinstance(value, bytes):
+                value = pickle.loads(value)
+            if not success:
+                raise value
+            if mode == 'metadata':
+                return value
+            self = cls(extensions=extensions)
+            return cls._open_impl(
+                self, path, do_not_fill_defaults=do_not_fill_defaults,
+                _tagged_tree=value)
+
+        def finish(result):
+            pending[0] -= 1
+            try:
+                return get_result(*result)
+            except Exception as e:
+                if errors == 'raise':
+                    raise
+                return e
+
+        pool = multiprocessing.Pool(workers)
+        try:
+            for i in range(max_pending):
+                submit()
+
+            waiting = {}
+            next_index = 0
+            while pending[0]:
+                i, result = results.get()
+                if not ordered:
+                    yield finish(result)
+                    submit()
+                    continue
+                waiting[i] = result
+                while next_index in waiting:
+                    result = waiting.pop(next_index)
+                    next_index += 1
+                    yield finish(result)
+                    submit()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    @classmethod
+    def open_async(cls, fd, uri=None, mode='r',
+                   validate_checksums=False,
+                   extensions=None,
+                   do_not_fill_defaults=False,
+                   lazy_tree=False,
+                   loop=None, executor=None):
+        """
+        Open an existing ASDF file without blocking the event loop.
+
+        The file is opened, and its tree parsed, in an executor.  As
+        with `open`, the array data is not read until it is needed:
+        use `load_array_async` to load it without blocking.
+
+        The reads themselves are the same blocking reads as those of
+        `open`, only moved off the event loop to the executor.  There
+        is no asynchronous I/O underneath, so each file being read
+        takes up a thread (or process) of the executor.
+
+        Requires Python 3.4 or later.
+
+        Parameters
+        ----------
+        fd, uri, mode, validate_checksums, extensions, do_not_fill_defaults, lazy_tree
+            See `open`.
+
+        loop : asyncio event loop, optional
+            The event loop to use.  If not provided, uses the current
+            event loop.
+
+        executor : concurrent.futures.Executor, optional
+            The executor to perform the I/O in.  If not provided, uses
+            the default executor of the event loop.
+
+        Returns
+        -------
+        future : asyncio.Future
+            A future whose result is the new AsdfFile object.
+        """
+        return _run_in_executor(
+            functools.partial(
+                cls.open, fd, uri=uri, mode=mode,
+                validate_checksums=validate_checksums,
+                extensions=extensions,
+                do_not_fill_defaults=do_not_fill_defaults,
+                lazy_tree=lazy_tree),
+            loop=loop, executor=executor)
+
+    def load_array_async(self, path, loop=None, executor=None):
+        """
+        Load the data of an array in the tree without blocking the
+        event loop.
+
+        The block containing the array is read (and decompressed, if
+        necessary) in an executor, with the same blocking reads as
+        when the array is accessed in the tree.  Loads started on the
+        same `AsdfFile` are performed one at a time, since they share
+        a single file handle.
+
+        Requires Python 3.4 or later.
+
+        Parameters
+        ----------
+        path : str or list of str and int
+            The location of the array in the tree, either as a JSON
+            Pointer (e.g. ``'/science_data'``) or as a list of the parts
+            of the path (e.g. ``['science_data']``).  If the path
+            points to a reference, the reference is resolved.
+
+        loop : asyncio event loop, optional
+            The event loop to use.  If not provided, uses the current
+            event loop.
+
+        executor : concurrent.futures.Executor, optional
+            The executor to perform the I/O in.  If not provided, uses
+            the default executor of the event loop.
+
+        Returns
+        -------
+        future : asyncio.Future
+            A future whose result is the Numpy array.
+        """
+        if not isinstance(path, six.string_types):
+            path = '/'.join(
+                six.text_type(x).replace(u"~", u"~0").replace(u"/", u"~1")
+                for x in path)
+
+        def load():
+            with self._async_lock:
+                node = reference.resolve_fragment(self.tree, path)
+                if isinstance(node, reference.Reference):
+                    node = node()
+                if isinstance(node, NDArrayType):
+                    node = node._make_array()
+                if not isinstance(node, np.ndarray):
+                    raise TypeError(
+                        "'{0}' does not point to an array".format(path))
+                return node
+
+        return _run_in_executor(load, loop=loop, executor=executor)
 
     def _write_tree(self, tree, fd, pad_blocks):
         fd.write(constants.ASDF_MAGIC)
@@ -544,15 +1186,48 @@ class AsdfFile(versioning.VersionedMixin):
         fd.write(b'\n')
 
         if len(tree):
-            yamlutil.dump_tree(tree, fd, self)
+            yamlutil.dump_tree(
+                tree, fd, self,
+                validate=getattr(self, '_validate_on_write', 'full'))
+
+        self._pad_tree(fd, pad_blocks)
 
+    def _pad_tree(self, fd, pad_blocks):
+        reserve_tree_space = getattr(self, '_reserve_tree_space', 0)
+        if reserve_tree_space:
+            fd.fast_forward(reserve_tree_space)
         if pad_blocks:
             padding = util.calculate_padding(
                 fd.tell(), pad_blocks, fd.block_size)
             fd.fast_forward(padding)
 
     def _pre_write(self, fd, all_array_storage, all_array_compression,
-                   auto_inline):
+                   auto_inline, validate='full', reserve_tree_space=0):
+        # Sets up the state used while writing, which `_post_write`
+        # clears again
+        try:
+            self._setup_write(
+                all_array_storage, all_array_compression, auto_inline,
+                validate, reserve_tree_space)
+        except:
+            self._clear_write_state()
+            raise
+
+    def _setup_write(self, all_array_storage, all_array_compression,
+                     auto_inline, validate, reserve_tree_space):
+        if validate not in ('none', 'structure', 'full'):
+            raise ValueError(
+                "Invalid value for validate: '{0}'".format(validate))
+        self._validate_on_write = validate
+
+        if (isinstance(reserve_tree_space, bool) or
+            not isinstance(reserve_tree_space, six.integer_types) or
+            reserve_tree_space < 0):
+            raise ValueError(
+                "Invalid value for reserve_tree_space: '{0}'".format(
+                    reserve_tree_space))
+        self._reserve_tree_space = reserve_tree_space
+
         if all_array_storage not in (None, 'internal', 'external', 'inline'):
             raise ValueError(
                 "Invalid value for all_array_storage: '{0}'".format(
@@ -573,47 +1248,107 @@ class AsdfFile(versioning.VersionedMixin):
         else:
             self._auto_inline = None
 
-        if len(self._tree):
-            self.run_hook('pre_write')
+        # The tree is walked once to find the nodes for all of the
+        # hooks run while writing.  The pre_write hooks may change the
+        # tree, so if any of them ran, it is walked again to find the
+        # nodes for the others.
+        hooknames = ['pre_write', 'reserve_blocks', 'post_write']
+        self._write_hooks = self.type_index.find_hooks(
+            self._tree, hooknames, self.version_string)
+        if self._write_hooks['pre_write']:
+            for hook, node in self._write_hooks['pre_write']:
+                hook(node, self)
+            self._write_hooks = self.type_index.find_hooks(
+                self._tree, hooknames[1:], self.version_string)
 
         # This is where we'd do some more sophisticated block
         # reorganization, if necessary
         self._blocks.finalize(self)
 
-        self._tree['asdf_library'] = get_asdf_library_info()
-
-    def _serial_write(self, fd, pad_blocks, include_block_index):
-        self._write_tree(self._tree, fd, pad_blocks)
+        # The entry from before is kept when it's the same, so that the
+        # tree isn't validated again for it
+        asdf_library = get_asdf_library_info()
+        old = self._tree.get('asdf_library')
+        if not isinstance(old, Software) or old != asdf_library:
+            self._tree['asdf_library'] = asdf_library
+
+    def _serial_write(self, fd, pad_blocks, include_block_index,
+                      serialized_tree=None):
+        if serialized_tree is None:
+            self._write_tree(self._tree, fd, pad_blocks)
+        else:
+            fd.write(serialized_tree)
+            self._pad_tree(fd, pad_blocks)
         self.blocks.write_internal_blocks_serial(fd, pad_blocks)
         self.blocks.write_external_blocks(fd.uri, pad_blocks)
         if include_block_index:
             self.blocks.write_block_index(fd, self)
 
-    def _random_write(self, fd, pad_blocks, include_block_index):
-        self._write_tree(self._tree, fd, False)
-        self.blocks.write_internal_blocks_random_access(fd)
+    def _random_write(self, fd, pad_blocks, include_block_index,
+                      serialized_tree=None):
+        tree_unchanged = False
+        if serialized_tree is None:
+            self._write_tree(self._tree, fd, False)
+        else:
+            tree_unchanged = not self._write_tree_if_changed(
+                fd, serialized_tree)
+        self.blocks.write_internal_blocks_random_access(fd, tree_unchanged)
         self.blocks.write_external_blocks(fd.uri, pad_blocks)
         if include_block_index:
             self.blocks.write_block_index(fd, self)
         fd.truncate()
 
+    def _write_tree_if_changed(self, fd, serialized_tree):
+        # Returns `False`, having written nothing, when the file
+        # already contains the serialized tree
+        start = fd.tell()
+        if fd.read(len(serialized_tree)) == serialized_tree:
+            return False
+        fd.seek(start)
+        fd.write(serialized_tree)
+        return True
+
     def _post_write(self, fd):
-        if len(self._tree):
-            self.run_hook('post_write')
+        try:
+            write_hooks = getattr(self, '_write_hooks', None)
+            if write_hooks is not None:
+                for hook, node in write_hooks['post_write']:
+                    hook(node, self)
+        finally:
+            self._clear_write_state()
 
+    def _clear_write_state(self):
+        if hasattr(self, '_write_hooks'):
+            del self._write_hooks
         if hasattr(self, '_all_array_storage'):
             del self._all_array_storage
         if hasattr(self, '_all_array_compression'):
             del self._all_array_compression
         if hasattr(self, '_auto_inline'):
             del self._auto_inline
+        if hasattr(self, '_validate_on_write'):
+            del self._validate_on_write
+        if hasattr(self, '_reserve_tree_space'):
+            del self._reserve_tree_space
 
     def update(self, all_array_storage=None, all_array_compression=None,
                auto_inline=None, pad_blocks=False, include_block_index=True,
-               version=None):
+               version=None, validate='full'):
         """
         Update the file on disk in place.
 
+        Only the blocks that have changed are written.  When none of
+        them have, and the tree still fits in the space before the
+        first block (see the ``reserve_tree_space`` argument of
+        `write_to`), only the tree is written.
+
+        Since writes to memory-mapped arrays can't be detected, the
+        data of each array in the tree that was accessed (and is
+        writable) is hashed to find out whether it changed.  This
+        reads all of that data, so it costs as much as reading those
+        arrays in full.  The blocks of arrays that were never accessed
+        aren't read.
+
         Parameters
         ----------
         all_array_storage : string, optional
@@ -659,6 +1394,27 @@ class AsdfFile(versioning.VersionedMixin):
         version : str, optional
             The ASDF version to write out.  If not provided, it will
             write out in the latest version supported by pyasdf.
+
+        validate : str, optional
+            How much of the tree to validate against the schemas
+            before writing.  Must be one of:
+
+            - ``full``: The default.  Validate the entire tree.
+
+            - ``structure``: Only validate the tree against the
+              schema of the top-level ASDF tag, not against the
+              schemas of the custom types within it.
+
+            - ``none``: Don't validate the tree at all.  Only use this
+              for trees that are known to be valid, such as those
+              written by trusted code.
+
+            A tree that is unchanged since it was last validated, at
+            the same or a higher level, is not validated again.  Since
+            the schemas also determine some of the formatting of the
+            YAML, such as the order of properties, parts of a tree
+            that have never been validated may be formatted
+            differently.
         """
         fd = self._fd
 
@@ -676,7 +1432,8 @@ class AsdfFile(versioning.VersionedMixin):
         if all_array_storage == 'external':
             # If the file is fully exploded, there's no benefit to
             # update, so just use write_to()
-            self.write_to(fd, all_array_storage=all_array_storage)
+            self.write_to(fd, all_array_storage=all_array_storage,
+                          validate=validate)
             fd.truncate()
             return
 
@@ -687,7 +1444,11 @@ class AsdfFile(versioning.VersionedMixin):
         self.blocks.finish_reading_internal_blocks()
 
         self._pre_write(fd, all_array_storage, all_array_compression,
-                        auto_inline)
+                        auto_inline, validate)
+
+        # The tree is rewritten, and the blocks may be moved
+        self._tree_range = None
+        self._blocks_handle = None
 
         try:
             fd.seek(0)
@@ -699,43 +1460,60 @@ class AsdfFile(versioning.VersionedMixin):
                 fd.truncate()
                 return
 
-            # Estimate how big the tree will be on disk by writing the
-            # YAML out in memory.  Since the block indices aren't yet
-            # known, we have to count the number of block references and
-            # add enough space to accommodate the largest block number
-            # possible there.
+            # Serialize the tree, in memory, only once.  Since the
+            # final order of the blocks isn't yet known, the block
+            # numbers are written as fixed-width placeholders, which
+            # are filled in once the layout has been calculated.
             tree_serialized = io.BytesIO()
-            self._write_tree(self._tree, tree_serialized, pad_blocks=False)
-            array_ref_count = [0]
-            from .tags.core.ndarray import NDArrayType
-
-            for node in treeutil.iter_tree(self._tree):
-                if (isinstance(node, (np.ndarray, NDArrayType)) and
-                    self.blocks[node].array_storage == 'internal'):
-                    array_ref_count[0] += 1
-
-            serialized_tree_size = (
-                tree_serialized.tell() +
-                constants.MAX_BLOCKS_DIGITS * array_ref_count[0])
+            self.blocks.begin_source_placeholders()
+            try:
+                self._write_tree(self._tree, tree_serialized, pad_blocks=False)
+            finally:
+                placeholders = self.blocks.end_source_placeholders()
+            serialized_tree_size = self.blocks.get_filled_size(
+                tree_serialized.tell(), placeholders)
+
+            if not self.blocks.check_changed(fd):
+                # Only the tree may have changed, so if it still fits
+                # in the space before the first block, that is all
+                # that needs to be written.
+                serialized_tree = self.blocks.fill_source_placeholders(
+                    tree_serialized.getvalue(), placeholders)
+                tree_space = min(
+                    x.offset for x in self.blocks.internal_blocks)
+                if (serialized_tree is not None and
+                        len(serialized_tree) <= tree_space):
+                    fd.seek(0)
+                    if self._write_tree_if_changed(fd, serialized_tree):
+                        fd.clear(tree_space - fd.tell())
+                    self.blocks.write_external_blocks(fd.uri, pad_blocks)
+                    fd.flush()
+                    return
 
             if not block.calculate_updated_layout(
                     self.blocks, serialized_tree_size,
                     pad_blocks, fd.block_size):
                 # If we don't have any blocks that are being reused, just
                 # write out in a serial fashion.
-                self._serial_write(fd, pad_blocks, include_block_index)
+                self._serial_write(
+                    fd, pad_blocks, include_block_index,
+                    self.blocks.fill_source_placeholders(
+                        tree_serialized.getvalue(), placeholders))
                 fd.truncate()
                 return
 
             fd.seek(0)
-            self._random_write(fd, pad_blocks, include_block_index)
+            self._random_write(
+                fd, pad_blocks, include_block_index,
+                self.blocks.fill_source_placeholders(
+                    tree_serialized.getvalue(), placeholders))
             fd.flush()
         finally:
             self._post_write(fd)
 
     def write_to(self, fd, all_array_storage=None, all_array_compression=None,
                  auto_inline=None, pad_blocks=False, include_block_index=True,
-                 version=None):
+                 version=None, validate='full', reserve_tree_space=0):
         """
         Write the ASDF file to the given file-like object.
 
@@ -793,6 +1571,34 @@ class AsdfFile(versioning.VersionedMixin):
         version : str, optional
             The ASDF version to write out.  If not provided, it will
             write out in the latest version supported by pyasdf.
+
+        validate : str, optional
+            How much of the tree to validate against the schemas
+            before writing.  Must be one of:
+
+            - ``full``: The default.  Validate the entire tree.
+
+            - ``structure``: Only validate the tree against the
+              schema of the top-level ASDF tag, not against the
+              schemas of the custom types within it.
+
+            - ``none``: Don't validate the tree at all.  Only use this
+              for trees that are known to be valid, such as those
+              written by trusted code.
+
+            A tree that is unchanged since it was last validated, at
+            the same or a higher level, is not validated again.  Since
+            the schemas also determine some of the formatting of the
+            YAML, such as the order of properties, parts of a tree
+            that have never been validated may be formatted
+            differently.
+
+        reserve_tree_space : int, optional
+            The number of bytes of free space to leave after the tree,
+            before the first block.  When the file is later updated
+            with `update`, and none of its blocks have changed, only
+            the tree is rewritten as long as it still fits in this
+            space.  Default is 0.
         """
         original_fd = self._fd
 
@@ -803,7 +1609,7 @@ class AsdfFile(versioning.VersionedMixin):
             with generic_io.get_file(fd, mode='w') as fd:
                 self._fd = fd
                 self._pre_write(fd, all_array_storage, all_array_compression,
-                                auto_inline)
+                                auto_inline, validate, reserve_tree_space)
 
                 try:
                     self._serial_write(fd, pad_blocks, include_block_index)
@@ -844,16 +1650,10 @@ class AsdfFile(versioning.VersionedMixin):
             with this name, it will be called for every instance of the
             corresponding custom type in the tree.
         """
-        type_index = self.type_index
-
-        if not type_index.has_hook(hookname):
-            return
-
-        for node in treeutil.iter_tree(self._tree):
-            hook = type_index.get_hook_for_type(hookname, type(node),
-                                                self.version_string)
-            if hook is not None:
-                hook(node, self)
+        hooks = self.type_index.find_hooks(
+            self._tree, [hookname], self.version_string)
+        for hook, node in hooks[hookname]:
+            hook(node, self)
 
     def run_modifying_hook(self, hookname, validate=True):
         """
@@ -955,10 +1755,77 @@ class AsdfFile(versioning.VersionedMixin):
         if 'history' not in self.tree:
             self.tree['history'] = []
 
-        self.tree['history'].append(entry)
+        history = self.tree['history']
+        history.append(entry)
+
+        # The schema of the history only constrains each of its entries,
+        # so when the history was found to be valid before, only the new
+        # entry is validated, and the history and the tree above it stay
+        # valid in the validation cache.  This keeps adding many entries
+        # from converting and walking the whole tree each time.
+        def validate_entry(tagged_entry):
+            self._valid_subtrees = cache.valid_subtrees
+            try:
+                schema.validate(tagged_entry, self)
+            finally:
+                del self._valid_subtrees
 
+        cache = self._tagged_tree_cache
         try:
-            self.validate()
+            if not cache.append(history, entry, self, validate_entry):
+                self.validate()
         except:
-            self.tree['history'].pop()
+            history.pop()
             raise
+
+
+class AsdfFileHandle(object):
+    """
+    A small, picklable reference to an ASDF file, returned by
+    `AsdfFile.get_handle`.
+
+    The file must not be changed on disk while the handle is in use,
+    since the handle records where the parts of the file are.
+    """
+    def __init__(self, cls, uri, mode, extensions, open_options,
+                 tree_range, block_offsets, tree=None):
+        self._cls = cls
+        self._extensions = extensions
+        self._open_options = open_options
+        self._tree_range = tree_range
+        self.uri = uri
+        self.mode = mode
+        self.block_offsets = block_offsets
+        self.tree = tree
+
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__, self.uri)
+
+    def open(self):
+        """
+        Open the file.
+
+        Returns
+        -------
+        asdffile : AsdfFile
+        """
+        return self._open(True)
+
+    def _open(self, read_tree):
+        cls = self._cls
+        asdffile = cls(extensions=self._extensions)
+        do_not_fill_defaults, lazy_tree = self._open_options
+
+        if read_tree or not self.block_offsets:
+            handle = self if self._tree_range is not None else None
+            return cls._open_impl(
+                asdffile, self.uri, mode=self.mode,
+                do_not_fill_defaults=do_not_fill_defaults,
+                lazy_tree=lazy_tree, _handle=handle)
+
+        # Only the blocks are needed, so the tree isn't read at all
+        fd = generic_io.get_file(self.uri, mode=self.mode)
+        asdffile._fd = fd
+        asdffile._open_options = self._open_options
+        asdffile._blocks.add_unloaded_blocks(fd, self.block_offsets)
+        return asdffile
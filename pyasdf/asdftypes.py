@@ -10,10 +10,10 @@ import warnings
 import six
 
 
-from .compat import lru_cache
 from .extern import semver
 
 from . import tagged
+from . import treeutil
 from . import util
 from . import versioning
 
@@ -158,6 +158,7 @@ class AsdfTypeIndex(object):
         self._best_matches = {}
         self._unnamed_types = set()
         self._hooks_by_type = {}
+        self._types_by_hook = {}
         self._all_types = set()
 
     def add_type(self, asdftype):
@@ -165,6 +166,8 @@ class AsdfTypeIndex(object):
         Add a type to the index.
         """
         self._all_types.add(asdftype)
+        self._hooks_by_type.clear()
+        self._types_by_hook.clear()
 
         if asdftype.yaml_tag is None and asdftype.name is None:
             return
@@ -271,36 +274,85 @@ class AsdfTypeIndex(object):
         tag = self.fix_yaml_tag(tag)
         return self._type_by_tag.get(tag)
 
-    @lru_cache(5)
+    def _get_types_with_hook(self, hookname):
+        # The table of the types with each hook is built the first time
+        # the hook is looked up
+        types = self._types_by_hook.get(hookname)
+        if types is None:
+            types = frozenset(
+                cls for cls in self._all_types if hasattr(cls, hookname))
+            self._types_by_hook[hookname] = types
+        return types
+
     def has_hook(self, hook_name):
         """
         Returns `True` if the given hook name exists on any of the managed
         types.
         """
-        for cls in self._all_types:
-            if hasattr(cls, hook_name):
-                return True
-        return False
+        return bool(self._get_types_with_hook(hook_name))
 
     def get_hook_for_type(self, hookname, typ, version='latest'):
         """
         Get the hook function for the given type, if it exists,
         else return None.
         """
-        hooks = self._hooks_by_type.setdefault(hookname, {})
-        hook = hooks.get(typ, None)
-        if hook is not None:
-            return hook
+        hooks = self._hooks_by_type.get((hookname, version))
+        if hooks is None:
+            hooks = self._hooks_by_type[(hookname, version)] = {}
+        try:
+            return hooks[typ]
+        except KeyError:
+            pass
 
+        hook = None
         tag = self.from_custom_type(typ, version)
-        if tag is not None:
-            hook = getattr(tag, hookname, None)
-            if hook is not None:
-                hooks[typ] = hook
-                return hook
+        if tag is not None and tag in self._get_types_with_hook(hookname):
+            hook = getattr(tag, hookname)
+        hooks[typ] = hook
+        return hook
 
-        hooks[typ] = None
-        return None
+    def find_hooks(self, tree, hooknames, version='latest'):
+        """
+        Find the nodes in a tree that have any of the given hooks, in
+        a single walk over the tree.
+
+        Parameters
+        ----------
+        tree : object
+            The tree of custom types.
+
+        hooknames : list of str
+            The names of the hooks.
+
+        version : str, optional
+            The version of the ASDF standard whose types are used.
+
+        Returns
+        -------
+        hooks : dict
+            Maps each hook name to a list of ``(hook, node)`` pairs,
+            for the nodes that have the hook, in the order that
+            `treeutil.iter_tree` visits them.
+        """
+        result = dict((hookname, []) for hookname in hooknames)
+        hooknames = [x for x in hooknames if self.has_hook(x)]
+        if not hooknames:
+            return result
+
+        hooks_by_type = {}
+        for node in treeutil.iter_tree(tree):
+            typ = type(node)
+            hooks = hooks_by_type.get(typ)
+            if hooks is None:
+                hooks = []
+                for hookname in hooknames:
+                    hook = self.get_hook_for_type(hookname, typ, version)
+                    if hook is not None:
+                        hooks.append((result[hookname], hook))
+                hooks_by_type[typ] = hooks
+            for found, hook in hooks:
+                found.append((hook, node))
+        return result
 
 
 _all_asdftypes = set()
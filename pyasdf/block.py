@@ -7,9 +7,12 @@ from collections import namedtuple
 import copy
 import hashlib
 import io
+from multiprocessing.pool import ThreadPool
 import os
 import re
 import struct
+import tempfile
+import threading
 import weakref
 
 import numpy as np
@@ -24,11 +27,25 @@ from .compat.numpycompat import NUMPY_LT_1_7
 from . import constants
 from . import generic_io
 from . import stream
-from . import treeutil
 from . import util
 from . import yamlutil
 
 
+# While the tree is serialized by `AsdfFile.update`, the sources of
+# internal blocks are written as placeholders of MAX_BLOCKS_DIGITS
+# digits, so that the final block numbers can be filled in without
+# changing the size of the tree.
+_SOURCE_PLACEHOLDER_BASE = 9 * 10 ** (constants.MAX_BLOCKS_DIGITS - 1)
+_SOURCE_PLACEHOLDER_PATTERN = re.compile(
+    'source: (9[0-9]{{{0}}})(?![0-9])'.format(
+        constants.MAX_BLOCKS_DIGITS - 1).encode('ascii'))
+
+# Held while the data loaded for a block is stored, so that when
+# several threads load the same block at once, they all end up using
+# the same array.
+_data_lock = threading.Lock()
+
+
 class BlockManager(object):
     """
     Manages the `Block`s associated with a ASDF file.
@@ -50,6 +67,10 @@ class BlockManager(object):
 
         self._data_to_block_mapping = {}
         self._validate_checksums = False
+        self._source_placeholders = None
+        # Set when a block that is stored in a file is removed, since
+        # the file then has to be rewritten without it
+        self._removed_stored_block = False
 
     def __len__(self):
         """
@@ -88,6 +109,8 @@ class BlockManager(object):
         if block_set is not None:
             if block in block_set:
                 block_set.remove(block)
+                if getattr(block, '_stored', None) is not None:
+                    self._removed_stored_block = True
                 if block._data is not None:
                     if id(block._data) in self._data_to_block_mapping:
                         del self._data_to_block_mapping[id(block._data)]
@@ -264,14 +287,132 @@ class BlockManager(object):
             last_block = self._internal_blocks[-1]
 
             # Read all of the remaining blocks in the file, if any
-            if (last_block._fd is not None and
-                last_block._fd.seekable()):
-                last_block._fd.seek(last_block.end_offset)
-                while True:
-                    last_block = self._read_next_internal_block(
-                        last_block._fd, False)
-                    if last_block is None:
-                        break
+            fd = last_block._fd
+            if fd is not None and fd.seekable():
+                with fd.position_lock:
+                    # Another thread may have read some of them while
+                    # we waited
+                    last_block = self._internal_blocks[-1]
+                    if len(self._streamed_blocks):
+                        return
+                    fd.seek(last_block.end_offset)
+                    while True:
+                        last_block = self._read_next_internal_block(
+                            fd, False)
+                        if last_block is None:
+                            break
+
+    def load_blocks(self, blocks):
+        """
+        Load the data for a number of blocks at once.
+
+        Loading each block individually requires a separate read for
+        each one, which for remote files means a separate request for
+        each block.  This instead chooses the fastest strategy the
+        file declares support for:
+
+        - Blocks that can be memory mapped are left to be mapped
+          lazily.
+
+        - If the file supports parallel reads, the blocks are read
+          (and decompressed) in a number of threads at once.
+
+        - If the file supports fetching ranges, all of the byte ranges
+          required are passed to it all at once, so that, for example,
+          `generic_io.HTTPConnection` can fetch them in a single
+          request.
+
+        Parameters
+        ----------
+        blocks : iterable of Block
+            The blocks to load.  For a given array ``arr`` in the
+            tree, its block is ``asdffile.blocks[arr]``.
+        """
+        blocks = list(blocks)
+
+        # The headers of blocks found through the block index haven't
+        # been read yet, so fetch those first.
+        header_size = Block._header.size + constants.BLOCK_HEADER_BOILERPLATE_SIZE
+        self._fetch_ranges(
+            (block._fd, block.offset, block.offset + header_size)
+            for block in blocks if isinstance(block, UnloadedBlock))
+        for block in blocks:
+            if isinstance(block, UnloadedBlock):
+                block.load()
+
+        blocks_by_fd = {}
+        for block in blocks:
+            if (block._data is None and block._fd is not None and
+                not (block._fd.can_memmap() and not block.is_compressed)):
+                blocks_by_fd.setdefault(block._fd, []).append(block)
+
+        for fd, fd_blocks in six.iteritems(blocks_by_fd):
+            if fd.is_closed():
+                continue
+            if fd.can_read_parallel():
+                self._read_parallel(fd, fd_blocks)
+            elif fd.can_fetch_ranges():
+                fd.fetch_ranges([
+                    (block.data_offset, block.data_offset + block._size)
+                    for block in fd_blocks])
+
+        for block in blocks:
+            block._load_data()
+
+    def _fetch_ranges(self, ranges):
+        ranges_by_fd = {}
+        for fd, start, end in ranges:
+            ranges_by_fd.setdefault(fd, []).append((start, end))
+        for fd, fd_ranges in six.iteritems(ranges_by_fd):
+            if not fd.is_closed() and fd.can_fetch_ranges():
+                fd.fetch_ranges(fd_ranges)
+
+    # The maximum number of threads used to read blocks from files
+    # that support parallel reads
+    _max_parallel_reads = 8
+
+    def _read_parallel(self, fd, blocks):
+        def read(block):
+            data = block._read_data_range(fd)
+            with _data_lock:
+                if block._data is None:
+                    block._data = data
+                    block._data_private = True
+
+        if len(blocks) == 1:
+            read(blocks[0])
+            return
+
+        pool = ThreadPool(min(len(blocks), self._max_parallel_reads))
+        try:
+            pool.map(read, blocks)
+        finally:
+            pool.close()
+            pool.join()
+
+    def check_changed(self, fd):
+        """
+        Determine which internal blocks have changed, with
+        `Block.check_changed`, before updating ``fd`` in place.
+
+        Parameters
+        ----------
+        fd : generic_io.GenericFile
+            The file being updated.
+
+        Returns
+        -------
+        changed : bool
+            `True` if any internal block changed or moved since it was
+            read from ``fd``, or last written to it in place, or if
+            any internal block was added or removed.
+        """
+        changed = self._removed_stored_block
+        for block in self.internal_blocks:
+            if (block.check_changed() or block._fd is not fd or
+                block.offset != block._stored[0]):
+                changed = True
+        return changed
 
     def write_internal_blocks_serial(self, fd, pad_blocks=False):
         """
@@ -283,28 +424,46 @@ class BlockManager(object):
             The file to write internal blocks to.  The file position
             should be after the tree.
         """
-        for block in self.internal_blocks:
-            if block.is_compressed:
-                block.offset = fd.tell()
-                block.write(fd)
-            else:
+        blocks = list(self.internal_blocks)
+
+        for block in blocks:
+            if not block.is_compressed:
                 padding = util.calculate_padding(
                     block.size, pad_blocks, fd.block_size)
                 block.allocated = block._size + padding
-                block.offset = fd.tell()
-                block.write(fd)
+
+        # The final size of compressed and streamed blocks isn't known
+        # in advance
+        if not any(block.is_compressed or
+                   block.array_storage == 'streamed'
+                   for block in blocks):
+            fd.preallocate(
+                fd.tell(),
+                sum(block.header_size + block.allocated for block in blocks))
+
+        for block in blocks:
+            block.offset = fd.tell()
+            block.write(fd)
+            if not block.is_compressed:
                 fd.fast_forward(block.allocated - block._size)
 
-    def write_internal_blocks_random_access(self, fd):
+    def write_internal_blocks_random_access(self, fd, tree_unchanged=False):
         """
         Write all blocks to disk at their specified offsets.  All
         internal blocks must have an offset assigned at this point.
 
+        Only the blocks that have changed since they were read from
+        ``fd`` are written.
+
         Parameters
         ----------
         fd : generic_io.GenericFile
             The file to write internal blocks to.  The file position
             should be after the tree.
+
+        tree_unchanged : bool, optional
+            When `True`, the tree that was just written (or skipped)
+            is the same as the one already in the file.
         """
         self._sort_blocks_by_offset()
 
@@ -313,22 +472,26 @@ class BlockManager(object):
         # We need to explicitly clear anything between the tree
         # and the first block, otherwise there may be other block
         # markers left over which will throw off block indexing.
-        # We don't need to do this between each block.
-        fd.clear(last_block.offset - fd.tell())
+        # We don't need to do this between each block, nor when the
+        # tree and the first block are where they already were.
+        stored = last_block._stored
+        if not (tree_unchanged and fd is last_block._fd and
+                stored is not None and stored[0] == last_block.offset):
+            fd.clear(last_block.offset - fd.tell())
 
         for block in iter:
             last_block.allocated = ((block.offset - last_block.offset) -
                                     last_block.header_size)
-            fd.seek(last_block.offset)
-            last_block.write(fd)
+            last_block.write_in_place(fd)
             last_block = block
 
-        last_block.allocated = last_block.size
-        fd.seek(last_block.offset)
-        last_block.write(fd)
+        last_block.allocated = last_block._size
+        last_block.write_in_place(fd)
 
         fd.truncate(last_block.end_offset)
 
+        self._removed_stored_block = False
+
     def write_external_blocks(self, uri, pad_blocks=False):
         """
         Write all blocks to disk serially.
@@ -507,6 +670,56 @@ class BlockManager(object):
         # We already read the last block in the file -- no need to read it again
         self._internal_blocks.append(block)
 
+    def get_stored_offsets(self, fd):
+        """
+        Get the offsets in ``fd`` of the internal blocks that have
+        been found in it so far, for opening it again without reading
+        its structure.
+
+        Parameters
+        ----------
+        fd : GenericFile
+            The file the blocks were read from.
+
+        Returns
+        -------
+        offsets : list of int or None
+            The offsets of the first internal blocks in the file, in
+            order.  `None` if the blocks being managed no longer match
+            the ones in the file, since one of them was removed.
+        """
+        if self._removed_stored_block:
+            return None
+
+        offsets = []
+        for block in self._internal_blocks:
+            if isinstance(block, UnloadedBlock):
+                offsets.append(block.offset)
+            elif block._stored is not None and block._fd is fd:
+                offsets.append(block._stored[0])
+            else:
+                break
+        return offsets
+
+    def add_unloaded_blocks(self, fd, offsets):
+        """
+        Add internal blocks at the given offsets in ``fd``, which are
+        only read when they are used, as for the blocks found through
+        the block index.
+
+        Parameters
+        ----------
+        fd : GenericFile
+            The file to read the blocks from.  It must be seekable.
+
+        offsets : list of int
+            The offsets of the first internal blocks in the file, in
+            order.  Any blocks after them are found as they are
+            needed.
+        """
+        for offset in offsets:
+            self._internal_blocks.append(UnloadedBlock(fd, offset))
+
     def get_external_filename(self, filename, index):
         """
         Given a main filename and an index number, return a new file
@@ -533,12 +746,15 @@ class BlockManager(object):
     def _find_used_blocks(self, tree, ctx):
         reserved_blocks = set()
 
-        for node in treeutil.iter_tree(tree):
-            hook = ctx.type_index.get_hook_for_type(
-                'reserve_blocks', type(node), ctx.version_string)
-            if hook is not None:
-                for block in hook(node, ctx):
-                    reserved_blocks.add(block)
+        # While writing, the nodes with the hook have already been
+        # found
+        hooks = getattr(ctx, '_write_hooks', None)
+        if hooks is None:
+            hooks = ctx.type_index.find_hooks(
+                tree, ['reserve_blocks'], ctx.version_string)
+        for hook, node in hooks['reserve_blocks']:
+            for block in hook(node, ctx):
+                reserved_blocks.add(block)
 
         for block in list(self.blocks):
             if (getattr(block, '_used', 0) == 0 and
@@ -556,7 +772,7 @@ class BlockManager(object):
 
         auto_inline = getattr(ctx, '_auto_inline', None)
         if auto_inline:
-            if np.product(block.data.shape) < auto_inline:
+            if np.product(block._load_data().shape) < auto_inline:
                 self.set_array_storage(block, 'inline')
 
     def finalize(self, ctx):
@@ -618,17 +834,29 @@ class BlockManager(object):
             # more internal blocks.  This is "deferred block loading".
             last_block = self._internal_blocks[-1]
 
-            if (last_block._fd is not None and
-                last_block._fd.seekable()):
-                last_block._fd.seek(last_block.end_offset)
-                while True:
-                    next_block = self._read_next_internal_block(
-                        last_block._fd, False)
-                    if next_block is None:
-                        break
-                    if len(self._internal_blocks) - 1 == source:
-                        return next_block
-                    last_block = next_block
+            fd = last_block._fd
+            if fd is not None and fd.seekable():
+                with fd.position_lock:
+                    # Another thread may have read more blocks while we
+                    # waited
+                    if 0 <= source < len(self._internal_blocks):
+                        return self._internal_blocks[source]
+                    if len(self._streamed_blocks):
+                        if source == -1:
+                            return self._streamed_blocks[0]
+                        raise ValueError(
+                            "Block '{0}' not found.".format(source))
+                    last_block = self._internal_blocks[-1]
+
+                    fd.seek(last_block.end_offset)
+                    while True:
+                        next_block = self._read_next_internal_block(
+                            fd, False)
+                        if next_block is None:
+                            break
+                        if len(self._internal_blocks) - 1 == source:
+                            return next_block
+                        last_block = next_block
 
             if (source == -1 and
                 last_block.array_storage == 'streamed'):
@@ -665,6 +893,10 @@ class BlockManager(object):
             if block == internal_block:
                 if internal_block.array_storage == 'streamed':
                     return -1
+                if self._source_placeholders is not None:
+                    placeholder = _SOURCE_PLACEHOLDER_BASE + i
+                    self._source_placeholders.append((placeholder, block))
+                    return placeholder
                 return i
 
         for i, external_block in enumerate(self.external_blocks):
@@ -681,6 +913,86 @@ class BlockManager(object):
 
         raise ValueError("block not found.")
 
+    def begin_source_placeholders(self):
+        """
+        Until `end_source_placeholders` is called, have `get_source`
+        return a fixed-width placeholder in place of the index of an
+        internal block.
+
+        This allows the tree to be serialized before the final order
+        of the blocks is known.  The placeholders are replaced later
+        with `fill_source_placeholders`.
+        """
+        self._source_placeholders = []
+
+    def end_source_placeholders(self):
+        """
+        Have `get_source` return block indices again.
+
+        Returns
+        -------
+        placeholders : list of (int, Block) tuples
+            The placeholders returned by `get_source` since
+            `begin_source_placeholders` was called.
+        """
+        placeholders = self._source_placeholders
+        self._source_placeholders = None
+        return placeholders
+
+    def get_filled_size(self, size, placeholders):
+        """
+        Get the largest size that a serialized tree can have once its
+        block source placeholders are filled in.
+
+        Parameters
+        ----------
+        size : int
+            The size of the serialized tree, with its placeholders.
+
+        placeholders : list of (int, Block) tuples
+            As returned by `end_source_placeholders`.
+
+        Returns
+        -------
+        size : int
+        """
+        digits = len('{0}'.format(max(len(self._internal_blocks) - 1, 0)))
+        return size - len(placeholders) * (
+            constants.MAX_BLOCKS_DIGITS - digits)
+
+    def fill_source_placeholders(self, content, placeholders):
+        """
+        Replace the block source placeholders in a serialized tree
+        with the current index of each block.
+
+        Parameters
+        ----------
+        content : bytes
+            The serialized tree.
+
+        placeholders : list of (int, Block) tuples
+            As returned by `end_source_placeholders`.
+
+        Returns
+        -------
+        content : bytes or None
+            The content, which is no longer than before, or `None` if the
+            placeholders could not be found unambiguously, in which
+            case the tree must be serialized again.
+        """
+        mapping = dict(placeholders)
+        matches = _SOURCE_PLACEHOLDER_PATTERN.findall(content)
+        if (len(matches) != len(placeholders) or
+                set(int(x) for x in matches) != set(mapping)):
+            return None
+
+        def replace(match):
+            block = mapping[int(match.group(1))]
+            source = '{0}'.format(self.get_source(block))
+            return b'source: ' + source.encode('ascii')
+
+        return _SOURCE_PLACEHOLDER_PATTERN.sub(replace, content)
+
     def find_or_create_block_for_array(self, arr, ctx):
         """
         For a given array, looks for an existing block containing its
@@ -756,6 +1068,13 @@ class Block(object):
         ('checksum', '16s')
     ])
 
+    # When writing a compressed block to a non-seekable file, the
+    # compressed data is spooled so its size is known before the
+    # header is written.  Spools larger than this many bytes are
+    # moved from memory to a temporary file on disk.
+    _spool_max_size = 1 << 24
+    _spool_chunk_size = 1 << 20
+
     def __init__(self, data=None, uri=None, array_storage='internal'):
         self._data = data
         self._uri = uri
@@ -766,6 +1085,16 @@ class Block(object):
         self._compression = None
         self._checksum = None
         self._memmapped = False
+        # Where and how the block is stored in ``self._fd``, as
+        # ``(offset, header_size, allocated, compression)``, when that
+        # is known.  Used to only write what has changed when
+        # updating the file in place.
+        self._stored = None
+        self._changed = True
+        # Whether the data was loaded from the file and hasn't been
+        # handed out writable through `data` since, so that it can't
+        # have been modified
+        self._data_private = False
 
         self.update_size()
         self._allocated = self._size
@@ -825,7 +1154,13 @@ class Block(object):
 
     @compression.setter
     def compression(self, compression):
-        self._compression = mcompression.validate(compression)
+        compression = mcompression.validate(compression)
+        if (compression != self._compression and self._data is None and
+            self._fd is not None):
+            # The data must be read with the compression it was
+            # written with
+            self._load_data()
+        self._compression = compression
 
     @property
     def is_compressed(self):
@@ -843,7 +1178,7 @@ class Block(object):
 
     def _calculate_checksum(self, data):
         m = hashlib.new('md5')
-        m.update(self.data)
+        m.update(data)
         return m.digest()
 
     def validate_checksum(self):
@@ -858,7 +1193,7 @@ class Block(object):
             `False`.
         """
         if self._checksum:
-            checksum = self._calculate_checksum(self.data)
+            checksum = self._calculate_checksum(self._load_data())
             if checksum != self._checksum:
                 return False
         return True
@@ -867,7 +1202,7 @@ class Block(object):
         """
         Update the checksum based on the current data contents.
         """
-        self._checksum = self._calculate_checksum(self.data)
+        self._checksum = self._calculate_checksum(self._load_data())
 
     def update_size(self):
         """
@@ -888,6 +1223,37 @@ class Block(object):
         else:
             self._data_size = self._size = 0
 
+    def check_changed(self):
+        """
+        Determine whether the block has changed since it was read
+        from its file, or last written to it in place, and so needs
+        to be written again when updating the file in place.
+
+        The block has changed if its compression was changed, or its
+        data was replaced or modified.  Since writes to a memory-mapped
+        array can't be detected directly, data that was handed out
+        writable (through `data`, which is where the arrays in the
+        tree come from), or that didn't come from the file, is hashed
+        and compared against the stored checksum.  Data that was only
+        loaded for use within pyasdf isn't.
+
+        Returns
+        -------
+        changed : bool
+        """
+        if (self._stored is None or
+            self._array_storage != 'internal' or
+            self.compression != self._stored[3]):
+            self._changed = True
+        elif self._data is None or self._data_private:
+            self._changed = False
+        else:
+            checksum = self._calculate_checksum(self._data)
+            self._changed = (
+                self._checksum is None or checksum != self._checksum)
+            self._checksum = checksum
+        return self._changed
+
     def read(self, fd, past_magic=False, validate_checksum=False):
         """
         Read a Block from the given Python file-like object.
@@ -944,7 +1310,7 @@ class Block(object):
 
         # This is used by the documentation system, but nowhere else.
         self._flags = header['flags']
-        self.compression = header['compression']
+        self._compression = mcompression.validate(header['compression'])
         self._set_checksum(header['checksum'])
 
         if (self.compression is None and
@@ -974,12 +1340,15 @@ class Block(object):
                 self._allocated = header['allocated_size']
                 self._size = header['used_size']
                 self._data_size = header['data_size']
+                self._stored = (offset, header_size, self._allocated,
+                                self.compression)
         else:
             # If the file is a stream, we need to get the data now.
             if header['flags'] & constants.BLOCK_FLAG_STREAMED:
                 # Support streaming blocks
                 self._array_storage = 'streamed'
                 self._data = fd.read_into_array(-1)
+                self._data_private = True
                 self._data_size = self._size = self._allocated = len(self._data)
             else:
                 self._data_size = header['data_size']
@@ -987,6 +1356,7 @@ class Block(object):
                 self._allocated = header['allocated_size']
                 self._data = self._read_data(
                     fd, self._size, self._data_size, self.compression)
+                self._data_private = True
                 fd.fast_forward(self._allocated - self._size)
             fd.close()
 
@@ -1017,7 +1387,8 @@ class Block(object):
         elif self._data is not None:
             self.update_checksum()
             if not fd.seekable() and self.is_compressed:
-                buff = io.BytesIO()
+                buff = tempfile.SpooledTemporaryFile(
+                    max_size=self._spool_max_size)
                 mcompression.compress(buff, self._data, self.compression)
                 self.allocated = self._size = buff.tell()
             data_size = self._data.nbytes
@@ -1042,7 +1413,15 @@ class Block(object):
         if self._data is not None:
             if self.is_compressed:
                 if not fd.seekable():
-                    fd.write(buff.getvalue())
+                    buff.seek(0)
+                    try:
+                        while True:
+                            chunk = buff.read(self._spool_chunk_size)
+                            if not chunk:
+                                break
+                            fd.write(chunk)
+                    finally:
+                        buff.close()
                 else:
                     # If the file is seekable, we write the
                     # compressed data directly to it, then go back
@@ -1061,34 +1440,101 @@ class Block(object):
             else:
                 fd.write_array(self._data)
 
+    def write_in_place(self, fd):
+        """
+        Write an internal block to its offset in the file that it is
+        being updated in.  `check_changed` must have been called
+        first, and not since the block was last written.
+
+        Where the block is already stored at the same location in
+        ``fd``, only the parts of it that have changed are written:
+        nothing at all, the block header, or for a modified
+        memory-mapped block, its header and the flushed memory map.
+        """
+        stored = self._stored
+        if (stored is not None and fd is self._fd and
+            stored[:2] == (self.offset, self._header_size)):
+            if not self._changed:
+                if self.allocated != stored[2]:
+                    fd.seek(self.offset + 6)
+                    self._header.update(fd, allocated_size=self.allocated)
+                    self._stored = stored[:2] + (self.allocated, stored[3])
+                return
+            if self._memmapped and not self.is_compressed:
+                # check_changed already calculated the new checksum
+                self._data.flush()
+                fd.seek(self.offset + 6)
+                self._header.update(
+                    fd, allocated_size=self.allocated,
+                    checksum=self._checksum)
+                self._stored = stored[:2] + (self.allocated, stored[3])
+                self._changed = False
+                return
+
+        if self._data is None and self._fd is not None:
+            # The block was never accessed, but has to be moved
+            self._load_data()
+        fd.seek(self.offset)
+        self.write(fd)
+        if self._array_storage == 'internal':
+            self._fd = fd
+            self._stored = (self.offset, self._header_size, self.allocated,
+                            self.compression)
+            self._changed = False
+
     @property
     def data(self):
         """
         Get the data for the block, as a numpy array.
         """
+        data = self._load_data()
+        if data.flags.writeable:
+            # May be modified from now on
+            self._data_private = False
+        return data
+
+    def _load_data(self):
+        # Loads the data, like `data`, for use within pyasdf only
         if self._data is None:
             if self._fd.is_closed():
                 raise IOError(
                     "ASDF file has already been closed. "
                     "Can not get the data.")
 
-            # Be nice and reset the file position after we're done
-            curpos = self._fd.tell()
-            try:
-                if not self.is_compressed and self._fd.can_memmap():
-                    self._data = self._fd.memmap_array(
-                        self.data_offset, self._size)
-                    self._memmapped = True
-                else:
-                    self._fd.seek(self.data_offset)
-                    self._data = self._read_data(
-                        self._fd, self._size, self._data_size,
-                        self.compression)
-            finally:
-                self._fd.seek(curpos)
+            # This doesn't use the file position, so several threads
+            # may load blocks from the same file at once.
+            memmapped = not self.is_compressed and self._fd.can_memmap()
+            if memmapped:
+                data = self._fd.memmap_array(self.data_offset, self._size)
+            else:
+                self._fd.advise('willneed', self.data_offset, self._size)
+                data = self._read_data_range(self._fd)
+
+            with _data_lock:
+                if self._data is None:
+                    self._memmapped = memmapped
+                    self._data = data
+                    self._data_private = True
 
         return self._data
 
+    def _read_data_range(self, fd):
+        """
+        Read the data of the block from ``fd``, without changing its
+        file position.
+        """
+        if not self.compression:
+            return fd.read_range_into_array(self.data_offset, self._size)
+
+        if 'w' in fd.mode:
+            mode = 'rw'
+        else:
+            mode = 'r'
+        content = fd.read_range(self.data_offset, self._size)
+        return self._read_data(
+            generic_io.MemoryIO(io.BytesIO(content), mode),
+            self._size, self._data_size, self.compression)
+
     def close(self):
         if self._memmapped and self._data is not None:
             if NUMPY_LT_1_7:  # pragma: no cover
@@ -1119,6 +1565,9 @@ class UnloadedBlock(object):
         self._compression = None
         self._checksum = None
         self._memmapped = False
+        self._stored = None
+        self._changed = True
+        self._data_private = False
 
     def __len__(self):
         self.load()
@@ -1140,9 +1589,18 @@ class UnloadedBlock(object):
         return getattr(self, attr)
 
     def load(self):
-        self._fd.seek(self._offset, generic_io.SEEK_SET)
-        self.__class__ = Block
-        self.read(self._fd)
+        fd = self._fd
+        with fd.position_lock:
+            # Another thread may have loaded it while we waited
+            if self.__class__ is Block:
+                return
+            # Read into a separate block, so that no other thread sees
+            # this one half-read
+            block = Block()
+            fd.seek(self._offset, generic_io.SEEK_SET)
+            block.read(fd)
+            self.__dict__.update(block.__dict__)
+            self.__class__ = Block
 
 
 def calculate_updated_layout(blocks, tree_size, pad_blocks, block_size):
@@ -1152,6 +1610,8 @@ def calculate_updated_layout(blocks, tree_size, pad_blocks, block_size):
     algorithm is fairly naive.  The result will be stored in the
     offsets of the blocks.
 
+    `BlockManager.check_changed` must have been called first.
+
     Parameters
     ----------
     blocks : Blocks instance
@@ -1170,9 +1630,10 @@ def calculate_updated_layout(blocks, tree_size, pad_blocks, block_size):
 
         # TODO: Copy to a tmpfile on disk and memmap it from there.
         entry = fixed[i]
-        copy = entry.block.data.copy()
+        copy = entry.block._load_data().copy()
         entry.block.close()
         entry.block._data = copy
+        entry.block._memmapped = False
         del fixed[i]
         free.append(entry.block)
 
@@ -1187,7 +1648,9 @@ def calculate_updated_layout(blocks, tree_size, pad_blocks, block_size):
     free = []
     for block in blocks._internal_blocks:
         if block.offset is not None:
-            block.update_size()
+            # The size of a block that hasn't changed is already known
+            if block._changed:
+                block.update_size()
             fixed.append(
                 Entry(block.offset, block.offset + block.size, block))
         else:
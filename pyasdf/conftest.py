@@ -36,6 +36,46 @@ import six
 from .extern.RangeHTTPServer import RangeHTTPRequestHandler
 
 
+class MultiRangeHTTPRequestHandler(RangeHTTPRequestHandler):  # pragma: no cover
+    """
+    Extends `RangeHTTPRequestHandler` to support requests for multiple
+    ranges, which are returned as a ``multipart/byteranges`` response.
+    """
+    boundary = 'PYASDF_BYTERANGES'
+
+    def do_GET(self):
+        if ',' not in self.headers.get('range', ''):
+            return RangeHTTPRequestHandler.do_GET(self)
+
+        path = self.translate_path(self.path)
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            parts = []
+            for r in self.headers['range'][6:].split(','):
+                s, e = r.strip().split('-', 1)
+                start = int(s)
+                end = min(int(e), size - 1)
+                f.seek(start)
+                parts.append(
+                    ('--{0}\r\n'
+                     'Content-Type: application/octet-stream\r\n'
+                     'Content-Range: bytes {1}-{2}/{3}\r\n'
+                     '\r\n'.format(
+                         self.boundary, start, end, size)).encode('ascii') +
+                    f.read(end - start + 1) + b'\r\n')
+        body = b''.join(parts) + '--{0}--\r\n'.format(
+            self.boundary).encode('ascii')
+
+        self.send_response(206)
+        self.send_header(
+            "Content-Type",
+            "multipart/byteranges; boundary={0}".format(self.boundary))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+
 def run_server(queue, tmpdir, handler_class):  # pragma: no cover
     """
     Runs an HTTP server serving files from given tmpdir in a separate
@@ -83,6 +123,10 @@ class RangeHTTPServer(HTTPServer):
     handler_class = RangeHTTPRequestHandler
 
 
+class MultiRangeHTTPServer(HTTPServer):
+    handler_class = MultiRangeHTTPRequestHandler
+
+
 @pytest.fixture()
 def httpserver(request):
     """
@@ -113,3 +157,20 @@ def rhttpserver(request):
     server = RangeHTTPServer()
     request.addfinalizer(server.finalize)
     return server
+
+
+@pytest.fixture()
+def mrhttpserver(request):
+    """
+    The returned ``httpserver`` provides a threaded HTTP server
+    instance.  It serves content from a temporary directory (available
+    as the attribute tmpdir) at randomly assigned URL (available as
+    the attribute url).  The server supports HTTP Range headers,
+    including requests for multiple ranges.
+
+    * ``tmpdir`` - path to the tmpdir that it's serving from (str)
+    * ``url`` - the base url for the server
+    """
+    server = MultiRangeHTTPServer()
+    request.addfinalizer(server.finalize)
+    return server
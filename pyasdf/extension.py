@@ -109,6 +109,7 @@ class AsdfExtensionList(object):
         tag_mapping = []
         url_mapping = []
         validators = {}
+        self._extensions = list(extensions)
         self._type_index = asdftypes.AsdfTypeIndex()
         for extension in extensions:
             if not isinstance(extension, AsdfExtension):
@@ -0,0 +1,247 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+
+"""
+A process-wide cache of the external ASDF files opened by
+`AsdfFile.open_external`, so that many files that reference the same
+external files don't each open, parse and validate them again.
+
+The cache is off by default.  To turn it on, set `cache` to an
+`ExternalFileCache` instance::
+
+    from pyasdf import external_cache
+    external_cache.cache = external_cache.ExternalFileCache(max_size=32)
+
+Since the `AsdfFile` objects in the cache are shared by all of the
+files that reference them, they should not be modified.
+"""
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+from collections import OrderedDict
+import os
+import threading
+
+from six.moves.urllib import parse as urlparse
+from six.moves.urllib.request import url2pathname
+
+from . import generic_io
+
+
+__all__ = ['ExternalFileCache', 'cache', 'release']
+
+
+def _get_version(uri):
+    """
+    Get a value that changes whenever the file at ``uri`` changes:
+    the modification time and size of a local file, or the ETag (or
+    else the last modification time) of a file served over HTTP.
+    Returns `None` when there is no such value, in which case the file
+    isn't cached.
+    """
+    parsed = urlparse.urlparse(uri)
+    if parsed.scheme in generic_io._local_file_schemes:
+        try:
+            stat = os.stat(url2pathname(parsed.path))
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+    elif parsed.scheme == 'http':
+        from six.moves import http_client
+
+        connection = http_client.HTTPConnection(parsed.netloc)
+        try:
+            connection.request('HEAD', parsed.path)
+            response = connection.getresponse()
+            response.read()
+            if response.status // 100 != 2:
+                return None
+            return (response.getheader('etag', None) or
+                    response.getheader('last-modified', None))
+        except (IOError, http_client.HTTPException):
+            return None
+        finally:
+            connection.close()
+
+    return None
+
+
+class _Entry(object):
+    def __init__(self, cache, key, version, asdffile):
+        self.cache = cache
+        self.key = key
+        self.version = version
+        self.asdffile = asdffile
+        self.refcount = 1
+        # Set when the entry is no longer in the cache, so the file
+        # is closed as soon as it is released
+        self.detached = False
+
+
+class ExternalFileCache(object):
+    """
+    A cache of open external ASDF files, shared by all `AsdfFile`
+    objects in the process.
+
+    Files are keyed by their resolved URI, and are opened again when
+    they change on disk (or on the server).  Each `AsdfFile` that
+    opened an external file through the cache holds a reference to
+    it, which is released when it is closed.  Of the files that are
+    no longer referenced, only the ``max_size`` most recently used
+    ones are kept open.
+
+    All methods may be called from multiple threads.
+    """
+    def __init__(self, max_size=16):
+        """
+        Parameters
+        ----------
+        max_size : int, optional
+            The number of files to keep open.  Files that are still
+            referenced are never closed, even when there are more of
+            them.
+        """
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # In order from least to most recently used
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def acquire(self, uri, opener, do_not_fill_defaults=False):
+        """
+        Get the open file at ``uri``, opening it if it isn't in the
+        cache, and add a reference to it.
+
+        Parameters
+        ----------
+        uri : str
+            The resolved URI of the file.
+
+        opener : callable
+            Opens the file when it isn't already in the cache, with
+            the same arguments as `AsdfFile.open`.
+
+        do_not_fill_defaults : bool, optional
+            Passed on to ``opener``.
+
+        Returns
+        -------
+        asdffile : AsdfFile
+            The file, which must be given to `release` once it is no
+            longer used.
+        """
+        version = _get_version(uri)
+        if version is None:
+            return opener(uri, do_not_fill_defaults=do_not_fill_defaults)
+
+        key = (uri, opener, do_not_fill_defaults)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                entry.refcount += 1
+                self._entries[key] = self._entries.pop(key)
+                return entry.asdffile
+
+        # Other threads may use the cache while the file is opened
+        asdffile = opener(uri, do_not_fill_defaults=do_not_fill_defaults)
+
+        to_close = []
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                # Another thread opened the same file in the meantime
+                entry.refcount += 1
+                self._entries[key] = self._entries.pop(key)
+                to_close.append(asdffile)
+                asdffile = entry.asdffile
+            else:
+                if entry is not None:
+                    to_close.extend(self._detach(entry))
+                entry = _Entry(self, key, version, asdffile)
+                asdffile._external_cache_entry = entry
+                self._entries[key] = entry
+                to_close.extend(self._evict())
+
+        _close_all(to_close)
+        return asdffile
+
+    def release(self, asdffile):
+        """
+        Remove a reference to a file returned by `acquire`.
+
+        Parameters
+        ----------
+        asdffile : AsdfFile
+        """
+        entry = asdffile._external_cache_entry
+        with self._lock:
+            entry.refcount -= 1
+            if entry.detached:
+                to_close = [] if entry.refcount else [asdffile]
+            else:
+                to_close = self._evict()
+        _close_all(to_close)
+
+    def clear(self):
+        """
+        Remove all files from the cache.  The ones that are no longer
+        referenced are closed now, and the others once they are
+        released.
+        """
+        to_close = []
+        with self._lock:
+            for entry in list(self._entries.values()):
+                to_close.extend(self._detach(entry))
+        _close_all(to_close)
+
+    def _detach(self, entry):
+        del self._entries[entry.key]
+        entry.detached = True
+        if entry.refcount:
+            return []
+        return [entry.asdffile]
+
+    def _evict(self):
+        to_close = []
+        excess = len(self._entries) - self.max_size
+        if excess > 0:
+            for entry in list(self._entries.values()):
+                if entry.refcount == 0:
+                    to_close.extend(self._detach(entry))
+                    excess -= 1
+                    if excess == 0:
+                        break
+        return to_close
+
+
+def _close_all(asdffiles):
+    for asdffile in asdffiles:
+        asdffile.__dict__.pop('_external_cache_entry', None)
+        asdffile.close()
+
+
+def release(asdffile):
+    """
+    Release an external file, if it was opened through an
+    `ExternalFileCache`.
+
+    Returns
+    -------
+    released : bool
+        `False` if the file isn't from a cache, in which case the
+        caller should close it.
+    """
+    entry = getattr(asdffile, '_external_cache_entry', None)
+    if entry is None:
+        return False
+    entry.cache.release(asdffile)
+    return True
+
+
+#: The cache used by `AsdfFile.open_external`, or `None` (the
+#: default) to only share the external files opened by each file
+#: with itself.
+cache = None
@@ -14,11 +14,14 @@ from __future__ import absolute_import, division, unicode_literals, print_functi
 from distutils.version import LooseVersion
 import io
 import math
+import mmap
 import os
 import platform
 import re
+import shutil
 import sys
 import tempfile
+import threading
 
 from os import SEEK_SET, SEEK_CUR, SEEK_END
 
@@ -34,7 +37,8 @@ from .extern import atomicfile
 from . import util
 
 
-__all__ = ['get_file', 'resolve_uri', 'relative_uri']
+__all__ = ['get_file', 'register_backend', 'unregister_backend',
+           'resolve_uri', 'relative_uri']
 
 
 _local_file_schemes = ['', 'file']
@@ -43,6 +47,59 @@ if sys.platform.startswith('win'):  # pragma: no cover
     _local_file_schemes.extend(string.ascii_letters)
 
 
+class IOHints(object):
+    """
+    The hints about access patterns that `RealFile` passes on to the
+    operating system.  Each hint is silently ignored on platforms
+    that do not support it.
+
+    The hints for new files are taken from `generic_io.io_hints`,
+    and can be changed for a single file through its ``io_hints``
+    attribute.
+    """
+    def __init__(self, random=True, willneed=True, preallocate=True,
+                 dontneed=False):
+        """
+        Parameters
+        ----------
+        random : bool, optional
+            Advise random access (``POSIX_FADV_RANDOM``) when a block
+            is memory mapped, so accessing part of an array does not
+            trigger unneeded readahead.
+
+        willneed : bool, optional
+            Advise that a block will be needed
+            (``POSIX_FADV_WILLNEED``) before reading it into memory,
+            so the kernel can read it in as a whole.
+
+        preallocate : bool, optional
+            Preallocate the space for blocks whose size is known
+            before writing them (``posix_fallocate``), to reduce
+            fragmentation on disk.
+
+        dontneed : bool, optional
+            When a file that was written is closed, flush it to disk
+            and advise that its pages are no longer needed
+            (``POSIX_FADV_DONTNEED``), so writing large files doesn't
+            evict everything else from the page cache.  Off by
+            default, since it requires waiting for the data to be
+            written out.
+        """
+        self.random = random
+        self.willneed = willneed
+        self.preallocate = preallocate
+        self.dontneed = dontneed
+
+
+io_hints = IOHints()
+
+
+_fadvise_advice = {}
+for _name in ('random', 'willneed', 'dontneed'):
+    if hasattr(os, 'POSIX_FADV_' + _name.upper()):
+        _fadvise_advice[_name] = getattr(os, 'POSIX_FADV_' + _name.upper())
+
+
 def _check_bytes(fd, mode):
     """
     Checks whether a given file-like object is opened in binary mode.
@@ -190,11 +247,19 @@ class _TruncatedReader(object):
     Reads until a given delimiter is found.  Only works with
     RandomAccessFile and InputStream, though as this is a private
     class, this is not explicitly enforced.
+
+    The search for the delimiter is incremental: the reader remembers
+    how far it has already searched, so each byte is only scanned
+    once, apart from a `readahead_bytes` overlap at window
+    boundaries.  Once the delimiter has been located, the remaining
+    content is read directly, without further peeking.  Files that
+    can be searched in place (see `GenericFile._search`) locate the
+    delimiter in a single pass on the first read.
     """
     def __init__(self, fd, delimiter, readahead_bytes, delimiter_name=None,
                  include=False, initial_content=b'', exception=True):
         self._fd = fd
-        self._delimiter = delimiter
+        self._delimiter = re.compile(delimiter)
         self._readahead_bytes = readahead_bytes
         if delimiter_name is None:
             delimiter_name = delimiter
@@ -203,32 +268,104 @@ class _TruncatedReader(object):
         self._initial_content = initial_content
         self._exception = exception
         self._past_end = False
+        # All offsets are relative to the position of the file when
+        # the reader was created.
+        self._pos = 0
+        # No match can start before this offset
+        self._scanned = 0
+        # The offset at which to stop reading, once it is known
+        self._end = None
+        self._found = False
+
+    def _set_end(self, end, found):
+        self._end = end
+        self._found = found
+
+    def _scan(self, nbytes):
+        """
+        Searches for the delimiter in the content following the
+        current position, without consuming it.  Returns the content
+        that was peeked at, and sets ``self._end`` if the end of the
+        content could be determined.
+        """
+        if self._pos == 0:
+            span = self._fd._search(self._delimiter)
+            if span is not None:
+                start, end, size = span
+                if start < 0:
+                    self._set_end(size, False)
+                elif self._include:
+                    self._set_end(end, True)
+                else:
+                    self._set_end(start, True)
+                return None
+
+        if nbytes is None:
+            size = -1
+        else:
+            size = nbytes + self._readahead_bytes
+        while True:
+            content = self._fd._peek(size)
+            at_eof = size < 0 or len(content) < size
+
+            match = self._delimiter.search(
+                content, max(self._scanned - self._pos, 0))
+            if match is not None and (at_eof or match.end() < len(content)):
+                if self._include:
+                    self._set_end(self._pos + match.end(), True)
+                else:
+                    self._set_end(self._pos + match.start(), True)
+                return content
+
+            if at_eof:
+                self._set_end(self._pos + len(content), False)
+                return content
+
+            if match is not None:
+                # The match touches the end of the window, so it may
+                # continue (or not be a match at all) with more data
+                limit = match.start()
+            else:
+                limit = max(len(content) - self._readahead_bytes, 0)
+            self._scanned = self._pos + limit
+
+            if limit > 0:
+                return content[:min(limit, nbytes)]
+            size *= 2
 
     def read(self, nbytes=None):
         if self._past_end:
             return b''
 
-        if nbytes is None:
-            content = self._fd._peek()
-        else:
-            content = self._fd._peek(nbytes + self._readahead_bytes)
-        if content == b'':
-            if self._exception:
-                raise ValueError("{0} not found".format(self._delimiter_name))
-            self._past_end = True
-            return content
-
-        index = re.search(self._delimiter, content)
-        if index is not None:
-            if self._include:
-                index = index.end()
+        content = None
+        if self._end is None:
+            content = self._scan(nbytes)
+
+        if self._end is not None:
+            remaining = self._end - self._pos
+            if remaining == 0 and not self._found:
+                if self._exception:
+                    raise ValueError(
+                        "{0} not found".format(self._delimiter_name))
+                self._past_end = True
+                return b''
+
+            if nbytes is None or nbytes >= remaining:
+                nbytes = remaining
+                if self._found:
+                    self._past_end = True
+
+            if content is not None and len(content) >= nbytes:
+                content = content[:nbytes]
+                self._fd.fast_forward(nbytes)
+            elif nbytes:
+                content = self._fd.read(nbytes)
             else:
-                index = index.start()
-            content = content[:index]
-            self._past_end = True
+                content = b''
+        else:
+            self._fd.fast_forward(len(content))
 
-        content = content[:nbytes]
-        self._fd.fast_forward(len(content))
+        self._pos += len(content)
 
         if self._initial_content:
             content = self._initial_content + content
@@ -247,6 +384,12 @@ class GenericFile(object):
     This class should not be instantiated directly, but instead the
     factory function `get_file` should be used to get the correct
     subclass for the given file-like object.
+
+    When a file is used from several threads at once, any sequence of
+    calls that depends on the file position (such as a `seek`
+    followed by a `read`) must hold the `position_lock`.  The
+    positional methods of `RandomAccessFile` don't depend on the file
+    position, and may be called without it.
     """
     def __init__(self, fd, mode, close=False, uri=None):
         """
@@ -281,6 +424,7 @@ class GenericFile(object):
         self._blksize = io.DEFAULT_BUFFER_SIZE
         self._size = None
         self._uri = uri
+        self.position_lock = threading.RLock()
 
     def __enter__(self):
         return self
@@ -442,6 +586,21 @@ class GenericFile(object):
         """
         return False
 
+    def can_fetch_ranges(self):
+        """
+        Returns `True` if `fetch_ranges` can transfer many byte ranges
+        more efficiently than reading them one at a time.
+        """
+        return False
+
+    def can_read_parallel(self):
+        """
+        Returns `True` if `read_range` may be called from several
+        threads at once, and doing so is faster than reading the
+        ranges one at a time.
+        """
+        return False
+
     def is_closed(self):
         """
         Returns `True` if the underlying file object is closed.
@@ -490,17 +649,17 @@ class GenericFile(object):
         ValueError :
             If the delimiter is not found before the end of the file.
         """
-        buff = io.BytesIO()
+        buff = []
         reader = self.reader_until(
             delimiter, readahead_bytes, delimiter_name=delimiter_name,
             include=include, initial_content=initial_content,
             exception=exception)
         while True:
             content = reader.read(self.block_size)
-            buff.write(content)
-            if len(content) < self.block_size:
+            if content == b'':
                 break
-        return buff.getvalue()
+            buff.append(content)
+        return b''.join(buff)
 
     def reader_until(self, delimiter, readahead_bytes,
                      delimiter_name=None, include=True,
@@ -603,6 +762,51 @@ class GenericFile(object):
         """
         raise NotImplementedError()
 
+    def advise(self, advice, offset=0, size=0):
+        """
+        Advise the operating system about how a range of the file
+        will be accessed.  Only has an effect on `RealFile`, and only
+        if enabled by its `IOHints`.
+
+        Parameters
+        ----------
+        advice : str
+            One of ``'random'``, ``'willneed'`` or ``'dontneed'``.
+
+        offset : int, optional
+            The start of the range.
+
+        size : int, optional
+            The size of the range.  If 0, the range extends to the end
+            of the file.
+        """
+        pass
+
+    def preallocate(self, offset, size):
+        """
+        Allocate disk space for a range of the file that is about to
+        be written.  Only has an effect on `RealFile`, and only if
+        enabled by its `IOHints`.
+        """
+        pass
+
+    def _search(self, regex):
+        """
+        Search for a compiled regular expression in the rest of the
+        file, starting at the current position, without reading the
+        content into memory.  The file position is not changed.
+
+        Returns
+        -------
+        span : tuple or None
+            ``None`` if the file does not support searching in place.
+            Otherwise, a tuple ``(start, end, size)`` of offsets
+            relative to the current position, where ``size`` is the
+            number of bytes remaining in the file.  ``start`` and
+            ``end`` are ``-1`` if there is no match.
+        """
+        return None
+
     def clear(self, nbytes):
         """
         Write nbytes of zeros.
@@ -612,7 +816,7 @@ class GenericFile(object):
             length = min(nbytes - i, self.block_size)
             self.write(blank_data[:length])
 
-    def memmap_array(self, offset, size):
+    def memmap_array(self, offset, size, copy_on_write=False):
         """
         Memmap a chunk of the file into a `np.core.memmap` object.
 
@@ -624,6 +828,10 @@ class GenericFile(object):
         size : integer
             The size of the data to memmap.
 
+        copy_on_write : bool, optional
+            When `True`, the array is writable, but changes to it are
+            private to the array, and are never written to the file.
+
         Returns
         -------
         array : np.core.memmap
@@ -646,6 +854,21 @@ class GenericFile(object):
         buff = self.read(size)
         return np.frombuffer(buff, np.uint8, size, 0)
 
+    def fetch_ranges(self, ranges):
+        """
+        Hint that a number of byte ranges in the file will be read
+        soon.  For most file types this does nothing, but for remote
+        files it allows all of the ranges to be transferred at once,
+        rather than one request per range.
+
+        Parameters
+        ----------
+        ranges : list of (int, int) tuples
+            Each entry is a ``(start, end)`` pair of byte offsets,
+            where ``end`` is exclusive.
+        """
+        pass
+
 
 class GenericWrapper(object):
     """
@@ -668,10 +891,49 @@ class GenericWrapper(object):
 class RandomAccessFile(GenericFile):
     """
     The base class of file types that support random access.
+
+    Storage backends registered with `register_backend` should
+    subclass this, and override the capability methods
+    (`can_memmap`, `can_fetch_ranges` and `can_read_parallel`) to
+    declare which read strategies they support.
     """
     def seekable(self):
         return True
 
+    def read_range(self, offset, size):
+        """
+        Read `size` bytes at the given `offset`, without changing the
+        file position.  It may be called from several threads at
+        once.
+
+        The default implementation seeks while holding the
+        `position_lock`, so calls from several threads are
+        serialized.  Backends that return `True` from
+        `can_read_parallel` must override it with one that isn't.
+        """
+        with self.position_lock:
+            cursor = self.tell()
+            try:
+                self.seek(offset, SEEK_SET)
+                return self.read(size)
+            finally:
+                self.seek(cursor, SEEK_SET)
+
+    def read_range_into_array(self, offset, size):
+        """
+        Read `size` bytes at the given `offset` into a uint8 array, as
+        `read_into_array` does, without changing the file position.
+        It may be called from several threads at once.
+
+        The default implementation uses `read_range`.
+        """
+        result = np.frombuffer(self.read_range(offset, size), np.uint8)
+        if len(result) != size:
+            raise IOError("Read past end of file")
+        if 'w' in self._mode:
+            result = result.copy()
+        return result
+
     def _peek(self, size=-1):
         cursor = self.tell()
         content = self.read(size)
@@ -726,6 +988,12 @@ class RandomAccessFile(GenericFile):
 class RealFile(RandomAccessFile):
     """
     Handles "real" files on a filesystem.
+
+    When the file is opened read-only, it is memory mapped, and all
+    reading, seeking and searching is performed on the memory map
+    rather than through system calls on the file.  The position of
+    the underlying file object is only updated when the `RealFile` is
+    closed.
     """
     def __init__(self, fd, mode, close=False, uri=None):
         super(RealFile, self).__init__(fd, mode, close=close, uri=uri)
@@ -741,6 +1009,134 @@ class RealFile(RandomAccessFile):
             isinstance(fd.name, six.string_types)):
             self._uri = util.filepath_to_url(os.path.abspath(fd.name))
 
+        self.io_hints = io_hints
+
+        self._mmap = None
+        if mode == 'r' and self._size > 0:
+            try:
+                self._pos = fd.tell()
+                self._mmap = mmap.mmap(
+                    fd.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError, OverflowError):
+                # Not all files can be memory mapped (or be mapped in
+                # their entirety on 32-bit platforms).  Those are just
+                # read the usual way.
+                self._mmap = None
+
+    def __exit__(self, type, value, traceback):
+        self._close_mmap()
+        self._drop_written()
+        super(RealFile, self).__exit__(type, value, traceback)
+
+    def advise(self, advice, offset=0, size=0):
+        if (advice not in _fadvise_advice or
+            not getattr(self.io_hints, advice, False) or
+            self._fd.closed):
+            return
+        try:
+            os.posix_fadvise(
+                self._fd.fileno(), offset, size, _fadvise_advice[advice])
+        except (EnvironmentError, ValueError):
+            pass
+
+    def preallocate(self, offset, size):
+        if (not hasattr(os, 'posix_fallocate') or
+            not self.io_hints.preallocate or
+            size <= 0):
+            return
+        try:
+            os.posix_fallocate(self._fd.fileno(), offset, size)
+        except (EnvironmentError, ValueError):
+            pass
+
+    def _drop_written(self):
+        if ('w' not in self._mode or
+            not self.io_hints.dontneed or
+            'dontneed' not in _fadvise_advice or
+            self._fd.closed):
+            return
+        # Dirty pages can not be dropped, so they must be written out
+        # first
+        self._fd.flush()
+        try:
+            os.fsync(self._fd.fileno())
+        except (EnvironmentError, ValueError):
+            return
+        self.advise('dontneed')
+
+    def _close_mmap(self):
+        if self._mmap is not None:
+            mm = self._mmap
+            self._mmap = None
+            if not self._fd.closed:
+                self._fd.seek(self._pos, SEEK_SET)
+            mm.close()
+
+    def close(self):
+        self._close_mmap()
+        self._drop_written()
+        super(RealFile, self).close()
+
+    def read(self, size=-1):
+        if self._mmap is None:
+            return super(RealFile, self).read(size)
+        start = self._pos
+        if size < 0:
+            end = len(self._mmap)
+        else:
+            end = min(start + size, len(self._mmap))
+        if start >= end:
+            return b''
+        self._pos = end
+        return self._mmap[start:end]
+
+    def read_range(self, offset, size):
+        mm = self._mmap
+        if mm is not None:
+            return mm[offset:offset + size]
+        if not hasattr(os, 'pread'):
+            return super(RealFile, self).read_range(offset, size)
+        if 'w' in self._mode:
+            # Anything buffered must be visible to the read
+            self._fd.flush()
+        chunks = []
+        fileno = self._fd.fileno()
+        while size > 0:
+            chunk = os.pread(fileno, size, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def can_read_parallel(self):
+        return self._mmap is not None or hasattr(os, 'pread')
+
+    def _peek(self, size=-1):
+        if self._mmap is None:
+            return super(RealFile, self)._peek(size)
+        if size < 0:
+            return self._mmap[self._pos:]
+        return self._mmap[self._pos:self._pos + size]
+
+    def seek(self, offset, whence=0):
+        if self._mmap is None:
+            return super(RealFile, self).seek(offset, whence)
+        if whence == SEEK_CUR:
+            offset += self._pos
+        elif whence == SEEK_END:
+            offset += len(self._mmap)
+        if offset < 0:
+            raise IOError("Invalid seek to negative position")
+        self._pos = offset
+        return offset
+
+    def tell(self):
+        if self._mmap is None:
+            return super(RealFile, self).tell()
+        return self._pos
+
     def write_array(self, arr):
         if isinstance(arr, np.memmap) and getattr(arr, 'fd', None) is self:
             arr.flush()
@@ -751,18 +1147,68 @@ class RealFile(RandomAccessFile):
     def can_memmap(self):
         return True
 
-    def memmap_array(self, offset, size):
-        if 'w' in self._mode:
+    def memmap_array(self, offset, size, copy_on_write=False):
+        if copy_on_write:
+            mode = 'c'
+        elif 'w' in self._mode:
             mode = 'r+'
         else:
             mode = 'r'
-        mmap = np.memmap(
-            self._fd, mode=mode, offset=offset, shape=size)
+        self.advise('random', offset, size)
+        # Creating the memory map moves the position of the underlying
+        # file object
+        with self.position_lock:
+            pos = self._fd.tell()
+            try:
+                mmap = np.memmap(
+                    self._fd, mode=mode, offset=offset, shape=size)
+            finally:
+                self._fd.seek(pos, SEEK_SET)
         mmap.fd = self
         return mmap
 
     def read_into_array(self, size):
-        return _array_fromfile(self._fd, size)
+        if self._mmap is None:
+            return _array_fromfile(self._fd, size)
+        if size < 0:
+            size = max(len(self._mmap) - self._pos, 0)
+        elif self._pos + size > len(self._mmap):
+            raise IOError("Read past end of file")
+        # Copy the data, so the memory map isn't kept alive by the
+        # array
+        result = np.frombuffer(
+            self._mmap, np.uint8, size, self._pos).copy()
+        self._pos += size
+        return result
+
+    def _search(self, regex):
+        if self._mmap is not None:
+            mm = self._mmap
+            pos = self._pos
+            size = len(mm)
+            if pos >= size:
+                return None
+            match = regex.search(mm, pos)
+            if match is None:
+                return (-1, -1, size - pos)
+            return (match.start() - pos, match.end() - pos, size - pos)
+
+        try:
+            self._fd.flush()
+            pos = self._fd.tell()
+            size = os.fstat(self._fd.fileno()).st_size
+            if pos >= size:
+                return None
+            mm = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError, OverflowError):
+            return None
+        try:
+            match = regex.search(mm, pos)
+            if match is None:
+                return (-1, -1, size - pos)
+            return (match.start() - pos, match.end() - pos, size - pos)
+        finally:
+            mm.close()
 
 
 class MemoryIO(RandomAccessFile):
@@ -778,33 +1224,141 @@ class MemoryIO(RandomAccessFile):
         fd.seek(tell, 0)
 
     def read_into_array(self, size):
-        result = np.frombuffer(
-            self._fd.getvalue(), np.uint8, size, self._fd.tell())
-        # When creating an array from a buffer, it is read-only.
-        # If we need a read/write array, we have to copy it.
+        with self.position_lock:
+            offset = self._fd.tell()
+            result = self.read_range_into_array(offset, size)
+            self.seek(offset + len(result), SEEK_SET)
+        return result
+
+    def read_range(self, offset, size):
+        getbuffer = getattr(self._fd, 'getbuffer', None)
+        if getbuffer is None:
+            return super(MemoryIO, self).read_range(offset, size)
+        view = getbuffer()
+        try:
+            return view[offset:offset + size].tobytes()
+        finally:
+            view.release()
+
+    def read_range_into_array(self, offset, size):
+        getbuffer = getattr(self._fd, 'getbuffer', None)
+        if getbuffer is not None:
+            # This is a view on the underlying buffer, not a copy of
+            # it.  As long as the array (or anything derived from it)
+            # is alive, the BytesIO object refuses to be modified or
+            # resized.
+            result = np.frombuffer(getbuffer(), np.uint8, size, offset)
+        else:
+            # Only copy the requested range, not the whole buffer
+            result = np.frombuffer(
+                self.read_range(offset, size), np.uint8, size)
         if 'w' in self._mode:
+            # The array must not alias a buffer that may be rewritten
             result = result.copy()
-        self.seek(size, SEEK_CUR)
+        else:
+            result.flags.writeable = False
         return result
 
+    def _search(self, regex):
+        getbuffer = getattr(self._fd, 'getbuffer', None)
+        if getbuffer is None:
+            return None
+        pos = self._fd.tell()
+        view = getbuffer()
+        try:
+            size = len(view) - pos
+            match = regex.search(view, pos)
+            if match is None:
+                return (-1, -1, size)
+            return (match.start() - pos, match.end() - pos, size)
+        finally:
+            # The BytesIO object can not be resized while the view
+            # is alive
+            match = None
+            view.release()
+
 
 class InputStream(GenericFile):
     """
     Handles an input stream, such as stdin.
+
+    Data that has been peeked at, but not yet consumed, is kept in a
+    `bytearray`.  Consuming data from it only moves a cursor forward,
+    and the consumed space is reclaimed only once it makes up at least
+    half of the buffer, so peeking and reading are amortized O(1) in
+    the amount of buffered data.
     """
     def __init__(self, fd, mode='r', close=False, uri=None):
         super(InputStream, self).__init__(fd, mode, close=close, uri=uri)
         self._fd = fd
-        self._buffer = b''
+        self._buffer = bytearray()
+        # The position of the first unconsumed byte in self._buffer
+        self._buffer_pos = 0
+        self._readinto = getattr(fd, 'readinto', None)
 
-    def _peek(self, size=-1):
+    def _buffered(self):
+        return len(self._buffer) - self._buffer_pos
+
+    def _compact(self):
+        if self._buffer_pos:
+            del self._buffer[:self._buffer_pos]
+            self._buffer_pos = 0
+
+    def _clear(self):
+        self._buffer = bytearray()
+        self._buffer_pos = 0
+
+    def _fill(self, size):
+        """
+        Read from the underlying file until at least `size` bytes are
+        buffered, or the end of the file is reached.  If `size` is
+        negative, read until the end of the file.
+        """
         if size < 0:
-            self._buffer += self._fd.read()
+            self._compact()
+            self._buffer.extend(self._fd.read())
+            return
+
+        needed = size - self._buffered()
+        if needed <= 0:
+            return
+
+        if self._buffer_pos >= len(self._buffer) // 2:
+            self._compact()
+
+        buffer = self._buffer
+        if self._readinto is None:
+            while needed > 0:
+                content = self._fd.read(needed)
+                if not content:
+                    break
+                buffer.extend(content)
+                needed -= len(content)
         else:
-            len_buffer = len(self._buffer)
-            if len_buffer < size:
-                self._buffer += self._fd.read(size - len_buffer)
-        return self._buffer
+            end = len(buffer)
+            buffer.extend(b'\0' * needed)
+            view = memoryview(buffer)
+            try:
+                while needed > 0:
+                    nread = self._readinto(view[end:end + needed])
+                    if not nread:
+                        break
+                    end += nread
+                    needed -= nread
+            finally:
+                del view
+            del buffer[end:]
+
+    def _get_buffered(self, size=-1):
+        # Copies the next `size` buffered bytes (or all of them) only
+        # once, where slicing the bytearray first would copy them twice
+        start = self._buffer_pos
+        end = len(self._buffer) if size < 0 else start + size
+        return memoryview(self._buffer)[start:end].tobytes()
+
+    def _peek(self, size=-1):
+        self._fill(size)
+        return self._get_buffered(size)
 
     def read(self, size=-1):
         # On Python 3, reading 0 bytes from a socket causes it to stop
@@ -812,23 +1366,21 @@ class InputStream(GenericFile):
         if size == 0:
             return b''
 
-        len_buffer = len(self._buffer)
+        len_buffer = self._buffered()
         if len_buffer == 0:
             return self._fd.read(size)
-        elif size < 0:
-            self._buffer += self._fd.read()
-            buffer = self._buffer
-            self._buffer = b''
-            return buffer
-        elif len_buffer < size:
-            if len_buffer < size:
-                self._buffer += self._fd.read(size - len(self._buffer))
-            buffer = self._buffer
-            self._buffer = b''
-            return buffer
+        elif size < 0 or len_buffer < size:
+            buffer = self._get_buffered()
+            self._clear()
+            if size < 0:
+                return buffer + self._fd.read()
+            return buffer + self._fd.read(size - len_buffer)
         else:
-            buffer = self._buffer[:size]
-            self._buffer = self._buffer[size:]
+            buffer = self._get_buffered(size)
+            if len_buffer == size:
+                self._clear()
+            else:
+                self._buffer_pos += size
             return buffer
 
     def reader_until(self, delimiter, readahead_bytes, delimiter_name=None,
@@ -843,29 +1395,90 @@ class InputStream(GenericFile):
             raise IOError("Read past end of file")
 
     def read_into_array(self, size):
-        try:
-            # See if Numpy can handle this as a real file first...
-            return np.fromfile(self._fd, np.uint8, size)
-        except IOError:
-            # Else, fall back to reading into memory and then
-            # returning the Numpy array.
-            data = self.read(size)
-            # We need to copy the array, so it is writable
-            result = np.frombuffer(data, np.uint8, size)
-            # When creating an array from a buffer, it is read-only.
-            # If we need a read/write array, we have to copy it.
-            if 'w' in self._mode:
-                result = result.copy()
-            return result
+        # See if Numpy can handle this as a real file first.  This is
+        # only possible if there is nothing left in our buffer.
+        if not self._buffered():
+            try:
+                return np.fromfile(self._fd, np.uint8, size)
+            except (IOError, AttributeError):
+                pass
+
+        # Else, fall back to reading into memory and then returning
+        # the Numpy array.
+        data = self.read(size)
+        # We need to copy the array, so it is writable
+        result = np.frombuffer(data, np.uint8, size)
+        # When creating an array from a buffer, it is read-only.
+        # If we need a read/write array, we have to copy it.
+        if 'w' in self._mode:
+            result = result.copy()
+        return result
 
 
 class OutputStream(GenericFile):
     """
     Handles an output stream, such as stdout.
+
+    If `buffer_size` is given, small writes (the pieces of the YAML
+    tree, block headers and padding) are coalesced in a buffer of that
+    many bytes, so they reach the underlying stream in large writes.
+    Writes at least as large as the buffer, such as array data, are
+    passed straight through without being copied.  The buffer is
+    written out by `flush` and `close`.
+
+    Streams created by `get_file` use a buffer of
+    `default_buffer_size` bytes.  Streams created directly are
+    unbuffered unless `buffer_size` is given.
     """
-    def __init__(self, fd, close=False, uri=None):
+    #: The size of the write buffer, in bytes, of streams created by
+    #: `get_file`.
+    default_buffer_size = 1 << 20
+
+    def __init__(self, fd, close=False, uri=None, buffer_size=0):
         super(OutputStream, self).__init__(fd, 'w', close=close, uri=uri)
         self._fd = fd
+        self._buffer_size = buffer_size
+        self._buffer = bytearray()
+        # Pipes and sockets can't report their position, so keep
+        # track of it here
+        try:
+            self._pos = fd.tell()
+        except (AttributeError, IOError, OSError, ValueError):
+            self._pos = 0
+
+    def __exit__(self, type, value, traceback):
+        self._flush_buffer()
+        super(OutputStream, self).__exit__(type, value, traceback)
+
+    def _flush_buffer(self):
+        if len(self._buffer):
+            self._fd.write(bytes(self._buffer))
+            del self._buffer[:]
+
+    def write(self, content):
+        try:
+            size = memoryview(content).nbytes
+        except (TypeError, AttributeError):
+            size = len(content)
+
+        if len(self._buffer) + size > self._buffer_size:
+            self._flush_buffer()
+        if size >= self._buffer_size:
+            super(OutputStream, self).write(content)
+        else:
+            self._buffer += content
+        self._pos += size
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        self._flush_buffer()
+        super(OutputStream, self).flush()
+
+    def close(self):
+        self._flush_buffer()
+        super(OutputStream, self).close()
 
     def fast_forward(self, size):
         if size < 0:
@@ -885,6 +1498,14 @@ class HTTPConnection(RandomAccessFile):
     """
     # TODO: Handle HTTPS connection
 
+    # Gaps between requested ranges smaller than this are transferred
+    # along with the ranges, rather than splitting the request
+    _coalesce_bytes = 64 * 1024
+
+    # The maximum number of ranges to put in a single request, to keep
+    # the request header a reasonable size
+    _max_ranges_per_request = 128
+
     def __init__(self, connection, size, path, uri, first_chunk):
         self._mode = 'r'
         self._blksize = io.DEFAULT_BUFFER_SIZE
@@ -894,6 +1515,9 @@ class HTTPConnection(RandomAccessFile):
         self._fd = connection
         self._path = path
         self._uri = uri
+        # Also serializes the use of the connection and of the map of
+        # the blocks in the local cache
+        self.position_lock = threading.RLock()
 
         # A bitmap of the blocks that we've already read and cached
         # locally
@@ -912,6 +1536,10 @@ class HTTPConnection(RandomAccessFile):
         self._size = size
         self._nreads = 0
 
+        # Whether to try multi-range requests in `fetch_ranges`.  This
+        # is turned off the first time the server fails to handle one.
+        self._multirange = True
+
         # Some methods just short-circuit to the local copy
         self.seek = self._local.seek
         self.tell = self._local.tell
@@ -934,77 +1562,280 @@ class HTTPConnection(RandomAccessFile):
     def is_closed(self):
         return self._closed
 
-    def _get_range(self, start, end):
+    def _has_block(self, x):
+        return self._blocks[x >> 3] & (1 << (x & 0x7))
+
+    def _mark_block(self, x):
+        self._blocks[x >> 3] |= (1 << (x & 0x7))
+
+    def _mark_range(self, start, end):
         """
-        Ensure the range of bytes has been copied to the local cache.
+        Mark the cache blocks entirely contained in the byte range
+        [start, end) as loaded.
         """
+        block_size = self.block_size
+        block_start = (start + block_size - 1) // block_size
+        if end >= self._size:
+            block_end = (self._size + block_size - 1) // block_size
+        else:
+            block_end = end // block_size
+        for i in xrange(block_start, block_end):
+            self._mark_block(i)
+
+    def _missing_spans(self, start, end):
+        """
+        Find the runs of cache blocks in the byte range [start, end)
+        that have not yet been copied to the local cache.
+
+        Returns a list of ``(a, b)`` pairs of cache block indices,
+        where ``b`` is exclusive.
+        """
+        spans = []
+
         if start >= self._size:
-            return
+            return spans
 
         end = min(end, self._size)
 
         blocks = self._blocks
         block_size = self.block_size
-
-        def has_block(x):
-            return blocks[x >> 3] & (1 << (x & 0x7))
-
-        def mark_block(x):
-            blocks[x >> 3] |= (1 << (x & 0x7))
+        has_block = self._has_block
 
         block_start = start // block_size
         block_end = end // block_size + 1
 
-        pos = self._local.tell()
+        # Between block_start and block_end, some blocks may be
+        # already loaded.  We want to load all of the missing
+        # blocks in as few requests as possible.
+        a = block_start
+        while a < block_end:
+            # Skip over whole groups of blocks at a time
+            while a < block_end and blocks[a >> 3] == 0xff:
+                a = ((a >> 3) + 1) << 3
+            while a < block_end and has_block(a):
+                a += 1
+            if a >= block_end:
+                break
+
+            b = a + 1
+            # Skip over whole groups of blocks at a time
+            while b < block_end and blocks[b >> 3] == 0x0:
+                b = ((b >> 3) + 1) << 3
+            while b < block_end and not has_block(b):
+                b += 1
+            if b > block_end:
+                b = block_end
+
+            if a * block_size >= self._size:
+                break
+
+            spans.append((a, b))
+            a = b
+
+        return spans
 
+    def _span_to_byte_range(self, span):
+        a, b = span
+        return (a * self.block_size,
+                min(b * self.block_size, self._size) - 1)
+
+    def _request(self, ranges):
+        headers = {
+            'Range': 'bytes=' + ','.join(
+                '{0}-{1}'.format(*x) for x in ranges)}
+        self._fd.request('GET', self._path, headers=headers)
+        self._nreads += 1
+        return self._fd.getresponse()
+
+    def _copy_to_local(self, response, start, nbytes):
+        """
+        Copy ``nbytes`` from the response to the local cache at offset
+        ``start``.
+        """
+        block_size = self.block_size
+        self._local.seek(start, os.SEEK_SET)
+        while nbytes > 0:
+            chunk = response.read(min(nbytes, block_size))
+            if not chunk:
+                raise IOError("HTTP response ended prematurely")
+            self._local.write(chunk)
+            nbytes -= len(chunk)
+
+    def _fetch_span(self, span):
+        start, end = self._span_to_byte_range(span)
+        response = self._request([(start, end)])
         try:
-            # Between block_start and block_end, some blocks may be
-            # already loaded.  We want to load all of the missing
-            # blocks in as few requests as possible.
-            a = block_start
-            while a < block_end:
-                # Skip over whole groups of blocks at a time
-                while a < block_end and blocks[a >> 3] == 0xff:
-                    a = ((a >> 3) + 1) << 3
-                while a < block_end and has_block(a):
-                    a += 1
-                if a >= block_end:
+            if response.status != 206:
+                raise IOError("HTTP failed: {0} {1}".format(
+                    response.status, response.reason))
+
+            # Now copy over to the temporary file, block-by-block
+            self._copy_to_local(response, start, end - start + 1)
+        finally:
+            response.close()
+        self._mark_range(start, end + 1)
+
+    def _get_range(self, start, end):
+        """
+        Ensure the range of bytes has been copied to the local cache.
+        """
+        with self.position_lock:
+            pos = self._local.tell()
+            try:
+                for span in self._missing_spans(start, end):
+                    self._fetch_span(span)
+            finally:
+                self._local.seek(pos, os.SEEK_SET)
+
+    def _coalesce_spans(self, spans):
+        """
+        Merge overlapping spans of cache blocks, and spans separated
+        by a gap small enough that transferring the gap is cheaper
+        than another range in the request.
+        """
+        max_gap = self._coalesce_bytes // self.block_size
+        result = []
+        for a, b in sorted(spans):
+            if len(result) and a - result[-1][1] <= max_gap:
+                result[-1] = (result[-1][0], max(b, result[-1][1]))
+            else:
+                result.append((a, b))
+        return result
+
+    def _read_line(self, response):
+        # HTTPResponse objects on Python 2 do not have a readline
+        # method, and the part headers in a multipart response are
+        # short, so it's fine to read them a byte at a time.
+        line = []
+        while True:
+            c = response.read(1)
+            if not c:
+                break
+            line.append(c)
+            if c == b'\n':
+                break
+        return b''.join(line)
+
+    def _read_multipart(self, response, boundary):
+        """
+        Copy the parts of a ``multipart/byteranges`` response to the
+        local cache.
+        """
+        boundary = b'--' + boundary
+        while True:
+            line = self._read_line(response)
+            if line == b'':
+                raise IOError("HTTP multipart response ended prematurely")
+            line = line.strip()
+            if line == boundary + b'--':
+                break
+            if line != boundary:
+                continue
+
+            content_range = None
+            while True:
+                line = self._read_line(response).strip()
+                if line == b'':
                     break
+                key, _, value = line.partition(b':')
+                if key.strip().lower() == b'content-range':
+                    content_range = value.strip().decode('ascii')
+
+            if content_range is None:
+                raise IOError("HTTP multipart response missing Content-Range")
+            start, end = self._parse_content_range(content_range)
+            self._copy_to_local(response, start, end - start + 1)
+            self._mark_range(start, end + 1)
+
+    def _parse_content_range(self, content_range):
+        match = self._re_content_range.match(content_range)
+        if match is None:
+            raise IOError(
+                "Invalid Content-Range '{0}'".format(content_range))
+        return int(match.group(1)), int(match.group(2))
+
+    _re_content_range = re.compile(r'^bytes\s+(\d+)-(\d+)/(\d+|\*)$')
+
+    def _fetch_multirange(self, spans):
+        """
+        Fetch a number of spans in a single request.  Returns `False`
+        if the server could not satisfy a multi-range request.
+        """
+        from six.moves import http_client
+
+        ranges = [self._span_to_byte_range(x) for x in spans]
+        try:
+            response = self._request(ranges)
+        except (http_client.HTTPException, IOError, OSError):
+            self._fd.close()
+            return False
 
-                b = a + 1
-                # Skip over whole groups of blocks at a time
-                while b < block_end and blocks[b >> 3] == 0x0:
-                    b = ((b >> 3) + 1) << 3
-                while b < block_end and not has_block(b):
-                    b += 1
-                if b > block_end:
-                    b = block_end
-
-                if a * block_size >= self._size:
-                    return
-
-                headers = {
-                    'Range': 'bytes={0}-{1}'.format(
-                        a * block_size, (b * block_size) - 1)}
-                self._fd.request('GET', self._path, headers=headers)
-                response = self._fd.getresponse()
-                if response.status != 206:
-                    raise IOError("HTTP failed: {0} {1}".format(
-                        response.status, response.reason))
-
-                # Now copy over to the temporary file, block-by-block
-                self._local.seek(a * block_size, os.SEEK_SET)
-                for i in xrange(a, b):
-                    chunk = response.read(block_size)
-                    self._local.write(chunk)
-                    mark_block(i)
-                response.close()
-
-                self._nreads += 1
-
-                a = b
+        try:
+            content_type = response.getheader('content-type', '')
+            if response.status == 206:
+                parts = content_type.split(';')
+                if parts[0].strip().lower() == 'multipart/byteranges':
+                    boundary = None
+                    for part in parts[1:]:
+                        key, _, value = part.strip().partition('=')
+                        if key.lower() == 'boundary':
+                            boundary = value.strip('"').encode('ascii')
+                    if boundary is None:
+                        raise IOError(
+                            "HTTP multipart response has no boundary")
+                    self._read_multipart(response, boundary)
+                else:
+                    # The server is allowed to coalesce the ranges
+                    # into a single one
+                    start, end = self._parse_content_range(
+                        response.getheader('content-range', ''))
+                    self._copy_to_local(response, start, end - start + 1)
+                    self._mark_range(start, end + 1)
+            elif response.status == 200:
+                # The server ignored the ranges and sent everything,
+                # so we may as well keep it all.
+                self._copy_to_local(response, 0, self._size)
+                self._mark_range(0, self._size)
+            else:
+                self._fd.close()
+                return False
+        except (http_client.HTTPException, IOError, OSError):
+            # A partial response can not be recovered from, so start
+            # over with a fresh connection.
+            self._fd.close()
+            return False
         finally:
-            self._local.seek(pos, os.SEEK_SET)
+            response.close()
+
+        return True
+
+    def can_fetch_ranges(self):
+        return True
+
+    def fetch_ranges(self, ranges):
+        if self._closed:
+            raise IOError("read from closed connection")
+
+        with self.position_lock:
+            spans = []
+            for start, end in ranges:
+                spans.extend(self._missing_spans(start, end))
+            spans = self._coalesce_spans(spans)
+
+            pos = self._local.tell()
+            try:
+                while self._multirange and len(spans) > 1:
+                    batch = spans[:self._max_ranges_per_request]
+                    if not self._fetch_multirange(batch):
+                        # Fall back to one request per range from now on
+                        self._multirange = False
+                        break
+                    spans = spans[len(batch):]
+
+                for span in spans:
+                    self._fetch_span(span)
+            finally:
+                self._local.seek(pos, os.SEEK_SET)
 
     def read(self, size=-1):
         if self._closed:
@@ -1036,11 +1867,50 @@ class HTTPConnection(RandomAccessFile):
         self._get_range(pos, pos + size)
         return self._local.memmap_array(pos, size)
 
+    def read_range(self, offset, size):
+        if self._closed:
+            raise IOError("read from closed connection")
+
+        size = max(min(size, self._size - offset), 0)
+        if size == 0:
+            return b''
+
+        self._get_range(offset, offset + size)
+        return self._local.read_range(offset, size)
+
+    def read_range_into_array(self, offset, size):
+        if self._closed:
+            raise IOError("read from closed connection")
+
+        if offset + size > self._size:
+            raise IOError("Read past end of file.")
+
+        self._get_range(offset, offset + size)
+        return self._local.memmap_array(offset, size)
+
+
+def _spool_to_temporary_file(fd, block_size=1 << 20):
+    """
+    Copies the entire content of the file-like object *fd* to an
+    anonymous temporary file, which is deleted as soon as it is
+    closed.  Returns the temporary file, positioned at its start.
+    """
+    spool = tempfile.TemporaryFile()
+    try:
+        shutil.copyfileobj(fd, spool, block_size)
+        spool.flush()
+        spool.seek(0)
+    except:
+        spool.close()
+        raise
+    return spool
+
 
 def _make_http_connection(init, mode, uri=None):
     """
     Creates a HTTPConnection instance if the HTTP server supports
-    Range requests, otherwise falls back to a generic InputStream.
+    Range requests.  Otherwise, the file is downloaded once to a
+    temporary file, which is then read as a `RealFile`.
     """
     from six.moves import http_client
 
@@ -1067,10 +1937,17 @@ def _make_http_connection(init, mode, uri=None):
         response.getheader('accept-ranges', None) != 'bytes' or
         response.getheader('content-range', None) is None or
         response.getheader('content-length', None) is None):
-        # Fall back to a regular input stream, but we don't
-        # need to open a new connection.
-        response.close = connection.close
-        return InputStream(response, mode, uri=uri or init, close=True)
+        # Without Range support the file can only be read from
+        # start to end, and a stream would have to load every block
+        # into memory as soon as it is reached.  Instead, make one
+        # pass over the response to spool it to disk, so the blocks
+        # can be loaded lazily and memory mapped.
+        try:
+            fd = _spool_to_temporary_file(response)
+        finally:
+            response.close()
+            connection.close()
+        return RealFile(fd, mode, close=True, uri=uri or init)
 
     # Since we'll be requesting chunks, we can't read at all with the
     # current request (because we can't abort it), so just close and
@@ -1082,6 +1959,98 @@ def _make_http_connection(init, mode, uri=None):
                           first_chunk)
 
 
+def _open_http(init, mode, uri=None):
+    if 'w' in mode:
+        raise ValueError(
+            "HTTP connections can not be opened for writing")
+    return _make_http_connection(init, mode, uri=uri)
+
+
+def _open_local_file(init, mode, uri=None):
+    parsed = urlparse.urlparse(init)
+    if mode == 'rw':
+        realmode = 'r+b'
+    else:
+        realmode = mode + 'b'
+    realpath = url2pathname(parsed.path)
+    if mode == 'w':
+        fd = atomicfile.atomic_open(realpath, realmode)
+    else:
+        fd = open(realpath, realmode)
+    fd = fd.__enter__()
+    return RealFile(fd, mode, close=True, uri=uri)
+
+
+_backends = {'http': _open_http}
+for _scheme in _local_file_schemes:
+    _backends[_scheme] = _open_local_file
+# The schemes that `register_backend` added to the ones that `urlparse`
+# resolves relative URIs against
+_added_relative_schemes = set()
+
+
+def register_backend(scheme, opener):
+    """
+    Register a storage backend that handles URIs with the given
+    scheme.  `get_file` (and therefore `AsdfFile.open`, and the
+    resolution of references to external files) uses it to open any
+    URI with that scheme.
+
+    Parameters
+    ----------
+    scheme : str
+        The URI scheme, for example ``'http'``.  A backend already
+        registered for the scheme (including a builtin one) is
+        replaced.
+
+    opener : callable
+        Called as ``opener(url, mode, uri=uri)``, with the same
+        arguments as `get_file`, and must return a `GenericFile`
+        instance.  Random access backends should return an instance
+        of a `RandomAccessFile` subclass that declares its
+        capabilities.  It should raise `ValueError` if the backend
+        doesn't support the requested `mode`.
+
+    Returns
+    -------
+    previous : callable or None
+        The opener that was registered for the scheme before, if any,
+        so that it may be registered again later.
+    """
+    previous = _backends.get(scheme)
+    _backends[scheme] = opener
+    # Let relative URIs be resolved against URIs of this scheme
+    for schemes in (urlparse.uses_relative, urlparse.uses_netloc):
+        if scheme not in schemes:
+            schemes.append(scheme)
+            _added_relative_schemes.add(scheme)
+    return previous
+
+
+def unregister_backend(scheme):
+    """
+    Remove the storage backend registered for the given scheme, so
+    that URIs with that scheme can no longer be opened.
+
+    Parameters
+    ----------
+    scheme : str
+        The URI scheme.
+
+    Returns
+    -------
+    opener : callable or None
+        The opener that was registered for the scheme, if any.
+    """
+    opener = _backends.pop(scheme, None)
+    if scheme in _added_relative_schemes:
+        _added_relative_schemes.discard(scheme)
+        for schemes in (urlparse.uses_relative, urlparse.uses_netloc):
+            if scheme in schemes:
+                schemes.remove(scheme)
+    return opener
+
+
 def get_file(init, mode='r', uri=None):
     """
     Returns a `GenericFile` instance suitable for wrapping the given
@@ -1097,7 +2066,8 @@ def get_file(init, mode='r', uri=None):
         `init` may be:
 
         - A `bytes` or `unicode` file path or ``file:`` or ``http:``
-          url.
+          url, or a url with any scheme registered with
+          `register_backend`.
 
         - A Python 2 `file` object.
 
@@ -1150,23 +2120,9 @@ def get_file(init, mode='r', uri=None):
 
     elif isinstance(init, six.string_types):
         parsed = urlparse.urlparse(init)
-        if parsed.scheme == 'http':
-            if 'w' in mode:
-                raise ValueError(
-                    "HTTP connections can not be opened for writing")
-            return _make_http_connection(init, mode, uri=uri)
-        elif parsed.scheme in _local_file_schemes:
-            if mode == 'rw':
-                realmode = 'r+b'
-            else:
-                realmode = mode + 'b'
-            realpath = url2pathname(parsed.path)
-            if mode == 'w':
-                fd = atomicfile.atomic_open(realpath, realmode)
-            else:
-                fd = open(realpath, realmode)
-            fd = fd.__enter__()
-            return RealFile(fd, mode, close=True, uri=uri)
+        opener = _backends.get(parsed.scheme)
+        if opener is not None:
+            return opener(init, mode, uri=uri)
 
     elif isinstance(init, io.BytesIO):
         return MemoryIO(init, mode, uri=uri)
@@ -1185,7 +2141,9 @@ def get_file(init, mode='r', uri=None):
             init.tell()
         except IOError:
             if mode == 'w':
-                return OutputStream(init, uri=uri)
+                return OutputStream(
+                    init, uri=uri,
+                    buffer_size=OutputStream.default_buffer_size)
             elif mode == 'r':
                 return InputStream(init, mode, uri=uri)
             else:
@@ -1220,7 +2178,9 @@ def get_file(init, mode='r', uri=None):
             return result
         else:
             if mode == 'w':
-                return OutputStream(init, uri=uri)
+                return OutputStream(
+                    init, uri=uri,
+                    buffer_size=OutputStream.default_buffer_size)
             elif mode == 'r':
                 return InputStream(init, mode, uri=uri)
             else:
@@ -1247,7 +2207,8 @@ def get_file(init, mode='r', uri=None):
         return MemoryIO(init, mode, uri=uri)
 
     elif mode == 'w' and hasattr(init, 'write'):
-        return OutputStream(init, uri=uri)
+        return OutputStream(
+            init, uri=uri, buffer_size=OutputStream.default_buffer_size)
 
     elif mode == 'r' and hasattr(init, 'read'):
         return InputStream(init, mode, uri=uri)
@@ -0,0 +1,313 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+
+"""
+Containers that convert the tagged tree read from a file into custom
+types only as its nodes are accessed.  Used by ``AsdfFile.open(...,
+lazy_tree=True)``.
+"""
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import six
+
+from . import reference
+from . import schema
+from . import tagged
+from . import yamlutil
+
+
+__all__ = ['LazyDict', 'LazyList', 'make_lazy_tree']
+
+
+def _convert_all_first(cls, name):
+    """
+    Wraps a method of the dict or list base class of a lazy
+    container, so that all of the container's values are converted
+    before the method is run.
+    """
+    method = getattr(cls, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._convert_all()
+        # Comparisons must see the converted values on both sides
+        for arg in args:
+            if isinstance(arg, LazyNode):
+                arg._convert_all()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = str(name)
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def _rebuild(tag, base):
+    # Copies (and pickles) of lazy containers are regular containers
+    instance = base()
+    if tag is not None:
+        instance = tagged.tag_object(tag, instance)
+    return instance
+
+
+class LazyNode(object):
+    """
+    Base class of the lazy containers.
+
+    The values of a lazy container are stored as they were read from
+    the YAML tree.  Each value is converted on first access: a tagged
+    node with a known custom type has its references found, its
+    defaults filled in, is validated and is converted, along with
+    everything below it.  Any other tagged node has its defaults
+    filled in and is validated against the schema of its own tag.  Any
+    other dict or list is wrapped in a lazy container in turn.
+    """
+    def _init_lazy(self, ctx, json_id, do_not_fill_defaults, tag):
+        self._ctx = ctx
+        self._json_id = json_id
+        self._do_not_fill_defaults = do_not_fill_defaults
+        if tag is not None:
+            self._tag = tag
+
+    def _convert(self, value):
+        ctx = self._ctx
+        json_id = self._json_id
+        if isinstance(value, dict) and 'id' in value:
+            json_id = value['id']
+
+        if isinstance(value, dict) and '$ref' in value:
+            return reference.Reference(value['$ref'], json_id, asdffile=ctx)
+
+        tag = getattr(value, '_tag', None)
+        if tag is not None:
+            if ctx.type_index.from_yaml_tag(tag) is not None:
+                return _convert_subtree(
+                    value, ctx, self._do_not_fill_defaults)
+            # Any other tagged node is validated against the schema of
+            # its own tag, and the tagged nodes below it are validated
+            # as they are converted in turn
+            _validate_structure(value, ctx, self._do_not_fill_defaults)
+
+        if isinstance(value, dict):
+            return LazyDict(
+                value, ctx, json_id, self._do_not_fill_defaults, tag)
+        elif isinstance(value, list):
+            return LazyList(
+                value, ctx, json_id, self._do_not_fill_defaults, tag)
+        return value
+
+    def __reduce__(self):
+        base = dict if isinstance(self, dict) else list
+        items = iter(self.items()) if base is dict else None
+        listitems = iter(self) if base is list else None
+        # Only the root has a tag with a custom type, and its copy is
+        # a regular dict, which `AsdfFile` turns back into the root
+        # custom type.
+        tag = getattr(self, '_tag', None)
+        if (tag is not None and self._ctx is not None and
+                self._ctx.type_index.from_yaml_tag(tag) is not None):
+            tag = None
+        return (_rebuild, (tag, base), None, listitems, items)
+
+
+class LazyDict(LazyNode, dict):
+    """
+    A dict whose values are converted to custom types on first
+    access.
+
+    Only the Python methods convert the values.  C code that reads the
+    values directly, with ``PyDict_GetItem`` or ``PyDict_Next``, sees
+    them as they were read from the file if they haven't been accessed
+    yet.  On Python 2, this includes ``dict(x)``, ``**x`` and
+    ``dict.update(x)``, for which ``x.items()`` should be used instead.
+    On Python 3, those go through the methods.
+    """
+    def __init__(self, data=None, ctx=None, json_id=None,
+                 do_not_fill_defaults=False, tag=None):
+        if data is None:
+            data = {}
+        if isinstance(data, tagged.TaggedDict):
+            data = data.data
+        dict.__init__(self, data)
+        self._init_lazy(ctx, json_id, do_not_fill_defaults, tag)
+        if ctx is None:
+            self._pending = set()
+        else:
+            self._pending = set(dict.keys(self))
+
+    def _convert_key(self, key):
+        value = self._convert(dict.__getitem__(self, key))
+        dict.__setitem__(self, key, value)
+        self._pending.discard(key)
+        return value
+
+    def _convert_all(self):
+        for key in list(self._pending):
+            self._convert_key(key)
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            return self._convert_key(key)
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self._pending.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._pending.discard(key)
+        dict.__delitem__(self, key)
+
+    def __iter__(self):
+        # Only overridden so that, on Python 3, the C code that copies
+        # the items of a dict (as ``dict(x)``, ``**x`` and
+        # ``dict.update(x)`` do) goes through `__getitem__`, rather
+        # than reading the values that may not be converted yet
+        return dict.__iter__(self)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *default)
+
+    def update(self, *args, **kwargs):
+        for key, value in six.iteritems(dict(*args, **kwargs)):
+            self[key] = value
+
+    def clear(self):
+        self._pending.clear()
+        dict.clear(self)
+
+
+class LazyList(LazyNode, list):
+    """
+    A list whose items are converted to custom types the first time
+    any of them is accessed.
+
+    As with `LazyDict`, C code that reads the items directly, with
+    ``PyList_GetItem`` or ``PySequence_Fast``, sees them as they were
+    read from the file if none of them have been accessed yet.
+    """
+    def __init__(self, data=None, ctx=None, json_id=None,
+                 do_not_fill_defaults=False, tag=None):
+        if data is None:
+            data = []
+        if isinstance(data, tagged.TaggedList):
+            data = data.data
+        list.__init__(self, data)
+        self._init_lazy(ctx, json_id, do_not_fill_defaults, tag)
+        self._pending = ctx is not None
+
+    def __radd__(self, other):
+        # Python tries this before the ``__add__`` of a list on the
+        # left, which would read the items without converting them
+        if not isinstance(other, list):
+            return NotImplemented
+        self._convert_all()
+        return list.__add__(other, self)
+
+    def _convert_all(self):
+        if self._pending:
+            self._pending = False
+            for i in range(len(self)):
+                list.__setitem__(self, i, self._convert(
+                    list.__getitem__(self, i)))
+
+
+# Everything else that reads the values, or in the case of lists
+# modifies them, converts the entire container first.
+for _cls, _base, _names in [
+        (LazyDict, dict,
+         ['items', 'values', 'iteritems', 'itervalues', 'viewitems',
+          'viewvalues', 'popitem', 'copy', '__eq__', '__ne__',
+          '__repr__']),
+        (LazyList, list,
+         ['__getitem__', '__setitem__', '__delitem__', '__getslice__',
+          '__setslice__', '__delslice__', '__iter__', '__reversed__',
+          '__contains__', '__eq__', '__ne__', '__lt__', '__le__',
+          '__gt__', '__ge__', '__add__', '__iadd__', '__mul__',
+          '__rmul__', '__imul__', '__repr__', 'append', 'extend',
+          'insert', 'pop', 'remove', 'index', 'count', 'reverse',
+          'sort', 'copy'])]:
+    for _name in _names:
+        if hasattr(_base, _name):
+            setattr(_cls, _name, _convert_all_first(_base, _name))
+del _cls, _base, _names, _name
+
+
+def _convert_subtree(tree, ctx, do_not_fill_defaults):
+    """
+    Convert a tagged subtree to custom types, in the same way as
+    `AsdfFile.open` does for the entire tree.
+    """
+    tree = reference.find_references(tree, ctx)
+    if not do_not_fill_defaults:
+        schema.fill_defaults(tree, ctx)
+    schema.validate(tree, ctx)
+    tree = yamlutil.tagged_tree_to_custom_tree(tree, ctx)
+
+    hooks = ctx.type_index.find_hooks(
+        tree, ['post_read'], ctx.version_string)
+    for hook, node in hooks['post_read']:
+        hook(node, ctx)
+
+    return tree
+
+
+def _validate_structure(tree, ctx, do_not_fill_defaults):
+    """
+    Fill in the defaults of a tagged node and validate it, against the
+    schema of its own tag only.
+    """
+    if not do_not_fill_defaults:
+        schema.validate_structure(tree, ctx, schema.FILL_DEFAULTS)
+    schema.validate_structure(tree, ctx)
+
+
+def make_lazy_tree(tree, ctx, do_not_fill_defaults=False):
+    """
+    Wrap the tagged tree read from a file in a lazy container.
+
+    Only the root node is validated (and has its defaults filled in)
+    up front, against the schema of its own tag.  Everything below it
+    is converted, and each tagged node is validated, as it is
+    accessed.
+
+    Parameters
+    ----------
+    tree : dict
+        The tagged tree, as returned by `yamlutil.load_tree`.
+
+    ctx : AsdfFile
+        The file that the tree belongs to.
+
+    do_not_fill_defaults : bool, optional
+        When `True`, do not fill in missing default values.
+
+    Returns
+    -------
+    tree : LazyDict
+    """
+    _validate_structure(tree, ctx, do_not_fill_defaults)
+    return LazyDict(tree, ctx, None, do_not_fill_defaults,
+                    getattr(tree, '_tag', None))
+
+
+# The containers created by `treeutil.walk_and_modify` when a lazy
+# tree is written out are lazy containers with nothing left to
+# convert.
+yamlutil.AsdfDumper.add_representer(
+    LazyDict, yamlutil.AsdfDumper.represent_dict)
+yamlutil.AsdfDumper.add_representer(
+    LazyList, yamlutil.AsdfDumper.represent_list)
@@ -380,6 +380,14 @@ def load_schema(url, resolver=None, resolve_references=False):
     return schema
 
 
+def _get_validators(ctx, validators=None):
+    # The built-in validators and the ones provided by extension types
+    if validators is None:
+        validators = util.HashableDict(YAML_VALIDATORS.copy())
+        validators.update(ctx._extensions.validators)
+    return validators
+
+
 def get_validator(schema={}, ctx=None, validators=None, url_mapping=None,
                   *args, **kwargs):
     """
@@ -412,9 +420,7 @@ def get_validator(schema={}, ctx=None, validators=None, url_mapping=None,
         from .asdf import AsdfFile
         ctx = AsdfFile()
 
-    if validators is None:
-        validators = util.HashableDict(YAML_VALIDATORS.copy())
-        validators.update(ctx._extensions.validators)
+    validators = _get_validators(ctx, validators)
 
     kwargs['resolver'] = _make_resolver(url_mapping)
 
@@ -429,28 +435,60 @@ def get_validator(schema={}, ctx=None, validators=None, url_mapping=None,
     return validator
 
 
+def _iter_unvalidated(instance, valid_subtrees):
+    # The nodes of a tagged tree, leaving out the subtrees that are
+    # known to be valid
+    if not valid_subtrees:
+        return treeutil.iter_tree(instance)
+
+    seen = set()
+
+    def recurse(tree):
+        tree_id = id(tree)
+        if tree_id in valid_subtrees or tree_id in seen:
+            return
+        if isinstance(tree, (list, tuple)):
+            values = tree
+        elif isinstance(tree, dict):
+            values = six.itervalues(tree)
+        else:
+            values = ()
+        seen.add(tree_id)
+        for val in values:
+            for sub in recurse(val):
+                yield sub
+        seen.discard(tree_id)
+        yield tree
+
+    return recurse(instance)
+
+
 if six.PY2:
-    def validate_large_literals(instance):
+    def validate_large_literals(instance, valid_subtrees=None):
         """
         Validate that the tree has no large numeric literals.
+
+        The subtrees whose ``id`` is in ``valid_subtrees`` are skipped.
         """
         # We can count on 52 bits of precision
         upper = ((long(1) << 51) - 1)
         lower = -((long(1) << 51) - 2)
 
-        for instance in treeutil.iter_tree(instance):
+        for instance in _iter_unvalidated(instance, valid_subtrees):
             if (isinstance(instance, six.integer_types) and
                 (instance > upper or instance < lower)):
                 raise ValidationError(
                     "Integer value {0} is too large to safely represent as a "
                     "literal in ASDF".format(instance))
 else:
-    def validate_large_literals(instance):
+    def validate_large_literals(instance, valid_subtrees=None):
         """
         Validate that the tree has no large numeric literals.
+
+        The subtrees whose ``id`` is in ``valid_subtrees`` are skipped.
         """
         # We can count on 52 bits of precision
-        for instance in treeutil.iter_tree(instance):
+        for instance in _iter_unvalidated(instance, valid_subtrees):
             if (isinstance(instance, int) and (
                 instance > ((1 << 51) - 1) or
                 instance < -((1 << 51) - 2))):
@@ -470,6 +508,11 @@ def validate(instance, ctx=None, schema={},
     The additional *args and **kwargs are passed along to
     `jsonschema.validate`.
 
+    Unless an explicit schema or additional arguments are given, the
+    tree is first checked with the compiled schemas from
+    `schema_compiler`, and `jsonschema` is only used to find the
+    errors in trees that aren't valid.
+
     Parameters
     ----------
     instance : tagged tree
@@ -485,6 +528,25 @@ def validate(instance, ctx=None, schema={},
         A dictionary mapping properties to validators to use (instead
         of the built-in ones and ones provided by extension types).
     """
+    from . import schema_compiler
+
+    if ctx is None:
+        from .asdf import AsdfFile
+        ctx = AsdfFile()
+
+    validators = _get_validators(ctx, validators)
+    if (schema or args or kwargs or
+            not schema_compiler.is_valid(instance, ctx, validators)):
+        _validate(instance, ctx, schema, validators, *args, **kwargs)
+
+    validate_large_literals(
+        instance, getattr(ctx, '_valid_subtrees', None))
+
+
+def _validate(instance, ctx=None, schema={}, validators=None,
+              *args, **kwargs):
+    # Runs the validators only, without the additional checks of
+    # `validate`, for the passes that fill in or remove defaults.
     if ctx is None:
         from .asdf import AsdfFile
         ctx = AsdfFile()
@@ -493,7 +555,45 @@ def validate(instance, ctx=None, schema={},
                               *args, **kwargs)
     validator.validate(instance, _schema=(schema or None))
 
-    validate_large_literals(instance)
+
+def validate_structure(instance, ctx, validators=None):
+    """
+    Validate the given tagged tree against the schema of its own tag
+    only.
+
+    Tagged nodes further down in the tree are only checked against
+    what that schema says about them, not against the schemas of
+    their own tags.
+
+    Parameters
+    ----------
+    instance : tagged tree
+
+    ctx : AsdfFile context
+        Used to resolve tags and urls
+
+    validators : dict, optional
+        A dictionary mapping properties to validators to use (instead
+        of the built-in ones and ones provided by extension types).
+    """
+    tag = getattr(instance, '_tag', None)
+    if tag is None:
+        return
+    schema_path = ctx.tag_to_schema_resolver(tag)
+    if schema_path == tag:
+        return
+    s = load_schema(schema_path, ctx.url_mapping)
+    if not s:
+        return
+
+    from . import schema_compiler
+
+    validators = _get_validators(ctx, validators)
+    if schema_compiler.is_valid(instance, ctx, validators, recurse=False):
+        return
+    validator = get_validator(s, ctx, validators, ctx.url_mapping)
+    with validator.resolver.in_scope(schema_path):
+        validator.validate(instance, _schema=s)
 
 
 def fill_defaults(instance, ctx):
@@ -508,7 +608,7 @@ def fill_defaults(instance, ctx):
     ctx : AsdfFile context
         Used to resolve tags and urls
     """
-    validate(instance, ctx, validators=FILL_DEFAULTS)
+    _validate(instance, ctx, validators=FILL_DEFAULTS)
 
 
 def remove_defaults(instance, ctx):
@@ -523,7 +623,7 @@ def remove_defaults(instance, ctx):
     ctx : AsdfFile context
         Used to resolve tags and urls
     """
-    validate(instance, ctx, validators=REMOVE_DEFAULTS)
+    _validate(instance, ctx, validators=REMOVE_DEFAULTS)
 
 
 def check_schema(schema):
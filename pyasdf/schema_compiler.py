@@ -0,0 +1,654 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+
+"""
+Compiles schemas into Python functions that check whether a tagged
+tree is valid, which is much faster than having `jsonschema` interpret
+the schemas at every node of the tree.
+
+The generated functions only tell whether a tree is valid.  When it
+isn't, `schema.validate` uses `jsonschema` to find out why.
+"""
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import contextlib
+import datetime
+import functools
+import itertools
+import numbers
+import re
+import threading
+
+import six
+from six.moves.urllib import parse as urlparse
+
+from jsonschema import _utils as mutils
+from jsonschema import validators as mvalidators
+from jsonschema.exceptions import ValidationError
+
+from .compat import lru_cache
+from . import reference
+from . import schema as mschema
+
+
+__all__ = ['SchemaCompiler', 'get_compiler', 'is_valid']
+
+
+_DRAFT4_VALIDATORS = mvalidators.Draft4Validator.VALIDATORS
+
+
+class _Unsupported(Exception):
+    # Raised for schemas the compiler can't handle, which are then
+    # only validated by `jsonschema`
+    pass
+
+
+class _Function(object):
+    # The source of one generated function, which takes the instance
+    # and the `jsonschema` validator (for the validators that aren't
+    # inlined) and returns whether the instance is valid.  The function
+    # for a whole schema document has the URL of the document as
+    # ``schema_url``.
+    def __init__(self, name, schema_url=None):
+        self.name = name
+        self.schema_url = schema_url
+        self.lines = []
+        self._indent = 1
+
+    def emit(self, line):
+        self.lines.append('    ' * self._indent + line)
+
+    @contextlib.contextmanager
+    def block(self, line):
+        self.emit(line)
+        self._indent += 1
+        yield
+        self._indent -= 1
+
+    def fail_if(self, condition):
+        with self.block('if {0}:'.format(condition)):
+            self.emit('return False')
+
+    def get_source(self):
+        lines = ['def {0}(instance, validator):'.format(self.name)]
+        if self.lines:
+            # `jsonschema` doesn't validate anything that looks like
+            # an external reference, so neither do we
+            lines.extend([
+                '    if (isinstance(instance, _Reference) or',
+                "            (isinstance(instance, dict) and '$ref' in instance)):",
+                '        return True'])
+            if self.schema_url is not None:
+                # A tagged subtree that is known to be valid against
+                # this schema (see `is_valid`) isn't checked again
+                lines.extend([
+                    '    if (validator._valid_subtrees.get(id(instance)) ==',
+                    '            {0!r}):'.format(self.schema_url),
+                    '        return True'])
+            lines.extend(self.lines)
+        lines.append('    return True')
+        return '\n'.join(lines)
+
+
+class SchemaCompiler(object):
+    """
+    Compiles schemas into Python functions, for one URL mapping and
+    set of validators.
+
+    The built-in validators (those of JSON schema draft 4, as well as
+    ``tag``, ``propertyOrder``, ``flowStyle`` and ``style``) are
+    inlined into the generated code.  Any others, such as the ones
+    provided by extensions, are called with the constant arguments
+    from the schema.
+
+    All methods may be called from multiple threads.
+    """
+    def __init__(self, url_mapping, validators):
+        """
+        Parameters
+        ----------
+        url_mapping : resolver.Resolver
+            Used to convert the URLs of schemas into local ones.
+
+        validators : util.HashableDict
+            A dictionary mapping properties to validators.
+        """
+        self._url_mapping = url_mapping
+        self._validators = validators
+        self._types = mschema._create_validator(validators).DEFAULT_TYPES
+        self._namespace = {
+            'datetime': datetime,
+            '_Reference': reference.Reference,
+            '_missing': object(),
+            '_type_to_tag': mschema._type_to_tag,
+            '_uniq': mutils.uniq
+        }
+        # Maps (url, fragment) to the name of the generated function,
+        # or `None` for the schemas that can't be compiled
+        self._names = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._functions = None
+
+    def get_function(self, url):
+        """
+        Get the function for the schema at the given URL, compiling it
+        if it hasn't been already.
+
+        Parameters
+        ----------
+        url : str
+
+        Returns
+        -------
+        function : callable or None
+            Takes the instance and a `jsonschema` validator object
+            from `schema.get_validator`, and returns whether the
+            instance is valid.  `None` if the schema can't be
+            compiled.
+        """
+        key = (url, '')
+        with self._lock:
+            if key not in self._names:
+                names = self._names.copy()
+                self._functions = []
+                try:
+                    self._compile_ref(url, '')
+                    source = '\n\n'.join(
+                        function.get_source() for function in self._functions)
+                    code = compile(source, '<schema {0}>'.format(url), 'exec')
+                    exec(code, self._namespace)
+                except Exception:
+                    # Whatever went wrong, `jsonschema` will report it
+                    # if it matters
+                    self._names = names
+                    self._names[key] = None
+                finally:
+                    self._functions = None
+
+            name = self._names[key]
+            if name is None:
+                return None
+            return self._namespace[name]
+
+    def _new_name(self, prefix):
+        return '{0}{1}'.format(prefix, next(self._counter))
+
+    def _constant(self, value):
+        name = self._new_name('_c')
+        self._namespace[name] = value
+        return name
+
+    def _compile_ref(self, url, fragment):
+        key = (url, fragment)
+        if key not in self._names:
+            name = self._names[key] = self._new_name('_ref')
+            try:
+                document = mschema.load_schema(url, self._url_mapping)
+                node = reference.resolve_fragment(document, fragment)
+            except Exception:
+                # Only an error if the reference is ever followed
+                node = None
+            self._compile_node(
+                node, url, name, schema_url=(url if not fragment else None))
+        return self._names[key]
+
+    def _compile_node(self, node, base, name=None, schema_url=None):
+        # Returns the name of the function for the given schema, or
+        # `None` if any instance is valid against it (and no name is
+        # given)
+        function = _Function(name or self._new_name('_s'), schema_url)
+        try:
+            target = self._generate(function, node, base)
+        except _Unsupported:
+            # Any instance that gets here is validated by `jsonschema`
+            function.lines = []
+            function.emit('return False')
+        else:
+            if target is not None:
+                if name is None:
+                    return target
+                function.emit('return {0}(instance, validator)'.format(target))
+
+        if not function.lines and name is None:
+            return None
+        self._functions.append(function)
+        return function.name
+
+    def _generate(self, function, node, base):
+        # Generates the body of the function, or returns the name of
+        # the function to call instead for a reference
+        if not isinstance(node, dict):
+            raise _Unsupported("Schema is not an object")
+
+        if node.get('id'):
+            base = urlparse.urljoin(base, node['id'])
+
+        ref = node.get('$ref')
+        if ref is not None:
+            # Like `jsonschema`, ignore everything else next to a
+            # reference
+            validator = self._validators.get('$ref')
+            if validator is _DRAFT4_VALIDATORS['$ref']:
+                url, fragment = urlparse.urldefrag(urlparse.urljoin(base, ref))
+                return self._compile_ref(url, fragment)
+            elif validator is not None:
+                _generate_call(self, function, validator, ref, node, base)
+            return None
+
+        for keyword, value in six.iteritems(node):
+            validator = self._validators.get(keyword)
+            if validator is None:
+                continue
+            generator = _GENERATORS.get(validator)
+            if generator is None:
+                _generate_call(self, function, validator, value, node, base)
+            else:
+                generator(self, function, value, node, base)
+        return None
+
+    def _call(self, node, base, instance='instance'):
+        # An expression that validates ``instance`` against the given
+        # schema, or `None` if it's always valid
+        name = self._compile_node(node, base)
+        if name is None:
+            return None
+        return '{0}({1}, validator)'.format(name, instance)
+
+    def _is_type(self, type_, instance='instance'):
+        # An expression that checks the type of ``instance`` just like
+        # `jsonschema.IValidator.is_type`
+        if type_ not in self._types:
+            raise _Unsupported("Unknown type '{0}'".format(type_))
+        pytypes = self._types[type_]
+        expr = 'isinstance({0}, {1})'.format(instance, self._constant(pytypes))
+        # bool inherits from int, so bools aren't numbers
+        flattened = mutils.flatten(pytypes)
+        if (bool not in flattened and
+                any(issubclass(x, numbers.Number) for x in flattened)):
+            expr = '({0} and not isinstance({1}, bool))'.format(expr, instance)
+        return expr
+
+
+def _generate_call(compiler, function, validator, value, node, base):
+    function.fail_if('next(iter({0}(validator, {1}, instance, {2}) or ()), None) '
+                     'is not None'.format(
+                         compiler._constant(validator),
+                         compiler._constant(value),
+                         compiler._constant(node)))
+
+
+def _generate_nothing(compiler, function, value, node, base):
+    pass
+
+
+def _generate_type(compiler, function, types, node, base, date_time=True):
+    checks = [compiler._is_type(x) for x in mutils.ensure_list(types)]
+    # See `schema.validate_type`
+    if (date_time and node.get('format') == 'date-time' and
+            'string' in types):
+        checks.insert(0, 'isinstance(instance, datetime.datetime)')
+    function.fail_if('not ({0})'.format(' or '.join(checks) or 'False'))
+
+
+def _generate_enum(compiler, function, enums, node, base):
+    function.fail_if('instance not in {0}'.format(compiler._constant(enums)))
+
+
+def _generate_properties(compiler, function, properties, node, base):
+    checks = []
+    for property, subschema in six.iteritems(properties):
+        call = compiler._call(subschema, base, 'instance[{0!r}]'.format(property))
+        if call is not None:
+            checks.append((property, call))
+    if checks:
+        with function.block('if {0}:'.format(compiler._is_type('object'))):
+            for property, call in checks:
+                function.fail_if('{0!r} in instance and not {1}'.format(
+                    property, call))
+
+
+def _generate_patternProperties(compiler, function, patternProperties, node,
+                                base):
+    for pattern, subschema in six.iteritems(patternProperties):
+        call = compiler._call(subschema, base, '_value')
+        if call is None:
+            continue
+        with function.block('if {0}:'.format(compiler._is_type('object'))):
+            with function.block('for _key, _value in instance.items():'):
+                function.fail_if('{0}(_key) and not {1}'.format(
+                    compiler._constant(re.compile(pattern).search), call))
+
+
+def _generate_additionalProperties(compiler, function, aP, node, base):
+    is_extra = '_key not in {0}'.format(
+        compiler._constant(node.get('properties', {})))
+    patterns = '|'.join(node.get('patternProperties', {}))
+    if patterns:
+        is_extra += ' and not {0}(_key)'.format(
+            compiler._constant(re.compile(patterns).search))
+
+    if isinstance(aP, dict):
+        call = compiler._call(aP, base, 'instance[_key]')
+        if call is None:
+            return
+        condition = '{0} and not {1}'.format(is_extra, call)
+    elif not aP:
+        condition = is_extra
+    else:
+        return
+
+    with function.block('if {0}:'.format(compiler._is_type('object'))):
+        with function.block('for _key in instance:'):
+            function.fail_if(condition)
+
+
+def _generate_dependencies(compiler, function, dependencies, node, base):
+    checks = []
+    for property, dependency in six.iteritems(dependencies):
+        if isinstance(dependency, dict):
+            call = compiler._call(dependency, base)
+            if call is not None:
+                checks.append('{0!r} in instance and not {1}'.format(
+                    property, call))
+        else:
+            for dependency in mutils.ensure_list(dependency):
+                checks.append('{0!r} in instance and {1!r} not in instance'.format(
+                    property, dependency))
+    if checks:
+        with function.block('if {0}:'.format(compiler._is_type('object'))):
+            for check in checks:
+                function.fail_if(check)
+
+
+def _generate_required(compiler, function, required, node, base):
+    if required:
+        with function.block('if {0}:'.format(compiler._is_type('object'))):
+            with function.block('for _key in {0}:'.format(
+                    compiler._constant(required))):
+                function.fail_if('_key not in instance')
+
+
+def _generate_length(type_, op):
+    def generate(compiler, function, value, node, base):
+        function.fail_if('{0} and len(instance) {1} {2!r}'.format(
+            compiler._is_type(type_), op, value))
+    return generate
+
+
+def _generate_items(compiler, function, items, node, base):
+    if isinstance(items, dict):
+        call = compiler._call(items, base, '_item')
+        if call is not None:
+            with function.block('if {0}:'.format(compiler._is_type('array'))):
+                with function.block('for _item in instance:'):
+                    function.fail_if('not {0}'.format(call))
+    else:
+        checks = []
+        for index, subschema in enumerate(items):
+            call = compiler._call(subschema, base, 'instance[{0}]'.format(index))
+            if call is not None:
+                checks.append('len(instance) > {0} and not {1}'.format(
+                    index, call))
+        if checks:
+            with function.block('if {0}:'.format(compiler._is_type('array'))):
+                for check in checks:
+                    function.fail_if(check)
+
+
+def _generate_additionalItems(compiler, function, aI, node, base):
+    if isinstance(node.get('items', {}), dict):
+        return
+    len_items = len(node.get('items', []))
+
+    if isinstance(aI, dict):
+        call = compiler._call(aI, base, '_item')
+        if call is not None:
+            with function.block('if {0}:'.format(compiler._is_type('array'))):
+                with function.block('for _item in instance[{0}:]:'.format(
+                        len_items)):
+                    function.fail_if('not {0}'.format(call))
+    elif not aI:
+        function.fail_if('{0} and len(instance) > {1}'.format(
+            compiler._is_type('array'), len_items))
+
+
+def _generate_minimum(compiler, function, minimum, node, base):
+    op = '<=' if node.get('exclusiveMinimum', False) else '<'
+    function.fail_if('{0} and instance {1} {2}'.format(
+        compiler._is_type('number'), op, compiler._constant(minimum)))
+
+
+def _generate_maximum(compiler, function, maximum, node, base):
+    op = '>=' if node.get('exclusiveMaximum', False) else '>'
+    function.fail_if('{0} and instance {1} {2}'.format(
+        compiler._is_type('number'), op, compiler._constant(maximum)))
+
+
+def _generate_multipleOf(compiler, function, dB, node, base):
+    with function.block('if {0}:'.format(compiler._is_type('number'))):
+        if isinstance(dB, float):
+            function.emit('_quotient = instance / {0}'.format(
+                compiler._constant(dB)))
+            function.fail_if('int(_quotient) != _quotient')
+        else:
+            function.fail_if('instance % {0}'.format(compiler._constant(dB)))
+
+
+def _generate_uniqueItems(compiler, function, uI, node, base):
+    if uI:
+        function.fail_if('{0} and not _uniq(instance)'.format(
+            compiler._is_type('array')))
+
+
+def _generate_pattern(compiler, function, pattern, node, base):
+    function.fail_if('{0} and not {1}(instance)'.format(
+        compiler._is_type('string'),
+        compiler._constant(re.compile(pattern).search)))
+
+
+def _generate_allOf(compiler, function, allOf, node, base):
+    for subschema in allOf:
+        call = compiler._call(subschema, base)
+        if call is not None:
+            function.fail_if('not {0}'.format(call))
+
+
+def _generate_anyOf(compiler, function, anyOf, node, base):
+    # Stops at the first valid schema, like `jsonschema`
+    calls = [compiler._call(subschema, base) or 'True' for subschema in anyOf]
+    function.fail_if('not ({0})'.format(' or '.join(calls) or 'False'))
+
+
+def _generate_oneOf(compiler, function, oneOf, node, base):
+    calls = [compiler._call(subschema, base) or 'True' for subschema in oneOf]
+    function.fail_if('[{0}].count(True) != 1'.format(', '.join(calls)))
+
+
+def _generate_not(compiler, function, not_schema, node, base):
+    call = compiler._call(not_schema, base)
+    if call is None:
+        function.emit('return False')
+    else:
+        function.fail_if(call)
+
+
+def _generate_tag(compiler, function, tagname, node, base):
+    # See `schema.validate_tag`
+    function.emit("_tag = getattr(instance, '_tag', _missing)")
+    with function.block('if _tag is _missing:'):
+        function.emit('_tag = _type_to_tag(type(instance))')
+    function.fail_if('_tag is not None and _tag != {0!r}'.format(tagname))
+
+
+def _generate_propertyOrder(compiler, function, order, node, base):
+    # See `schema.validate_propertyOrder`
+    if order:
+        with function.block('if {0}:'.format(compiler._is_type('object'))):
+            function.emit('instance.property_order = {0}'.format(
+                compiler._constant(order)))
+
+
+def _generate_flowStyle(compiler, function, flow_style, node, base):
+    # See `schema.validate_flowStyle`
+    with function.block('if {0} or {1}:'.format(
+            compiler._is_type('object'), compiler._is_type('array'))):
+        function.emit('instance.flow_style = {0}'.format(
+            compiler._constant(flow_style)))
+
+
+def _generate_style(compiler, function, style, node, base):
+    # See `schema.validate_style`
+    with function.block('if {0}:'.format(compiler._is_type('string'))):
+        function.emit('instance.style = {0}'.format(
+            compiler._constant(style)))
+
+
+# Maps the validator functions that are inlined to the functions that
+# generate their code
+_GENERATORS = {
+    mschema.validate_tag: _generate_tag,
+    mschema.validate_propertyOrder: _generate_propertyOrder,
+    mschema.validate_flowStyle: _generate_flowStyle,
+    mschema.validate_style: _generate_style,
+    mschema.validate_type: _generate_type,
+    _DRAFT4_VALIDATORS['type']: functools.partial(
+        _generate_type, date_time=False)
+}
+for _keyword, _generator in [
+        ('additionalItems', _generate_additionalItems),
+        ('additionalProperties', _generate_additionalProperties),
+        ('allOf', _generate_allOf),
+        ('anyOf', _generate_anyOf),
+        ('dependencies', _generate_dependencies),
+        ('enum', _generate_enum),
+        # Formats are only checked with a format checker, which isn't
+        # used for ASDF files
+        ('format', _generate_nothing),
+        ('items', _generate_items),
+        ('maxItems', _generate_length('array', '>')),
+        ('maxLength', _generate_length('string', '>')),
+        ('maxProperties', _generate_length('object', '>')),
+        ('maximum', _generate_maximum),
+        ('minItems', _generate_length('array', '<')),
+        ('minLength', _generate_length('string', '<')),
+        ('minProperties', _generate_length('object', '<')),
+        ('minimum', _generate_minimum),
+        ('multipleOf', _generate_multipleOf),
+        ('not', _generate_not),
+        ('oneOf', _generate_oneOf),
+        ('pattern', _generate_pattern),
+        ('patternProperties', _generate_patternProperties),
+        ('properties', _generate_properties),
+        ('required', _generate_required),
+        ('uniqueItems', _generate_uniqueItems)]:
+    _GENERATORS[_DRAFT4_VALIDATORS[_keyword]] = _generator
+del _keyword, _generator
+
+
+@lru_cache()
+def get_compiler(url_mapping, validators):
+    """
+    Get the `SchemaCompiler` for the given URL mapping and validators,
+    so that each schema is only compiled once per set of validators.
+    """
+    return SchemaCompiler(url_mapping, validators)
+
+
+def _always_valid(instance, validator):
+    return True
+
+
+def is_valid(instance, ctx, validators, recurse=True):
+    """
+    Check whether a tagged tree is valid, using the compiled schemas
+    of its tags.
+
+    Parameters
+    ----------
+    instance : tagged tree
+
+    ctx : AsdfFile context
+        Used to resolve tags and urls
+
+    validators : util.HashableDict
+        A dictionary mapping properties to validators.
+
+    recurse : bool, optional
+        When `False`, only check the tree against the schema of its
+        own tag, like `schema.validate_structure`.
+
+    Returns
+    -------
+    valid : bool
+        `False` if the tree is invalid, or if some of its schemas
+        can't be compiled.  In either case, `schema.validate` should
+        be used to find the errors.
+
+    Notes
+    -----
+    When ``ctx`` has a ``_valid_subtrees`` dict (see
+    `yamlutil.TaggedTreeCache`), the subtrees whose ``id`` is in it are
+    known to be valid and aren't checked again.
+    """
+    compiler = get_compiler(ctx.url_mapping, validators)
+    validator = mschema.get_validator({}, ctx, validators, ctx.url_mapping)
+    functions = {}
+    seen = set()
+
+    valid_subtrees = getattr(ctx, '_valid_subtrees', None) or {}
+    validator._valid_subtrees = valid_subtrees
+
+    def get_function(tag):
+        schema_path = ctx.tag_to_schema_resolver(tag)
+        if schema_path == tag:
+            return _always_valid
+        if not mschema.load_schema(schema_path, ctx.url_mapping):
+            return _always_valid
+        return compiler.get_function(schema_path)
+
+    # This walks the tree the same way as `schema.ASDFValidator`
+    def check(node):
+        if id(node) in seen:
+            return True
+
+        if (isinstance(node, reference.Reference) or
+                (isinstance(node, dict) and '$ref' in node)):
+            return True
+
+        if recurse and id(node) in valid_subtrees:
+            return True
+
+        tag = getattr(node, '_tag', None)
+        if tag is not None:
+            if tag not in functions:
+                functions[tag] = get_function(tag)
+            function = functions[tag]
+            if function is None or not function(node, validator):
+                return False
+
+        if not recurse:
+            return True
+        elif isinstance(node, dict):
+            children = six.itervalues(node)
+        elif isinstance(node, list):
+            children = node
+        else:
+            return True
+
+        seen.add(id(node))
+        try:
+            for child in children:
+                if not check(child):
+                    return False
+        finally:
+            seen.discard(id(node))
+
+        return True
+
+    try:
+        return check(instance)
+    except ValidationError:
+        # Raised directly by some validators
+        return False
@@ -46,7 +46,11 @@ class Tagged(object):
     Base class of classes that wrap a given object and store a tag
     with it.
     """
-    pass
+    def __reduce__(self):
+        # The default pickling of dict and list subclasses restores
+        # the items before the instance attributes, but here the items
+        # live in the ``data`` attribute.
+        return (self.__class__, (self.data,), self.__dict__)
 
 
 class TaggedDict(Tagged, UserDict, dict):
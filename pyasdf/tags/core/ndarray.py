@@ -3,7 +3,9 @@
 
 from __future__ import absolute_import, division, unicode_literals, print_function
 
+import copy
 import sys
+import threading
 
 import numpy as np
 from numpy import ma
@@ -18,6 +20,12 @@ from ... import util
 from ... import yamlutil
 
 
+# Held while the array made for an `NDArrayType` is stored, so that
+# when several threads make it at once, they all end up using the same
+# array.
+_array_lock = threading.Lock()
+
+
 _datatype_names = {
     'int8'       : 'i1',
     'int16'      : 'i2',
@@ -216,6 +224,15 @@ def numpy_array_to_list(array):
     return result
 
 
+def _c_strides(shape, dtype):
+    strides = []
+    stride = dtype.itemsize
+    for dim in reversed(shape):
+        strides.insert(0, stride)
+        stride *= dim
+    return tuple(strides)
+
+
 class NDArrayType(AsdfType):
     name = 'core/ndarray'
     types = [np.ndarray, ma.MaskedArray]
@@ -250,12 +267,47 @@ class NDArrayType(AsdfType):
             block = self.block
             shape = self.get_actual_shape(
                 self._shape, self._strides, self._dtype, len(block))
-            self._array = np.ndarray(
+            array = np.ndarray(
                 shape, self._dtype, block.data,
                 self._offset, self._strides, self._order)
-            self._array = self._apply_mask(self._array, self._mask)
+            array = self._apply_mask(array, self._mask)
+            with _array_lock:
+                if self._array is None:
+                    self._array = array
         return self._array
 
+    def _make_array_copy(self):
+        # Where the block is memory-mapped from a read-only file, the
+        # copy is a private mapping of the same part of the file,
+        # which shares its memory with the original until the copy is
+        # modified.  (A file opened for writing may still be changed
+        # through the original, which would show through the pages
+        # of the copy that haven't been modified.)
+        if isinstance(self._source, list):
+            return copy.deepcopy(self._make_array())
+
+        block = self.block
+        data = block._load_data()
+        fd = getattr(data, 'fd', None)
+        if (isinstance(data, np.memmap) and fd is not None and
+                fd.mode == 'r'):
+            data = fd.memmap_array(data.offset, len(data), copy_on_write=True)
+        else:
+            data = data.copy()
+
+        shape = self.get_actual_shape(
+            self._shape, self._strides, self._dtype, len(block))
+        array = np.ndarray(
+            shape, self._dtype, data,
+            self._offset, self._strides, self._order)
+
+        mask = self._mask
+        if isinstance(mask, NDArrayType):
+            mask = mask._make_array_copy()
+        elif isinstance(mask, np.ndarray):
+            mask = mask.copy()
+        return self._apply_mask(array, mask)
+
     def _apply_mask(self, array, mask):
         if isinstance(mask, (np.ndarray, NDArrayType)):
             # Use "mask.view()" here so the underlying possibly
@@ -274,6 +326,20 @@ class NDArrayType(AsdfType):
     def __array__(self):
         return self._make_array()
 
+    def __reduce__(self):
+        # Where the array is stored in a file with a URI, it is pickled
+        # as a reference to its block, which is only read once it is
+        # used.  Otherwise, it is pickled as a regular array.
+        handle = None
+        if not isinstance(self._source, list):
+            handle = self._asdffile._get_blocks_handle()
+        if handle is None:
+            return self._make_array().__reduce__()
+
+        return (self.__class__, (
+            self._source, self._shape, self._dtype, self._offset,
+            self._strides, self._order, self._mask, handle))
+
     def __repr__(self):
         # repr alone should not force loading of the data
         if self._array is None:
@@ -389,15 +455,28 @@ class NDArrayType(AsdfType):
 
     @classmethod
     def to_tree(cls, data, ctx):
-        base = util.get_array_base(data)
         block = ctx.blocks.find_or_create_block_for_array(data, ctx)
-        shape = data.shape
-        dtype = data.dtype
-        offset = data.ctypes.data - base.ctypes.data
-        if data.flags[b'C_CONTIGUOUS']:
-            strides = None
+        if cls._is_unloaded_in(data, block, ctx):
+            # An array that was never accessed is described by what
+            # was read from the file, so that updating the file in
+            # place doesn't need to load or memory-map its block (or
+            # hand out the data of a block loaded for other reasons).
+            shape = data._shape
+            dtype = data._dtype
+            offset = data._offset
+            strides = data._strides
+            if strides is not None and tuple(strides) == _c_strides(
+                    shape, dtype):
+                strides = None
         else:
-            strides = data.strides
+            base = util.get_array_base(data)
+            shape = data.shape
+            dtype = data.dtype
+            offset = data.ctypes.data - base.ctypes.data
+            if data.flags[b'C_CONTIGUOUS']:
+                strides = None
+            else:
+                strides = data.strides
 
         result = {}
 
@@ -439,6 +518,20 @@ class NDArrayType(AsdfType):
 
         return result
 
+    @classmethod
+    def _is_unloaded_in(cls, data, block, ctx):
+        return (isinstance(data, NDArrayType) and
+                data._array is None and
+                data._mask is None and
+                data._shape is not None and
+                '*' not in data._shape and
+                data._dtype is not None and
+                block is data._block and
+                block.array_storage == 'internal' and
+                ctx._fd is not None and
+                getattr(block, '_fd', None) is ctx._fd and
+                (block._data is None or block._data_private))
+
     @classmethod
     def _assert_equality(cls, old, new, func):
         if old.dtype.fields:
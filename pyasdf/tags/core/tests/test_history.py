@@ -4,12 +4,14 @@
 from __future__ import absolute_import, division, unicode_literals, print_function
 
 import datetime
+import time
 
 import pytest
 
 from jsonschema import ValidationError
 
 from .... import asdf
+from .... import schema_compiler
 
 
 def test_history():
@@ -33,3 +35,65 @@ def test_history():
     assert len(ff.tree['history']) == 2
 
     assert isinstance(ff.tree['history'][0]['time'], datetime.datetime)
+
+
+def test_history_validates_new_entry(monkeypatch):
+    ff = asdf.AsdfFile()
+    for i in range(3):
+        ff.add_history_entry('Entry {0}'.format(i))
+
+    validated = []
+    get_function = schema_compiler.SchemaCompiler.get_function
+
+    def recording_get_function(self, url):
+        function = get_function(self, url)
+
+        def recording_function(instance, validator):
+            validated.append(instance)
+            return function(instance, validator)
+        return recording_function
+
+    monkeypatch.setattr(schema_compiler.SchemaCompiler, 'get_function',
+                        recording_get_function)
+
+    # Only the new entry is validated, and the rest of the tree stays
+    # known to be valid
+    ff.add_history_entry('Another entry')
+    assert len(ff.tree['history']) == 4
+    assert [x._tag for x in validated] == [
+        'tag:stsci.edu:asdf/core/history_entry-0.1.0']
+    assert validated[0]['description'] == 'Another entry'
+
+    del validated[:]
+    ff.validate()
+    assert validated == []
+
+    # An entry that isn't valid isn't added to the cache either
+    with pytest.raises(ValidationError):
+        ff.add_history_entry('Bad entry', {'name': 'my_tool'})
+    assert len(ff.tree['history']) == 4
+    del validated[:]
+    ff.validate()
+    assert validated == []
+
+
+def test_history_linear_time():
+    # The time to add an entry doesn't grow with the number of entries
+    # already in the history
+    def time_entries(ff, n=100):
+        start = time.time()
+        for i in range(n):
+            ff.add_history_entry('Entry {0}'.format(i))
+        return time.time() - start
+
+    def fill(n):
+        ff = asdf.AsdfFile()
+        for i in range(n):
+            ff.add_history_entry('Entry {0}'.format(i))
+        return ff
+
+    small = fill(200)
+    large = fill(2000)
+    small_time = min(time_entries(small) for i in range(3))
+    large_time = min(time_entries(large) for i in range(3))
+    assert large_time < small_time * 3
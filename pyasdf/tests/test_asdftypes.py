@@ -17,6 +17,7 @@ import pytest
 
 from .. import asdf
 from .. import asdftypes
+from .. import treeutil
 from .. import util
 from .. import versioning
 
@@ -93,6 +94,109 @@ b: !core/complex-0.1.0
     buff.close()
 
 
+def test_hooks(monkeypatch):
+    import fractions
+
+    calls = []
+
+    class FractionType(asdftypes.AsdfType):
+        name = 'fraction'
+        organization = 'nowhere.org'
+        version = (1, 0, 0)
+        standard = 'custom'
+        types = [fractions.Fraction]
+
+        @classmethod
+        def to_tree(cls, node, ctx):
+            return [node.numerator, node.denominator]
+
+        @classmethod
+        def from_tree(cls, tree, ctx):
+            return fractions.Fraction(tree[0], tree[1])
+
+        @classmethod
+        def pre_write(cls, node, ctx):
+            calls.append(('pre_write', node))
+            if node == fractions.Fraction(2, 3):
+                # The hooks run after this one find the added node
+                ctx.tree['c'] = fractions.Fraction(3, 4)
+
+        @classmethod
+        def post_write(cls, node, ctx):
+            calls.append(('post_write', node))
+
+        @classmethod
+        def post_read(cls, node, ctx):
+            calls.append(('post_read', node))
+
+    class FractionExtension(object):
+        types = [FractionType]
+        tag_mapping = [('tag:nowhere.org:custom',
+                        'http://nowhere.org/schemas/custom{tag_suffix}')]
+        url_mapping = [('http://nowhere.org/schemas/custom/',
+                        util.filepath_to_url(TEST_DATA_PATH) +
+                        '/{url_suffix}.yaml')]
+
+    extension = FractionExtension()
+    tree = {'a': fractions.Fraction(2, 3), 'b': [fractions.Fraction(1, 2)]}
+    ff = asdf.AsdfFile(tree, extensions=[extension])
+
+    index = ff.type_index
+    assert index.has_hook('post_write')
+    assert not index.has_hook('no_such_hook')
+    hooks = index.find_hooks(ff.tree, ['pre_write', 'no_such_hook'])
+    assert hooks['no_such_hook'] == []
+    assert sorted(node for hook, node in hooks['pre_write']) == [
+        fractions.Fraction(1, 2), fractions.Fraction(2, 3)]
+
+    walks = []
+    iter_tree = treeutil.iter_tree
+
+    def counting_iter_tree(top):
+        if top is ff.tree:
+            walks.append(top)
+        return iter_tree(top)
+
+    monkeypatch.setattr(treeutil, 'iter_tree', counting_iter_tree)
+
+    # The tree is walked again for the other hooks once the pre_write
+    # hooks ran, since they may have changed it
+    buff = io.BytesIO()
+    ff.write_to(buff)
+    assert len(walks) == 2
+    assert [name for name, node in calls] == (
+        ['pre_write'] * 2 + ['post_write'] * 3)
+    assert not hasattr(ff, '_write_hooks')
+
+    del calls[:]
+    buff.seek(0)
+    with asdf.AsdfFile.open(buff, extensions=[extension]) as ff2:
+        assert [name for name, node in calls] == ['post_read'] * 3
+
+    # Without any pre_write hooks to run, all of the hooks share a
+    # single walk
+    ff = asdf.AsdfFile({'a': 1}, extensions=[extension])
+    del walks[:]
+    ff.write_to(io.BytesIO())
+    assert len(walks) == 1
+
+    # The state of the write is cleared when it fails
+    with pytest.raises(ValueError):
+        ff.write_to(io.BytesIO(), reserve_tree_space=-1)
+    assert not hasattr(ff, '_validate_on_write')
+
+    def failing_post_write(cls, node, ctx):
+        raise ValueError("Post-write failure")
+
+    monkeypatch.setattr(FractionType, 'post_write',
+                        classmethod(failing_post_write))
+    ff = asdf.AsdfFile({'a': fractions.Fraction(1, 3)},
+                       extensions=[extension])
+    with pytest.raises(ValueError):
+        ff.write_to(io.BytesIO())
+    assert not hasattr(ff, '_write_hooks')
+    assert not hasattr(ff, '_validate_on_write')
+
 def test_version_mismatch():
     from astropy.tests.helper import catch_warnings
 
@@ -0,0 +1,98 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import os
+import sys
+
+import pytest
+
+asyncio = pytest.importorskip('asyncio')
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from .. import asdf
+from .. import open_async
+
+
+def _get_tree():
+    return {
+        'science_data': np.arange(64, dtype=np.float64).reshape((8, 8)),
+        'nested': {'items': [np.arange(10), np.arange(20, dtype=np.uint8)]}
+    }
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _check_async_open(loop, fd):
+    tree = _get_tree()
+
+    ff = loop.run_until_complete(open_async(fd, loop=loop))
+    with ff:
+        assert ff.tree['science_data']._array is None
+
+        arrays = loop.run_until_complete(asyncio.gather(
+            ff.load_array_async('/science_data', loop=loop),
+            ff.load_array_async(['nested', 'items', 1], loop=loop),
+            ff.load_array_async('nested/items/0', loop=loop),
+            loop=loop))
+
+        assert_array_equal(arrays[0], tree['science_data'])
+        assert_array_equal(arrays[1], tree['nested']['items'][1])
+        assert_array_equal(arrays[2], tree['nested']['items'][0])
+        # The arrays are cached by the tree, just as with
+        # synchronous access
+        assert arrays[0] is ff.tree['science_data']._make_array()
+
+
+def test_open_async(tmpdir, loop):
+    path = os.path.join(str(tmpdir), 'test.asdf')
+    asdf.AsdfFile(_get_tree()).write_to(path)
+
+    _check_async_open(loop, path)
+
+
+def test_open_async_compressed(tmpdir, loop):
+    path = os.path.join(str(tmpdir), 'test.asdf')
+    ff = asdf.AsdfFile(_get_tree())
+    ff.write_to(path, all_array_compression='zlib')
+
+    _check_async_open(loop, path)
+
+
+@pytest.mark.skipif(sys.platform.startswith('win'),
+                    reason="Windows firewall prevents test")
+def test_open_async_http(rhttpserver, loop):
+    path = os.path.join(rhttpserver.tmpdir, 'test.asdf')
+    asdf.AsdfFile(_get_tree()).write_to(path)
+
+    _check_async_open(loop, rhttpserver.url + 'test.asdf')
+
+
+def test_load_array_async_fail(loop):
+    ff = asdf.AsdfFile(_get_tree())
+
+    with pytest.raises(TypeError):
+        loop.run_until_complete(ff.load_array_async('/nested', loop=loop))
+
+    with pytest.raises(ValueError):
+        loop.run_until_complete(ff.load_array_async('/missing', loop=loop))
+
+    x = loop.run_until_complete(ff.load_array_async(['science_data'], loop=loop))
+    assert x is ff.tree['science_data']
+
+
+def test_open_async_without_asyncio(tmpdir, monkeypatch):
+    path = os.path.join(str(tmpdir), 'test.asdf')
+    asdf.AsdfFile(_get_tree()).write_to(path)
+
+    monkeypatch.setitem(sys.modules, 'asyncio', None)
+    with pytest.raises(ImportError):
+        open_async(path)
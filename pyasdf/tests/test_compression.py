@@ -5,6 +5,7 @@ from __future__ import absolute_import, division, unicode_literals, print_functi
 
 import io
 import os
+import tempfile
 
 import numpy as np
 
@@ -90,3 +91,36 @@ def test_bzp2(tmpdir):
     tree = _get_large_tree()
 
     _roundtrip(tmpdir, tree, 'bzp2')
+
+
+def test_spool_to_disk(monkeypatch):
+    from .. import block
+
+    spools = []
+    base = tempfile.SpooledTemporaryFile
+
+    # Not a new-style class on Python 2, so super() can't be used
+    class SpooledTemporaryFile(base):
+        def __init__(self, *args, **kwargs):
+            base.__init__(self, *args, **kwargs)
+            spools.append(self)
+
+    monkeypatch.setattr(block.Block, '_spool_max_size', 1024)
+    monkeypatch.setattr(block.Block, '_spool_chunk_size', 4096)
+    monkeypatch.setattr(
+        block.tempfile, 'SpooledTemporaryFile', SpooledTemporaryFile)
+
+    tree = _get_large_tree()
+    buff = io.BytesIO()
+
+    ff = asdf.AsdfFile(tree)
+    ff.set_array_compression(tree['science_data'], 'zlib')
+    ff.write_to(generic_io.OutputStream(buff))
+
+    assert len(spools) == 1
+    assert spools[0]._rolled
+    assert spools[0].closed
+
+    buff.seek(0)
+    with asdf.AsdfFile.open(generic_io.InputStream(buff)) as ff:
+        helpers.assert_tree_match(tree, ff.tree)
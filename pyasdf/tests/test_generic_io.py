@@ -13,6 +13,7 @@ import six
 import six.moves.urllib.request as urllib_request
 
 import numpy as np
+from numpy.testing import assert_array_equal
 
 from .. import asdf
 from .. import generic_io
@@ -213,6 +214,183 @@ def test_bytes_io(tree):
         ff.tree['science_data'][0] = 42
 
 
+def test_real_file_mmap(tmpdir):
+    path = os.path.join(str(tmpdir), 'test.dat')
+    content = b''.join(six.int2byte(i) for i in range(256))
+    with open(path, 'wb') as fd:
+        fd.write(content)
+
+    with io.open(path, 'rb') as raw:
+        raw.seek(10)
+        fd = generic_io.get_file(raw, mode='r')
+        assert isinstance(fd, generic_io.RealFile)
+        assert fd._mmap is not None
+
+        assert fd.tell() == 10
+        assert fd._peek(5) == content[10:15]
+        assert fd.read(5) == content[10:15]
+        fd.seek(-6, generic_io.SEEK_END)
+        assert fd.read(2) == content[-6:-4]
+        assert fd.read_until(b'\xfe', 1) == content[-4:-1]
+        assert_array_equal(fd.read_into_array(-1), [255])
+        fd.seek(300)
+        assert fd.tell() == 300
+        assert fd.read(10) == b''
+        with pytest.raises(IOError):
+            fd.seek(-1)
+
+        fd.seek(20)
+        fd.close()
+        assert fd._mmap is None
+        # The position of the underlying file is updated at close
+        assert raw.tell() == 20
+
+    # Empty files can not be memory mapped
+    path = os.path.join(str(tmpdir), 'empty.dat')
+    open(path, 'wb').close()
+    with generic_io.get_file(path, mode='r') as fd:
+        assert fd._mmap is None
+        assert fd.read() == b''
+
+    with generic_io.get_file(path, mode='rw') as fd:
+        assert fd._mmap is None
+
+
+@pytest.mark.parametrize('mode', ['file', 'rw', 'bytes'])
+@pytest.mark.parametrize('include_block_index', [True, False])
+def test_threaded_reads(tmpdir, mode, include_block_index):
+    from multiprocessing.pool import ThreadPool
+
+    tree = dict(('x{0}'.format(i), np.arange(i * 1000, (i + 1) * 1000))
+                for i in range(16))
+    ff = asdf.AsdfFile(tree)
+    for i in range(0, 16, 2):
+        ff.blocks[tree['x{0}'.format(i)]].compression = 'zlib'
+    buff = io.BytesIO()
+    ff.write_to(buff, include_block_index=include_block_index)
+
+    path = os.path.join(str(tmpdir), 'test.asdf')
+    with open(path, 'wb') as fd:
+        fd.write(buff.getvalue())
+
+    if mode == 'bytes':
+        buff.seek(0)
+        fd = generic_io.get_file(buff, mode='r')
+    else:
+        fd = generic_io.get_file(path, mode='r' if mode == 'file' else 'rw')
+        if mode == 'file':
+            # Use the positional reads instead of the memory map
+            fd._mmap.close()
+            fd._mmap = None
+
+    def read(i):
+        return np.array(ff.tree['x{0}'.format(i)])
+
+    pool = ThreadPool(8)
+    try:
+        with asdf.AsdfFile.open(fd) as ff:
+            results = pool.map(read, list(range(16)) * 4)
+    finally:
+        pool.close()
+        pool.join()
+
+    for i, result in enumerate(results):
+        assert_array_equal(result, tree['x{0}'.format(i % 16)])
+
+
+def test_io_hints(tmpdir):
+    tree = _get_large_tree()
+    path = os.path.join(str(tmpdir), 'test.asdf')
+    path2 = os.path.join(str(tmpdir), 'test2.asdf')
+
+    old_hints = generic_io.io_hints
+    generic_io.io_hints = generic_io.IOHints(preallocate=False)
+    try:
+        asdf.AsdfFile(tree).write_to(path, pad_blocks=True)
+        generic_io.io_hints = generic_io.IOHints(dontneed=True)
+        asdf.AsdfFile(tree).write_to(path2, pad_blocks=True)
+    finally:
+        generic_io.io_hints = old_hints
+
+    # Preallocation must not change the content of the file
+    with open(path, 'rb') as fd:
+        content = fd.read()
+    with open(path2, 'rb') as fd:
+        assert fd.read() == content
+
+    with asdf.AsdfFile.open(path2) as ff:
+        assert ff.blocks._internal_blocks[0]._fd.io_hints is generic_io.io_hints
+        helpers.assert_tree_match(tree, ff.tree)
+
+
+@pytest.mark.skipif(not hasattr(os, 'posix_fadvise'),
+                    reason="requires posix_fadvise")
+def test_io_hints_advise(tmpdir, monkeypatch):
+    tree = _get_large_tree()
+    path = os.path.join(str(tmpdir), 'test.asdf')
+    asdf.AsdfFile(tree).write_to(path)
+    asdf.AsdfFile(tree).write_to(
+        path + '.z', all_array_compression='zlib')
+
+    calls = []
+
+    def posix_fadvise(fd, offset, size, advice):
+        calls.append((offset, size, advice))
+
+    monkeypatch.setattr(os, 'posix_fadvise', posix_fadvise)
+
+    with asdf.AsdfFile.open(path) as ff:
+        block = ff.blocks[ff.tree['science_data']]
+        ff.tree['science_data'].data
+        assert calls == [
+            (block.data_offset, block._size, os.POSIX_FADV_RANDOM)]
+
+    del calls[:]
+    with asdf.AsdfFile.open(path + '.z') as ff:
+        block = ff.blocks[ff.tree['science_data']]
+        ff.tree['science_data'].data
+        assert calls == [
+            (block.data_offset, block._size, os.POSIX_FADV_WILLNEED)]
+
+    del calls[:]
+    with asdf.AsdfFile.open(path) as ff:
+        ff.blocks._internal_blocks[0]._fd.io_hints = generic_io.IOHints(
+            random=False)
+        ff.tree['science_data'].data
+        assert calls == []
+
+
+def test_bytes_io_read_into_array():
+    content = np.arange(256, dtype=np.uint8).tobytes()
+    buff = io.BytesIO(content)
+
+    fd = generic_io.get_file(buff, mode='r')
+    fd.seek(16)
+    x = fd.read_into_array(64)
+    assert fd.tell() == 80
+    assert_array_equal(x, np.arange(16, 80, dtype=np.uint8))
+    assert not x.flags.writeable
+    y = fd.read_into_array(-1)
+    assert fd.tell() == 256
+    assert_array_equal(y, np.arange(80, 256, dtype=np.uint8))
+
+    if hasattr(buff, 'getbuffer'):
+        # Read-only arrays are views on the buffer, which therefore
+        # can not be written to while they exist
+        assert np.may_share_memory(x, np.frombuffer(buff.getbuffer(), np.uint8))
+        with pytest.raises(BufferError):
+            buff.write(b'more')
+        del x, y
+        buff.write(b'more')
+
+    buff.seek(0)
+    fd = generic_io.get_file(buff, mode='rw')
+    x = fd.read_into_array(16)
+    assert x.flags.writeable
+    x[0] = 42
+    assert buff.getvalue()[0:1] == b'\0'
+
+
 def test_streams(tree):
     buff = io.BytesIO()
 
@@ -230,6 +408,54 @@ def test_streams(tree):
         ff.tree['science_data'][0] = 42
 
 
+def test_output_stream_buffering():
+    class Writer(object):
+        def __init__(self):
+            self.writes = []
+
+        def write(self, content):
+            self.writes.append(content)
+
+        def flush(self):
+            pass
+
+    tree = _get_small_tree()
+    tree['big'] = np.arange(1 << 18, dtype=np.float64)
+
+    buff = io.BytesIO()
+    asdf.AsdfFile(tree).write_to(buff)
+
+    writer = Writer()
+    asdf.AsdfFile(tree).write_to(writer)
+    writes = [x for x in writer.writes if len(x)]
+    assert b''.join(bytes(x) for x in writes) == buff.getvalue()
+    # The tree, the headers and the small arrays are coalesced, and
+    # the big array is written directly
+    assert len(writes) <= 4
+    assert any(len(bytes(x)) == tree['big'].nbytes for x in writes)
+
+    # Buffering is off unless requested
+    writer = Writer()
+    fd = generic_io.OutputStream(writer)
+    del writer.writes[:]
+    fd.write(b'abc')
+    assert writer.writes == [b'abc']
+
+    writer = Writer()
+    fd = generic_io.OutputStream(writer, buffer_size=8)
+    del writer.writes[:]
+    fd.write(b'abc')
+    fd.write(b'def')
+    assert writer.writes == []
+    fd.write(b'ghi')
+    assert writer.writes == [b'abcdef']
+    fd.write(b'0123456789')
+    assert writer.writes == [b'abcdef', b'ghi', b'0123456789']
+    fd.write(b'x')
+    fd.close()
+    assert writer.writes[-1] == b'x'
+
+
 def test_streams2():
     buff = io.BytesIO(b'\0' * 60)
     buff.seek(0)
@@ -241,6 +467,111 @@ def test_streams2():
     assert len(x) == 60
 
 
+def test_streams_peek_then_read():
+    # Peeking a large amount and then consuming it in small pieces
+    # must not repeatedly copy the remaining buffer.
+    content = b''.join(six.int2byte(i % 256) for i in range(1 << 16))
+    buff = io.BytesIO(content * 16)
+
+    fd = generic_io.InputStream(buff, 'r')
+    assert fd._peek(len(content)) == content
+
+    chunks = []
+    while True:
+        x = fd.read(1000)
+        if not x:
+            break
+        chunks.append(x)
+    assert b''.join(chunks) == content * 16
+
+
+@pytest.mark.skipif(sys.platform.startswith('win'),
+                    reason="os.pipe reads block on Windows")
+def test_pipe_stream(tree):
+    import threading
+
+    buff = io.BytesIO()
+    asdf.AsdfFile(tree).write_to(buff)
+    content = buff.getvalue()
+
+    r, w = os.pipe()
+
+    def writer():
+        with io.open(w, 'wb') as fd:
+            fd.write(content)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        with io.open(r, 'rb') as fd:
+            with asdf.AsdfFile.open(fd) as ff:
+                assert isinstance(ff.blocks._internal_blocks[0]._data,
+                                  np.ndarray)
+                for key, val in tree.items():
+                    assert_array_equal(ff.tree[key], val)
+    finally:
+        thread.join()
+
+
+def _get_delimiter_files(tmpdir, content):
+    path = os.path.join(str(tmpdir), 'delimiter.dat')
+    with open(path, 'wb') as fd:
+        fd.write(content)
+
+    def real_file():
+        return generic_io.get_file(path, mode='r')
+
+    def memory_io():
+        return generic_io.get_file(io.BytesIO(content), mode='r')
+
+    def input_stream():
+        return generic_io.InputStream(io.BytesIO(content), 'r')
+
+    return [real_file, memory_io, input_stream]
+
+
+@pytest.mark.parametrize('nbytes', [1, 3, 7, 10, 4096])
+def test_reader_until(tmpdir, nbytes):
+    from .. import constants
+
+    # Includes near-misses of the end marker, and one that would
+    # match at the end of a read window
+    content = (b'%YAML 1.1\nfoo: ...\n..\n.\n' * 50 +
+               b'bar: baz\n...x\n...\n' + constants.BLOCK_MAGIC + b'\0')
+    end = content.index(b'\n...\n') + 5
+
+    for get_fd in _get_delimiter_files(tmpdir, content):
+        with get_fd() as fd:
+            reader = fd.reader_until(
+                constants.YAML_END_MARKER_REGEX, 7, 'End of YAML marker',
+                include=True)
+            chunks = []
+            while True:
+                x = reader.read(nbytes)
+                if x == b'':
+                    break
+                assert len(x) <= nbytes
+                chunks.append(x)
+            assert b''.join(chunks) == content[:end]
+            assert fd.read(4) == constants.BLOCK_MAGIC
+
+
+def test_read_until_not_found(tmpdir):
+    content = b'abc' * 1000
+
+    for get_fd in _get_delimiter_files(tmpdir, content):
+        with get_fd() as fd:
+            with pytest.raises(ValueError):
+                fd.read_until(b'xyz', 3)
+
+        with get_fd() as fd:
+            assert fd.read_until(b'xyz', 3, exception=False) == content
+
+        with get_fd() as fd:
+            assert fd.read_until(b'cab', 3, include=False) == b'ab'
+            assert not fd.seek_until(b'xyz', 3)
+
+
 @pytest.mark.skipif(sys.platform.startswith('win'),
                     reason="Windows firewall prevents test")
 def test_urlopen(tree, httpserver):
@@ -270,16 +601,16 @@ def test_http_connection(tree, httpserver):
 
     def get_read_fd():
         fd = generic_io.get_file(httpserver.url + "test.asdf")
-        assert isinstance(fd, generic_io.InputStream)
-        # This is to check for a "feature" in Python 3.x that reading zero
-        # bytes from a socket causes it to stop.  We have code in generic_io.py
-        # to workaround it.
+        # The server doesn't support Range requests, so the file is
+        # spooled to a local temporary file
+        assert isinstance(fd, generic_io.RealFile)
+        assert fd.uri == httpserver.url + "test.asdf"
         fd.read(0)
         return fd
 
     with _roundtrip(tree, get_write_fd, get_read_fd) as ff:
         assert len(list(ff.blocks.internal_blocks)) == 2
-        assert not isinstance(next(ff.blocks.internal_blocks)._data, np.core.memmap)
+        assert isinstance(next(ff.blocks.internal_blocks)._data, np.core.memmap)
         assert isinstance(next(ff.blocks.internal_blocks)._data, np.ndarray)
         ff.tree['science_data'][0] == 42
 
@@ -311,6 +642,159 @@ def test_http_connection_range(tree, rhttpserver):
         ff.tree['science_data'][0] == 42
 
 
+def _get_sparse_tree():
+    # Every other array is big enough that skipping over it leaves a
+    # gap too large to coalesce
+    tree = {}
+    for i in range(6):
+        tree['array{0}'.format(i)] = np.arange(
+            (i % 2) * 32768 + 1024, dtype=np.float64) * i
+    return tree
+
+
+def _load_every_other_array(server):
+    tree = _get_sparse_tree()
+    path = os.path.join(server.tmpdir, 'test.asdf')
+    asdf.AsdfFile(tree).write_to(path)
+
+    with asdf.AsdfFile.open(server.url + "test.asdf") as ff:
+        fd = ff._fd
+        assert isinstance(fd, generic_io.HTTPConnection)
+        keys = ['array0', 'array2', 'array4']
+        nreads = fd._nreads
+        ff.blocks.load_blocks(ff.blocks[ff.tree[x]] for x in keys)
+        nreads = fd._nreads - nreads
+        loaded_nreads = fd._nreads
+        for key in keys:
+            assert_array_equal(ff.tree[key], tree[key])
+        assert fd._nreads == loaded_nreads
+        multirange = fd._multirange
+
+    return nreads, multirange
+
+
+@pytest.mark.skipif(sys.platform.startswith('win'),
+                    reason="Windows firewall prevents test")
+def test_http_multirange(mrhttpserver):
+    nreads, multirange = _load_every_other_array(mrhttpserver)
+    # One request for the headers of the blocks found through the
+    # block index, and one for all of the data
+    assert nreads == 2
+    assert multirange
+
+
+@pytest.mark.skipif(sys.platform.startswith('win'),
+                    reason="Windows firewall prevents test")
+def test_http_multirange_fallback(rhttpserver):
+    # This server only understands a single range, so we should fall
+    # back to a request for each range
+    nreads, multirange = _load_every_other_array(rhttpserver)
+    assert not multirange
+    assert nreads > 1
+
+
+@pytest.mark.skipif(sys.platform.startswith('win'),
+                    reason="Windows firewall prevents test")
+def test_http_coalesce_ranges(rhttpserver):
+    tree = {
+        'a': np.arange(8192, dtype=np.float64),
+        'b': np.arange(8192, dtype=np.float64) * 2,
+        'c': np.arange(8192, dtype=np.float64) * 3
+    }
+    path = os.path.join(rhttpserver.tmpdir, 'test.asdf')
+    asdf.AsdfFile(tree).write_to(path)
+
+    with asdf.AsdfFile.open(rhttpserver.url + "test.asdf") as ff:
+        fd = ff._fd
+        nreads = fd._nreads
+        # The gaps between these blocks are only the block headers,
+        # so after reading the header of the middle block (which is
+        # only known from the block index) the data is a single
+        # contiguous range.
+        ff.blocks.load_blocks(ff.blocks[ff.tree[x]] for x in 'abc')
+        assert fd._nreads - nreads == 2
+        assert fd._multirange
+        for key in 'abc':
+            assert_array_equal(ff.tree[key], tree[key])
+
+
+class _DictStoreFile(generic_io.RandomAccessFile):
+    """
+    A toy storage backend that serves files from an in-memory dict,
+    and supports parallel reads.
+    """
+    store = {}
+    reads = []
+
+    def __init__(self, url, mode, uri=None):
+        if mode != 'r':
+            raise ValueError("dictstore files are read-only")
+        self._content = self.store[url]
+        super(_DictStoreFile, self).__init__(
+            io.BytesIO(self._content), mode, uri=uri or url)
+        self._size = len(self._content)
+
+    def can_read_parallel(self):
+        return True
+
+    def read_range(self, offset, size):
+        self.reads.append((offset, size))
+        return self._content[offset:offset + size]
+
+
+@pytest.fixture
+def dictstore_backend():
+    previous = generic_io.register_backend('dictstore', _DictStoreFile)
+    yield
+    if previous is None:
+        generic_io.unregister_backend('dictstore')
+    else:
+        generic_io.register_backend('dictstore', previous)
+
+
+def test_register_backend(dictstore_backend):
+    ext = asdf.AsdfFile({'x': np.arange(5)})
+    buff = io.BytesIO()
+    ext.write_to(buff)
+    _DictStoreFile.store['dictstore://bucket/ext.asdf'] = buff.getvalue()
+
+    tree = _get_small_tree()
+    tree['ref'] = {'$ref': 'ext.asdf#/x'}
+    buff = io.BytesIO()
+    asdf.AsdfFile(tree).write_to(buff, all_array_compression='zlib')
+    _DictStoreFile.store['dictstore://bucket/main.asdf'] = buff.getvalue()
+
+    with asdf.AsdfFile.open('dictstore://bucket/main.asdf') as ff:
+        assert isinstance(ff._fd, _DictStoreFile)
+        blocks = list(ff.blocks.internal_blocks)
+        assert len(blocks) == 2
+
+        del _DictStoreFile.reads[:]
+        ff.blocks.load_blocks(blocks)
+        assert sorted(_DictStoreFile.reads) == sorted(
+            (block.data_offset, block._size) for block in blocks)
+
+        assert_array_equal(ff.tree['science_data'], tree['science_data'])
+        assert_array_equal(ff.tree['not_shared'], tree['not_shared'])
+
+        # References to external files are opened through the
+        # backend as well
+        assert_array_equal(ff.tree['ref'](), np.arange(5))
+        assert 'dictstore://bucket/ext.asdf' in ff._external_asdf_by_uri
+
+    with pytest.raises(ValueError):
+        generic_io.get_file('dictstore://bucket/main.asdf', mode='w')
+
+
+def test_unregister_backend():
+    assert generic_io.register_backend('tmpstore', _DictStoreFile) is None
+    assert (generic_io.register_backend('tmpstore', _DictStoreFile) is
+            _DictStoreFile)
+    assert generic_io.unregister_backend('tmpstore') is _DictStoreFile
+    assert generic_io.unregister_backend('tmpstore') is None
+    assert 'tmpstore' not in generic_io._backends
+
+
 def test_exploded_filesystem(tree, tmpdir):
     path = os.path.join(str(tmpdir), 'test.asdf')
 
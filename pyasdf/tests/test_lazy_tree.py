@@ -0,0 +1,209 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import copy
+import io
+import json
+import os
+import pickle
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import pytest
+
+import six
+
+from jsonschema import ValidationError
+
+from .. import asdf
+from .. import lazy
+from .. import reference
+from .. import tagged
+from .. import util
+from ..tags.core import ndarray
+
+from . import helpers
+
+
+TEST_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def _get_tree():
+    return {
+        'meta': {
+            'exposure': 42.0,
+            'observers': ['a', 'b'],
+            'nested': {'data': np.arange(8, dtype=np.uint8)}
+        },
+        'science_data': np.arange(64, dtype=np.float64).reshape((8, 8)),
+        'list_of_arrays': [np.arange(3), np.arange(4)]
+    }
+
+
+def _open_lazy(tree):
+    buff = io.BytesIO()
+    asdf.AsdfFile(tree).write_to(buff)
+    buff.seek(0)
+    return asdf.AsdfFile.open(buff, lazy_tree=True)
+
+
+def test_lazy_tree():
+    tree = _get_tree()
+
+    with _open_lazy(tree) as ff:
+        assert isinstance(ff.tree, lazy.LazyDict)
+
+        # Nothing has been converted yet
+        raw = dict.__getitem__(ff.tree, 'science_data')
+        assert isinstance(raw, tagged.TaggedDict)
+
+        meta = ff.tree['meta']
+        assert isinstance(meta, lazy.LazyDict)
+        assert meta['exposure'] == 42.0
+        assert isinstance(dict.__getitem__(meta, 'nested'), dict)
+        assert isinstance(
+            dict.__getitem__(ff.tree, 'science_data'), tagged.TaggedDict)
+
+        assert isinstance(ff.tree['science_data'], ndarray.NDArrayType)
+        assert ff.tree['science_data'] is ff.tree['science_data']
+        assert_array_equal(ff.tree['science_data'], tree['science_data'])
+
+        assert isinstance(ff.tree['list_of_arrays'], lazy.LazyList)
+        for x, y in zip(ff.tree['list_of_arrays'], tree['list_of_arrays']):
+            assert isinstance(x, ndarray.NDArrayType)
+            assert_array_equal(x, y)
+
+        helpers.assert_tree_match(tree, ff.tree)
+
+
+def test_lazy_tree_roundtrip():
+    tree = _get_tree()
+
+    with _open_lazy(tree) as ff:
+        ff.tree['meta']['exposure'] = 10.0
+        ff.tree['meta']['observers'].append('c')
+        buff = io.BytesIO()
+        ff.write_to(buff)
+
+    buff.seek(0)
+    with asdf.AsdfFile.open(buff) as ff:
+        assert ff.tree['meta']['exposure'] == 10.0
+        assert ff.tree['meta']['observers'] == ['a', 'b', 'c']
+        assert_array_equal(
+            ff.tree['meta']['nested']['data'], tree['meta']['nested']['data'])
+        assert_array_equal(ff.tree['science_data'], tree['science_data'])
+
+
+def test_lazy_tree_copy():
+    tree = _get_tree()
+
+    with _open_lazy(tree) as ff:
+        tree2 = copy.deepcopy(ff.tree)
+        assert not isinstance(tree2, lazy.LazyNode)
+        assert not isinstance(tree2['meta'], lazy.LazyNode)
+        assert tree2['meta']['observers'] == ['a', 'b']
+
+        ff2 = ff.copy()
+        helpers.assert_tree_match(tree, ff2.tree)
+
+
+def test_lazy_tree_validation():
+    yaml = """
+meta:
+  exposure: 42
+image: !core/ndarray-0.1.0
+  data: [1, 2, 3]
+  datatype: not_a_datatype
+    """
+
+    buff = helpers.yaml_to_asdf(yaml)
+    with pytest.raises(ValidationError):
+        asdf.AsdfFile.open(buff)
+
+    # Invalid subtrees are only detected when they are accessed
+    buff.seek(0)
+    with asdf.AsdfFile.open(buff, lazy_tree=True) as ff:
+        assert ff.tree['meta']['exposure'] == 42
+        with pytest.raises(ValidationError):
+            ff.tree['image']
+
+    # The top level is still validated when the file is opened
+    yaml = """
+fits: This does not look like a FITS file
+    """
+
+    buff = helpers.yaml_to_asdf(yaml)
+    with pytest.raises(ValidationError):
+        asdf.AsdfFile.open(buff, lazy_tree=True)
+
+
+def test_lazy_tree_validation_untyped_tags():
+    class CustomExtension(object):
+        types = []
+        tag_mapping = [('tag:nowhere.org:custom',
+                        'http://nowhere.org/schemas/custom{tag_suffix}')]
+        url_mapping = [('http://nowhere.org/schemas/custom/',
+                        util.filepath_to_url(TEST_DATA_PATH) +
+                        '/{url_suffix}.yaml')]
+
+    # Tagged nodes without a custom type are still validated, and have
+    # their defaults filled in, when they are accessed
+    yaml = """
+valid: !<tag:nowhere.org:custom/default-1.0.0>
+  b: {}
+invalid: !<tag:nowhere.org:custom/default-1.0.0>
+  a: not_an_integer
+    """
+
+    buff = helpers.yaml_to_asdf(yaml)
+    with asdf.AsdfFile.open(buff, lazy_tree=True,
+                            extensions=[CustomExtension()]) as ff:
+        assert ff.tree['valid']['a'] == 42
+        assert ff.tree['valid']['b']['c'] == 82
+        with pytest.raises(ValidationError):
+            ff.tree['invalid']
+
+
+def test_lazy_tree_builtin_access():
+    tree = {'c': 1 + 2j, 'l': [1 + 2j], 'd': {'c': 1 + 2j}}
+
+    def get_tree():
+        return _open_lazy(tree).tree
+
+    def kwargs(**kwargs):
+        return kwargs
+
+    assert isinstance(dict(get_tree().items())['c'], complex)
+    assert isinstance(copy.copy(get_tree())['c'], complex)
+    assert isinstance(pickle.loads(pickle.dumps(get_tree()['d']))['c'],
+                      complex)
+    assert isinstance(([] + get_tree()['l'])[0], complex)
+    assert isinstance(tuple(get_tree()['l'])[0], complex)
+    assert json.loads(json.dumps(
+        get_tree()['d'], default=lambda x: 'converted')) == {'c': 'converted'}
+
+    # Python 2 copies the values of a dict subclass without going
+    # through its methods
+    if six.PY3:
+        assert isinstance(dict(get_tree())['c'], complex)
+        assert isinstance(kwargs(**get_tree())['c'], complex)
+        d = {}
+        d.update(get_tree())
+        assert isinstance(d['c'], complex)
+    else:
+        assert isinstance(dict(get_tree())['c'], tagged.TaggedString)
+
+
+def test_lazy_tree_references():
+    yaml = """
+values: [1, 2, 3]
+ref: {$ref: "#/values"}
+    """
+
+    buff = helpers.yaml_to_asdf(yaml)
+    with asdf.AsdfFile.open(buff, lazy_tree=True) as ff:
+        assert isinstance(ff.tree['ref'], reference.Reference)
+        assert ff.tree['ref']() == [1, 2, 3]
@@ -18,6 +18,8 @@ from .. import block
 from .. import constants
 from .. import generic_io
 from .. import treeutil
+from .. import util
+from .. import yamlutil
 
 
 def _get_small_tree():
@@ -420,6 +422,226 @@ def test_update_delete_first_array(tmpdir):
         assert_array_equal(ff.tree['arrays'][1], tree['arrays'][2])
 
 
+def test_update_serializes_tree_once(tmpdir, monkeypatch):
+    tmpdir = str(tmpdir)
+    path = os.path.join(tmpdir, 'test.asdf')
+
+    tree = _get_update_tree()
+
+    ff = asdf.AsdfFile(tree)
+    ff.write_to(path, pad_blocks=True)
+
+    calls = []
+    dump_tree = yamlutil.dump_tree
+
+    def counting_dump_tree(*args, **kwargs):
+        calls.append(args)
+        return dump_tree(*args, **kwargs)
+
+    monkeypatch.setattr(yamlutil, 'dump_tree', counting_dump_tree)
+
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        ff.tree['arrays'].insert(0, np.arange(32) * 4)
+        ff.tree['extra'] = [0] * 2
+        ff.update()
+
+    assert len(calls) == 1
+
+    with asdf.AsdfFile.open(path) as ff:
+        assert len(ff.tree['arrays']) == 4
+        sources = [x._source for x in ff.tree['arrays']]
+        assert sorted(sources) == [0, 1, 2, 3]
+        assert_array_equal(ff.tree['arrays'][0], np.arange(32) * 4)
+        for x, y in zip(ff.tree['arrays'][1:], tree['arrays']):
+            assert_array_equal(x, y)
+
+    # A value in the tree that looks like a block number placeholder
+    # makes update fall back to serializing the tree again
+    del calls[:]
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        ff.tree['extra'] = {'source': 900000}
+        ff.update()
+
+    assert len(calls) == 2
+
+    with asdf.AsdfFile.open(path) as ff:
+        assert ff.tree['extra'] == {'source': 900000}
+        assert_array_equal(ff.tree['arrays'][0], np.arange(32) * 4)
+        for x, y in zip(ff.tree['arrays'][1:], tree['arrays']):
+            assert_array_equal(x, y)
+
+
+def test_update_only_changed_blocks(tmpdir, monkeypatch):
+    tmpdir = str(tmpdir)
+    path = os.path.join(tmpdir, 'test.asdf')
+
+    tree = _get_update_tree()
+
+    ff = asdf.AsdfFile(tree)
+    ff.write_to(path)
+
+    with open(path, 'rb') as fd:
+        original = fd.read()
+
+    written = []
+    write = block.Block.write
+
+    def counting_write(self, fd):
+        written.append(self)
+        return write(self, fd)
+
+    monkeypatch.setattr(block.Block, 'write', counting_write)
+
+    # Nothing has changed, so nothing is written
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        assert_array_equal(ff.tree['arrays'][0], tree['arrays'][0])
+        ff.update()
+        assert len(written) == 0
+
+    with open(path, 'rb') as fd:
+        assert fd.read() == original
+
+    # A memory-mapped array that was modified is flushed, and only
+    # its checksum is updated
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        ff.tree['arrays'][1][0] = 42
+        ff.update()
+        assert len(written) == 0
+
+    tree['arrays'][1][0] = 42
+    with asdf.AsdfFile.open(path, validate_checksums=True) as ff:
+        for x, y in zip(ff.tree['arrays'], tree['arrays']):
+            assert_array_equal(x, y)
+
+    # A replaced array is the only block that is written
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        ff.tree['arrays'][2] = np.arange(64) * 4
+        ff.update()
+        assert written == [ff.blocks[ff.tree['arrays'][2]]]
+
+    tree['arrays'][2] = np.arange(64) * 4
+    with asdf.AsdfFile.open(path, validate_checksums=True) as ff:
+        for x, y in zip(ff.tree['arrays'], tree['arrays']):
+            assert_array_equal(x, y)
+
+    # So is a block whose compression was changed
+    del written[:]
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        ff.set_array_compression(ff.tree['arrays'][0], 'zlib')
+        ff.update()
+        assert written == [ff.blocks[ff.tree['arrays'][0]]]
+
+    with asdf.AsdfFile.open(path, validate_checksums=True) as ff:
+        assert ff.blocks[ff.tree['arrays'][0]].compression == 'zlib'
+        for x, y in zip(ff.tree['arrays'], tree['arrays']):
+            assert_array_equal(x, y)
+
+
+def test_update_hashes_accessed_blocks(tmpdir, monkeypatch):
+    tmpdir = str(tmpdir)
+    path = os.path.join(tmpdir, 'test.asdf')
+
+    tree = _get_update_tree()
+    asdf.AsdfFile(tree).write_to(path)
+
+    hashed = []
+    calculate_checksum = block.Block._calculate_checksum
+
+    def recording_calculate_checksum(self, data):
+        hashed.append(self)
+        return calculate_checksum(self, data)
+
+    monkeypatch.setattr(
+        block.Block, '_calculate_checksum', recording_calculate_checksum)
+
+    # Only the blocks whose arrays were handed out may have been
+    # modified, so only those are hashed
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        ff.blocks.load_blocks(list(ff.blocks.internal_blocks))
+        ff.tree['arrays'][1][0]
+        ff.update()
+        assert hashed == [ff.blocks[ff.tree['arrays'][1]]]
+
+        # They are hashed again on each update
+        ff.tree['arrays'][1][0] = 42
+        ff.update()
+        assert len(hashed) == 2
+
+    tree['arrays'][1][0] = 42
+    with asdf.AsdfFile.open(path, validate_checksums=True) as ff:
+        for x, y in zip(ff.tree['arrays'], tree['arrays']):
+            assert_array_equal(x, y)
+
+
+def test_update_tree_only(tmpdir, monkeypatch):
+    tmpdir = str(tmpdir)
+    path = os.path.join(tmpdir, 'test.asdf')
+
+    tree = _get_update_tree()
+
+    ff = asdf.AsdfFile(tree)
+    ff.write_to(path, reserve_tree_space=100)
+
+    original_size = os.stat(path).st_size
+
+    calls = []
+    calculate_updated_layout = block.calculate_updated_layout
+
+    def counting_calculate_updated_layout(*args, **kwargs):
+        calls.append(args)
+        return calculate_updated_layout(*args, **kwargs)
+
+    monkeypatch.setattr(
+        block, 'calculate_updated_layout', counting_calculate_updated_layout)
+
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        ff.tree['arrays'][0][0]
+        ff.tree['extra'] = 'x' * 50
+        ff.update()
+
+    assert len(calls) == 0
+    assert os.stat(path).st_size == original_size
+
+    with asdf.AsdfFile.open(path, validate_checksums=True) as ff:
+        assert ff.tree['extra'] == 'x' * 50
+        for x, y in zip(ff.tree['arrays'], tree['arrays']):
+            assert_array_equal(x, y)
+
+    # A shorter tree leaves no trace of the old one
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        del ff.tree['extra']
+        ff.update()
+
+    assert len(calls) == 0
+
+    with asdf.AsdfFile.open(path) as ff:
+        assert 'extra' not in ff.tree
+        for x, y in zip(ff.tree['arrays'], tree['arrays']):
+            assert_array_equal(x, y)
+
+    # A tree that doesn't fit, or a removed block, needs the full update
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        ff.tree['extra'] = 'x' * 200
+        ff.update()
+
+    assert len(calls) == 1
+
+    with asdf.AsdfFile.open(path, mode="rw") as ff:
+        del ff.tree['arrays'][1]
+        ff.update()
+
+    assert len(calls) == 2
+
+    with asdf.AsdfFile.open(path) as ff:
+        assert ff.tree['extra'] == 'x' * 200
+        assert len(ff.blocks) == 2
+        assert_array_equal(ff.tree['arrays'][0], tree['arrays'][0])
+        assert_array_equal(ff.tree['arrays'][1], tree['arrays'][2])
+
+    with pytest.raises(ValueError):
+        asdf.AsdfFile(tree).write_to(path, reserve_tree_space=-1)
+
+
 def test_update_delete_last_array(tmpdir):
     tmpdir = str(tmpdir)
     path = os.path.join(tmpdir, 'test.asdf')
@@ -811,6 +1033,75 @@ def test_copy(tmpdir):
     assert_array_equal(ff2.tree['my_array'], ff2.tree['my_array'])
 
 
+def test_copy_on_write(tmpdir):
+    tmpdir = str(tmpdir)
+    path = os.path.join(tmpdir, 'test.asdf')
+
+    my_array = np.random.rand(8, 8)
+    tree = {'my_array': my_array,
+            'foo': {'bar': 'baz', 'nested': {'list': [1, 2, 3]}}}
+    asdf.AsdfFile(tree).write_to(path)
+
+    with asdf.AsdfFile.open(path) as ff:
+        ff2 = ff.copy()
+
+        # The copy of the array is a private mapping of the same file
+        base = util.get_array_base(ff2.tree['my_array'])
+        assert isinstance(base, np.memmap)
+        assert base.mode == 'c'
+        ff2.tree['my_array'][0, 0] = 42
+        assert ff.tree['my_array'][0, 0] == my_array[0, 0]
+
+        # Neither tree can modify the other
+        ff2.tree['foo']['nested']['list'].append(4)
+        ff.tree['foo']['nested']['new'] = 'value'
+        assert ff.tree['foo']['nested']['list'] == [1, 2, 3]
+        assert 'new' not in ff2.tree['foo']['nested']
+
+        ff3 = asdf.AsdfFile(ff)
+        ff.tree['foo']['bar'] = 'boo'
+        assert ff3.tree['foo']['bar'] == 'baz'
+        assert ff3.tree['foo']['nested']['new'] == 'value'
+        assert_array_equal(ff3.tree['my_array'], my_array)
+
+        buff = io.BytesIO()
+        ff2.write_to(buff)
+
+    buff.seek(0)
+    with asdf.AsdfFile.open(buff) as ff:
+        assert ff.tree['foo']['nested']['list'] == [1, 2, 3, 4]
+        assert ff.tree['my_array'][0, 0] == 42
+        assert_array_equal(ff.tree['my_array'][1:], my_array[1:])
+
+
+def test_copy_keeps_original_tree():
+    tree = {'meta': {'x': 1}, 'list': [1, 2], 'my_array': np.arange(5)}
+    ff = asdf.AsdfFile(tree)
+    root = ff.tree
+    meta = ff.tree['meta']
+    lst = ff.tree['list']
+
+    ff2 = ff.copy()
+    ff3 = asdf.AsdfFile(ff)
+
+    # References held from before the copies still belong to the
+    # original tree, and changes to them don't show in the copies
+    meta['y'] = 2
+    lst.append(3)
+    root['z'] = 3
+    assert ff.tree is root
+    assert ff.tree['meta'] == {'x': 1, 'y': 2}
+    assert ff.tree['list'] == [1, 2, 3]
+    assert ff.tree['z'] == 3
+    for copy in (ff2, ff3):
+        assert copy.tree['meta'] == {'x': 1}
+        assert copy.tree['list'] == [1, 2]
+        assert 'z' not in copy.tree
+
+    ff2.tree['my_array'][0] = 42
+    assert ff.tree['my_array'][0] == 0
+
+
 def test_deferred_block_loading():
     buff = io.BytesIO()
 
@@ -1071,3 +1362,47 @@ def test_dots_but_no_block_index():
     buff.seek(0)
     with asdf.AsdfFile.open(buff) as ff:
         assert len(ff.blocks) == 1
+
+
+def test_scan(tmpdir):
+    path = os.path.join(str(tmpdir), 'test.asdf')
+    tree = _get_small_tree()
+    tree['meta'] = {'exposure': 42.0, 'name': 'foo'}
+    ff = asdf.AsdfFile(tree)
+    ff.set_array_compression(tree['not_shared'], 'zlib')
+    ff.write_to(path)
+
+    with asdf.AsdfFile.open(path) as ff:
+        ff.blocks.finish_reading_internal_blocks()
+        expected_blocks = list(ff.blocks.internal_blocks)
+
+        scanned_tree, blocks = asdf.AsdfFile.scan(path)
+
+        assert type(scanned_tree) is dict
+        assert scanned_tree['meta'] == {'exposure': 42.0, 'name': 'foo'}
+        assert type(scanned_tree['science_data']) is dict
+        assert scanned_tree['science_data']['shape'] == [10]
+        assert 'asdf_library' in scanned_tree
+
+        assert len(blocks) == len(expected_blocks) == 2
+        for summary, block in zip(blocks, expected_blocks):
+            assert summary['offset'] == block.offset
+            assert summary['allocated_size'] == block.allocated
+            assert summary['used_size'] == block._size
+            assert summary['data_size'] == block._data_size
+            assert summary['compression'] == block.compression
+        assert blocks[1]['compression'] == 'zlib'
+        assert blocks[0]['compression'] is None
+        assert blocks[0]['used_size'] == blocks[0]['data_size']
+        assert blocks[0]['used_size'] <= blocks[0]['allocated_size']
+
+    scanned_tree, blocks = asdf.AsdfFile.scan(path, fields=['meta'])
+    assert scanned_tree == {'meta': {'exposure': 42.0, 'name': 'foo'}}
+    assert len(blocks) == 2
+
+    # Streams have no block summary
+    with open(path, 'rb') as fd:
+        scanned_tree, blocks = asdf.AsdfFile.scan(
+            generic_io.InputStream(fd, 'r'), fields=['meta'])
+    assert scanned_tree == {'meta': {'exposure': 42.0, 'name': 'foo'}}
+    assert blocks is None
@@ -0,0 +1,131 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import os
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+import pytest
+
+from jsonschema import ValidationError
+
+from .. import asdf
+
+from . import helpers
+
+
+def _make_files(tmpdir, n):
+    paths = []
+    for i in range(n):
+        path = os.path.join(str(tmpdir), 'test{0}.asdf'.format(i))
+        tree = {
+            'meta': {'index': i},
+            'science_data': np.arange(i + 1, dtype=np.float64)
+        }
+        asdf.AsdfFile(tree).write_to(path)
+        paths.append(path)
+    return paths
+
+
+def test_open_many(tmpdir):
+    paths = _make_files(tmpdir, 6)
+
+    results = asdf.AsdfFile.open_many(paths, workers=2, max_pending=2)
+    for i, ff in enumerate(results):
+        with ff:
+            assert ff.tree['meta']['index'] == i
+            data = ff.tree['science_data']
+            assert_array_equal(data, np.arange(i + 1, dtype=np.float64))
+            # The data comes from the file in this process
+            assert isinstance(
+                next(ff.blocks.internal_blocks)._data, np.core.memmap)
+
+
+def test_open_many_unordered(tmpdir):
+    paths = _make_files(tmpdir, 6)
+
+    indices = []
+    for ff in asdf.AsdfFile.open_many(paths, workers=2, ordered=False):
+        with ff:
+            indices.append(ff.tree['meta']['index'])
+    assert sorted(indices) == list(range(6))
+
+
+def test_open_many_metadata(tmpdir):
+    paths = _make_files(tmpdir, 4)
+
+    results = list(asdf.AsdfFile.open_many(
+        paths, workers=2, mode='metadata', fields=['meta']))
+    assert [tree for tree, blocks in results] == [
+        {'meta': {'index': i}} for i in range(4)]
+    for i, (tree, blocks) in enumerate(results):
+        assert len(blocks) == 1
+        assert blocks[0]['data_size'] == (i + 1) * 8
+
+
+def test_open_many_error(tmpdir):
+    paths = _make_files(tmpdir, 2)
+
+    buff = helpers.yaml_to_asdf("fits: not a FITS file")
+    path = os.path.join(str(tmpdir), 'invalid.asdf')
+    with open(path, 'wb') as fd:
+        fd.write(buff.getvalue())
+    paths.insert(1, path)
+
+    results = asdf.AsdfFile.open_many(paths, workers=2)
+    next(results).close()
+    with pytest.raises(ValidationError):
+        next(results)
+
+
+def test_open_many_yield_errors(tmpdir):
+    paths = _make_files(tmpdir, 2)
+
+    buff = helpers.yaml_to_asdf("fits: not a FITS file")
+    path = os.path.join(str(tmpdir), 'invalid.asdf')
+    with open(path, 'wb') as fd:
+        fd.write(buff.getvalue())
+    paths.insert(1, path)
+    paths.append(os.path.join(str(tmpdir), 'missing.asdf'))
+
+    results = list(asdf.AsdfFile.open_many(paths, workers=2, errors='yield'))
+    assert len(results) == 4
+    assert isinstance(results[1], ValidationError)
+    assert isinstance(results[3], IOError)
+    for i in (0, 2):
+        with results[i] as ff:
+            assert ff.tree['meta']['index'] == i // 2
+
+
+def _unpicklable_scan(path, fields=None, extensions=None):
+    return lambda: path
+
+
+def test_open_many_unpicklable(tmpdir, monkeypatch):
+    paths = _make_files(tmpdir, 2)
+
+    # A result that the worker can't send back is an error, rather
+    # than never arriving
+    monkeypatch.setattr(
+        asdf.AsdfFile, 'scan', staticmethod(_unpicklable_scan))
+    results = list(asdf.AsdfFile.open_many(
+        paths, workers=2, mode='metadata', errors='yield'))
+    assert len(results) == 2
+    assert all(isinstance(x, Exception) for x in results)
+
+    with pytest.raises(Exception):
+        asdf.AsdfFile.open_many(paths, extensions=[lambda: None])
+
+
+def test_open_many_bad_arguments():
+    with pytest.raises(ValueError):
+        asdf.AsdfFile.open_many([], mode='foo')
+
+    with pytest.raises(ValueError):
+        asdf.AsdfFile.open_many([], fields=['meta'])
+
+    with pytest.raises(ValueError):
+        asdf.AsdfFile.open_many([], errors='ignore')
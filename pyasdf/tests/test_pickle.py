@@ -0,0 +1,130 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, division, unicode_literals, print_function
+
+import io
+import multiprocessing
+import os
+import pickle
+
+import numpy as np
+from numpy import ma
+from numpy.testing import assert_array_equal
+
+import pytest
+
+from .. import asdf
+from .. import block
+from ..tags.core.ndarray import NDArrayType
+
+
+def _make_file(tmpdir, **kwargs):
+    path = os.path.join(str(tmpdir), 'test.asdf')
+    tree = {
+        'meta': {'name': 'test'},
+        'x': np.arange(10),
+        'y': np.arange(2000.0).reshape((40, 50)),
+        'masked': ma.array([1, 2, 3], mask=[False, True, False])
+    }
+    asdf.AsdfFile(tree).write_to(path, **kwargs)
+    return path, tree
+
+
+def _sum_array(array):
+    return np.asarray(array).sum()
+
+
+@pytest.mark.parametrize('include_block_index', [True, False])
+def test_pickle_asdffile(tmpdir, include_block_index):
+    path, tree = _make_file(
+        tmpdir, include_block_index=include_block_index)
+
+    with asdf.AsdfFile.open(path) as ff:
+        handle = ff.get_handle()
+        assert handle.tree is None
+        if include_block_index:
+            assert len(handle.block_offsets) == 4
+        else:
+            assert len(handle.block_offsets) == 1
+
+        with pickle.loads(pickle.dumps(ff, 2)) as ff2:
+            assert ff2.tree['meta'] == tree['meta']
+            assert_array_equal(ff2.tree['y'], tree['y'])
+            assert_array_equal(ff2.tree['masked'], tree['masked'])
+
+        handle = ff.get_handle(include_tree=True)
+        assert handle.tree.startswith(b'%YAML')
+        with pickle.loads(pickle.dumps(handle, 2)).open() as ff2:
+            assert_array_equal(ff2.tree['x'], tree['x'])
+
+
+def test_pickle_arrays(tmpdir):
+    path, tree = _make_file(tmpdir, all_array_compression='zlib')
+
+    with asdf.AsdfFile.open(path) as ff:
+        # Loaded arrays are still pickled as references
+        np.asarray(ff.tree['x'])
+        content = pickle.dumps([ff.tree['x'], ff.tree['y']], 2)
+        assert len(content) < tree['y'].nbytes
+
+    x, y = pickle.loads(content)
+    assert isinstance(x, NDArrayType)
+    assert x._asdffile is y._asdffile
+    # The tree isn't read, and only the blocks used are
+    assert len(x._asdffile.tree) == 0
+    assert_array_equal(y, tree['y'])
+    blocks = x._asdffile.blocks._internal_blocks
+    assert len([b for b in blocks if isinstance(b, block.UnloadedBlock)]) == 3
+    x._asdffile.close()
+
+
+def test_pickle_not_from_uri():
+    tree = {'x': np.arange(10), 'inline': [1, 2, 3]}
+    buff = io.BytesIO()
+    asdf.AsdfFile(tree).write_to(buff)
+    buff.seek(0)
+
+    with asdf.AsdfFile.open(buff) as ff:
+        with pytest.raises(ValueError):
+            pickle.dumps(ff, 2)
+
+        # Arrays are pickled as regular arrays
+        x = pickle.loads(pickle.dumps(ff.tree['x'], 2))
+        assert type(x) is np.ndarray
+        assert_array_equal(x, tree['x'])
+
+    with pytest.raises(ValueError):
+        asdf.AsdfFile(tree).get_handle()
+
+
+def test_pickle_after_update(tmpdir):
+    path, tree = _make_file(tmpdir)
+
+    with asdf.AsdfFile.open(path, mode='rw') as ff:
+        ff.tree['meta']['name'] = 'a much longer name ' * 20
+        ff.tree['z'] = np.arange(5)
+        handle = ff.get_handle()
+        # Unwritten changes aren't included
+        with handle.open() as ff2:
+            assert ff2.tree['meta'] == tree['meta']
+
+        ff.update()
+        with pickle.loads(pickle.dumps(ff, 2)) as ff2:
+            assert ff2.tree['meta'] == ff.tree['meta']
+            assert_array_equal(ff2.tree['z'], np.arange(5))
+            assert_array_equal(ff2.tree['y'], tree['y'])
+
+
+def test_pickle_multiprocessing(tmpdir):
+    path, tree = _make_file(tmpdir)
+
+    pool = multiprocessing.Pool(2)
+    try:
+        with asdf.AsdfFile.open(path) as ff:
+            results = pool.map(_sum_array, [ff.tree['x'], ff.tree['y']])
+    finally:
+        pool.terminate()
+        pool.join()
+
+    assert results == [tree['x'].sum(), tree['y'].sum()]
@@ -12,6 +12,7 @@ from numpy.testing import assert_array_equal
 import pytest
 
 from .. import asdf
+from .. import external_cache
 from .. import reference
 from .. import util
 
@@ -248,3 +249,71 @@ def test_internal_reference():
     ff = asdf.AsdfFile()
     content = asdf.AsdfFile()._open_impl(ff, buff, _get_yaml_content=True)
     assert b"{$ref: ''}" in content
+
+
+def test_external_cache(tmpdir, monkeypatch):
+    external_path = os.path.join(str(tmpdir), 'external.asdf')
+    asdf.AsdfFile({'a': np.arange(3)}).write_to(external_path)
+
+    paths = []
+    for i in range(3):
+        path = os.path.join(str(tmpdir), 'source{0}.asdf'.format(i))
+        asdf.AsdfFile({'a': {'$ref': 'external.asdf#/a'}}).write_to(path)
+        paths.append(path)
+
+    opened = []
+    open_ = asdf.AsdfFile.open.__func__
+
+    def counting_open(cls, *args, **kwargs):
+        opened.append(args[0])
+        return open_(cls, *args, **kwargs)
+
+    monkeypatch.setattr(asdf.AsdfFile, 'open', classmethod(counting_open))
+    cache = external_cache.ExternalFileCache(max_size=1)
+    monkeypatch.setattr(external_cache, 'cache', cache)
+
+    # Files opened at the same time share the external file
+    with asdf.AsdfFile.open(paths[0]) as ff0:
+        with asdf.AsdfFile.open(paths[1]) as ff1:
+            assert_array_equal(ff0.tree['a'](), np.arange(3))
+            assert_array_equal(ff1.tree['a'](), np.arange(3))
+            external = ff0.open_external('external.asdf')
+            assert ff1.open_external('external.asdf') is external
+    assert len(opened) == 3
+
+    # It stays open once it is no longer referenced
+    assert len(cache) == 1
+    assert external._fd is not None
+    with asdf.AsdfFile.open(paths[2]) as ff2:
+        assert ff2.open_external('external.asdf') is external
+    assert len(opened) == 4
+
+    # It is opened again once it changes
+    asdf.AsdfFile({'a': np.arange(4)}).write_to(external_path)
+    os.utime(external_path, (0, 0))
+    with asdf.AsdfFile.open(paths[0]) as ff0:
+        assert_array_equal(ff0.tree['a'](), np.arange(4))
+    assert len(opened) == 6
+    assert external._fd is None
+
+    # Files that are evicted, or cleared, are closed once they are
+    # no longer referenced
+    other_path = os.path.join(str(tmpdir), 'other.asdf')
+    asdf.AsdfFile({'a': np.arange(5)}).write_to(other_path)
+    with asdf.AsdfFile.open(paths[0]) as ff0:
+        other = ff0.open_external('other.asdf')
+        with asdf.AsdfFile.open(paths[1]) as ff1:
+            external = ff1.open_external('external.asdf')
+            assert len(cache) == 2
+        assert len(cache) == 1
+        assert external._fd is None
+    assert len(cache) == 1
+    assert other._fd is not None
+
+    with asdf.AsdfFile.open(paths[0]) as ff0:
+        external = ff0.open_external('external.asdf')
+        cache.clear()
+        assert len(cache) == 0
+        assert other._fd is None
+        assert external._fd is not None
+    assert external._fd is None
@@ -28,8 +28,11 @@ from .. import asdftypes
 from .. import block
 from .. import resolver
 from .. import schema
+from .. import schema_compiler
+from .. import tagged
 from .. import treeutil
 from .. import util
+from .. import yamlutil
 
 from . import helpers
 
@@ -375,6 +378,97 @@ custom: !<tag:nowhere.org:custom/default-1.0.0>
         assert 'c' not in ff.tree['custom']['b']
 
 
+def test_compiled_schemas():
+    # Make sure that all of the schemas can be compiled
+    ff = asdf.AsdfFile()
+    compiler = schema_compiler.get_compiler(
+        ff.url_mapping, schema._get_validators(ff))
+
+    src = os.path.join(os.path.dirname(__file__), '../schemas/stsci.edu')
+    for root, dirs, files in os.walk(src):
+        for fname in files:
+            if not fname.endswith('.yaml'):
+                continue
+            path = os.path.relpath(os.path.join(root, fname[:-5]), src)
+            url = 'http://stsci.edu/schemas/' + path.replace(os.sep, '/')
+            assert compiler.get_function(url) is not None, url
+
+
+def test_compiled_validation(monkeypatch):
+    def ndarray(data):
+        return tagged.tag_object(
+            'tag:stsci.edu:asdf/core/ndarray-0.1.0', {'data': data})
+
+    valid = [
+        {'name': 'a'},
+        {'name': 'a', 'count': 9, 'ratio': 2.5, 'kind': 'b',
+         'items': [1, {'value': 2}], 'pair': [1, 'x'], 'either': 1.5,
+         'not_null': 0, 'array': ndarray([1, 2, 3]), 'x_flag': True,
+         'nested': {'name': 'b'}},
+        {'name': 'a', 'nested': {'$ref': 'other.asdf#/'}}
+    ]
+    invalid = [
+        {},
+        {'name': 'ABC'},
+        {'name': 'abcdefghi'},
+        {'count': 1},
+        {'name': 'a', 'count': 10},
+        {'name': 'a', 'count': -1},
+        {'name': 'a', 'count': True},
+        {'name': 'a', 'ratio': 1.2},
+        {'name': 'a', 'kind': 'c'},
+        {'name': 'a', 'items': []},
+        {'name': 'a', 'items': [1, 1]},
+        {'name': 'a', 'items': [{}]},
+        {'name': 'a', 'pair': [1, 'x', 2]},
+        {'name': 'a', 'pair': ['x']},
+        {'name': 'a', 'either': 1},
+        {'name': 'a', 'not_null': None},
+        {'name': 'a', 'x_flag': 1},
+        {'name': 'a', 'other': 1},
+        {'name': 'a', 'array': ndarray([[1, 2], [3, 4]])},
+        {'name': 'a', 'array': ndarray([1.5, 2.5])},
+        {'name': 'a', 'nested': {'name': 'B'}}
+    ]
+
+    ff = asdf.AsdfFile(extensions=[CustomExtension()])
+    validators = schema._get_validators(ff)
+
+    calls = []
+    _validate = schema._validate
+
+    def counting_validate(*args, **kwargs):
+        calls.append(args)
+        return _validate(*args, **kwargs)
+
+    monkeypatch.setattr(schema, '_validate', counting_validate)
+
+    for instance in valid + invalid:
+        tree = tagged.tag_object('tag:nowhere.org:custom/compiled-1.0.0',
+                                 instance)
+        is_valid = schema_compiler.is_valid(tree, ff, validators)
+        if instance in valid:
+            assert is_valid, instance
+
+        # The compiled schemas give the same result as jsonschema
+        try:
+            _validate(tree, ff)
+        except ValidationError:
+            assert not is_valid, instance
+        else:
+            assert is_valid, instance
+
+        # jsonschema is only used to report the errors
+        del calls[:]
+        if is_valid:
+            schema.validate(tree, ff)
+            assert len(calls) == 0
+        else:
+            with pytest.raises(ValidationError):
+                schema.validate(tree, ff)
+            assert len(calls) == 1
+
+
 def test_references_in_schema():
     r = resolver.Resolver(CustomExtension().url_mapping, 'url')
     s = schema.load_schema(
@@ -408,6 +502,129 @@ def test_large_literals():
         print(buff.getvalue())
 
 
+def test_write_validate(monkeypatch):
+    ff = asdf.AsdfFile({'data': np.arange(8)})
+
+    calls = []
+    validate = schema.validate
+
+    def counting_validate(*args, **kwargs):
+        calls.append(args)
+        return validate(*args, **kwargs)
+
+    monkeypatch.setattr(schema, 'validate', counting_validate)
+
+    buff = io.BytesIO()
+    ff.write_to(buff)
+    assert len(calls) == 1
+
+    # An unchanged tree isn't validated again, but is still formatted
+    # in the same way
+    for level in ['full', 'structure', 'none']:
+        buff2 = io.BytesIO()
+        ff.write_to(buff2, validate=level)
+        assert buff2.getvalue() == buff.getvalue()
+    assert len(calls) == 1
+
+    ff.tree['extra'] = 42
+    ff.write_to(io.BytesIO())
+    assert len(calls) == 2
+
+    # Invalid below the top level
+    ff.tree['extra'] = tagged.tag_object(
+        'tag:stsci.edu:asdf/core/ndarray-0.1.0',
+        {'data': [0, 1, 2], 'datatype': 'not_a_datatype'})
+    with pytest.raises(ValidationError):
+        ff.write_to(io.BytesIO())
+    ff.write_to(io.BytesIO(), validate='structure')
+    ff.write_to(io.BytesIO(), validate='none')
+
+    # Invalid at the top level
+    del ff.tree['extra']
+    ff.tree['fits'] = 'This does not look like a FITS file'
+    with pytest.raises(ValidationError):
+        ff.write_to(io.BytesIO(), validate='structure')
+    ff.write_to(io.BytesIO(), validate='none')
+
+    with pytest.raises(ValueError):
+        ff.write_to(io.BytesIO(), validate='some')
+
+
+def test_validation_cache(monkeypatch):
+    validated = []
+    get_function = schema_compiler.SchemaCompiler.get_function
+
+    def recording_get_function(self, url):
+        function = get_function(self, url)
+
+        def recording_function(instance, validator):
+            validated.append(instance._tag)
+            return function(instance, validator)
+        return recording_function
+
+    monkeypatch.setattr(schema_compiler.SchemaCompiler, 'get_function',
+                        recording_get_function)
+
+    ff = asdf.AsdfFile({'a': np.arange(3), 'b': np.arange(4)})
+    ff.write_to(io.BytesIO())
+    del validated[:]
+
+    # Only the tree itself and the array that changed are validated
+    # again, since the other array is known to be valid
+    ff.tree['b'] = np.arange(5)
+    buff = io.BytesIO()
+    ff.write_to(buff)
+    assert sorted(validated) == [
+        'tag:stsci.edu:asdf/core/asdf-0.1.0',
+        'tag:stsci.edu:asdf/core/ndarray-0.1.0']
+
+    # The styles of the subtrees that are skipped are still applied
+    buff2 = io.BytesIO()
+    asdf.AsdfFile({'a': ff.tree['a'], 'b': ff.tree['b']}).write_to(buff2)
+    assert buff.getvalue() == buff2.getvalue()
+
+
+def test_tagged_tree_cache():
+    ff = asdf.AsdfFile()
+    cache = yamlutil.TaggedTreeCache()
+    meta = {'x': [1, 2]}
+    tree = {'meta': meta, 'data': np.arange(3), 'other': {'y': 'z'}}
+
+    tagged_tree = cache.convert(tree, ff)
+    assert cache.validated is None
+    cache.set_validated(ff)
+    assert cache.validated == 'full'
+
+    # An unchanged tree gives the same tagged tree
+    assert cache.convert(tree, ff) is tagged_tree
+    assert cache.validated == 'full'
+
+    # Only the parts that changed, and the nodes above them, are
+    # converted again and no longer known to be valid
+    meta['x'].append(3)
+    tagged_tree2 = cache.convert(tree, ff)
+    assert tagged_tree2 is not tagged_tree
+    assert tagged_tree2['meta'] is not tagged_tree['meta']
+    assert tagged_tree2['data'] is tagged_tree['data']
+    assert tagged_tree2['other'] is tagged_tree['other']
+    assert cache.validated is None
+    assert set(cache.valid_subtrees) == set(
+        [id(tagged_tree['data']), id(tagged_tree['other'])])
+    assert (cache.valid_subtrees[id(tagged_tree['data'])] ==
+            'http://stsci.edu/schemas/asdf/core/ndarray-0.1.0')
+
+    cache.set_validated(ff, 'structure')
+    assert cache.validated == 'structure'
+    cache.set_validated(ff)
+    assert cache.validated == 'full'
+
+    # A value that is equal, but of another type, is a change
+    meta['x'][0] = 1.0
+    tagged_tree3 = cache.convert(tree, ff)
+    assert tagged_tree3['meta'] is not tagged_tree2['meta']
+    assert cache.validated is None
+
+
 @pytest.mark.skipif('not HAS_ASTROPY')
 def test_type_missing_dependencies():
     from astropy.tests.helper import catch_warnings
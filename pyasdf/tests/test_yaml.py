@@ -186,3 +186,29 @@ def test_yaml_nan_inf():
         assert np.isnan(ff.tree['a'])
         assert np.isinf(ff.tree['b'])
         assert np.isinf(ff.tree['c'])
+
+
+def test_load_fields():
+    from .. import yamlutil
+
+    # The pure Python loader, unlike the libyaml-based one, can stop
+    # parsing once the fields are found.  The content after them
+    # is not valid YAML.
+    class Loader(yaml.SafeLoader):
+        ctx = asdf.AsdfFile()
+
+    content = b"""%YAML 1.1
+--- !<tag:stsci.edu:asdf/core/asdf-0.1.0>
+a: 1
+b: {c: [1, 2]}
+d: [unterminated
+"""
+
+    tree = yamlutil._load_fields(Loader(io.BytesIO(content)), ['b', 'a'])
+    assert isinstance(tree, tagged.TaggedDict)
+    assert tree._tag == 'tag:stsci.edu:asdf/core/asdf-0.1.0'
+    assert tree.data == {'a': 1, 'b': {'c': [1, 2]}}
+
+    buff = helpers.yaml_to_asdf("a: 1\nb: {c: [1, 2]}\nd: 4")
+    tree, blocks = asdf.AsdfFile.scan(buff, fields=['a', 'b'])
+    assert tree == {'a': 1, 'b': {'c': [1, 2]}}
@@ -3,6 +3,8 @@
 
 from __future__ import absolute_import, division, unicode_literals, print_function
 
+import copy
+
 import numpy as np
 
 import six
@@ -254,7 +256,395 @@ def tagged_tree_to_custom_tree(tree, ctx):
     return treeutil.walk_and_modify(tree, walker)
 
 
-def load_tree(stream, ctx):
+def _same_tagged(a, b):
+    # Whether two tagged trees are the same, down to the types of
+    # their values (unlike ``==``, which takes ``1``, ``1.0`` and
+    # ``True`` to be the same)
+    if a is b:
+        return True
+    if type(a) is not type(b) or getattr(a, '_tag', None) != getattr(
+            b, '_tag', None):
+        return False
+    if isinstance(a, dict):
+        if len(a) != len(b):
+            return False
+        for key, value in six.iteritems(a):
+            if key not in b or not _same_tagged(value, b[key]):
+                return False
+        return True
+    elif isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(
+            _same_tagged(x, y) for x, y in zip(a, b))
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+
+def _has_default_conversion(tag_type):
+    # Whether a custom type is converted to a tagged tree from its
+    # items alone, by the default `AsdfType.to_tree`
+    from .asdftypes import AsdfType
+
+    return (
+        tag_type.to_tree.__func__ is AsdfType.to_tree.__func__ and
+        tag_type.to_tree_tagged.__func__ is AsdfType.to_tree_tagged.__func__)
+
+
+class _CacheEntry(object):
+    __slots__ = ('node', 'tagged', 'valid', 'schema')
+
+    def __init__(self, node, tagged):
+        self.node = node
+        self.tagged = tagged
+        # Whether the tagged subtree was validated in full, and the
+        # schema of its tag
+        self.valid = False
+        self.schema = None
+
+
+class TaggedTreeCache(object):
+    """
+    Converts trees to tagged trees, like `custom_tree_to_tagged_tree`,
+    reusing the tagged nodes of the previous conversion for the parts
+    of the tree that are the same as before, and keeps track of which
+    of them were found to be valid.
+
+    The dicts and lists of the tree are matched up with those of the
+    previous conversion by identity.  One whose values are the same
+    objects as before, and unchanged themselves, gets the same tagged
+    node as before without being converted again.  Anything else,
+    including the values of custom types (which may have changed in
+    place), is converted, but the tagged node from before is still
+    used if the result is the same, down to the types of its values.
+
+    Since the tagged nodes are shared between conversions, the tagged
+    trees returned must not be modified, other than by validation
+    assigning styles to them.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._pending = []
+        self._version_string = None
+        self._root = None
+        self._structure_validated = None
+        self.valid_subtrees = {}
+
+    def convert(self, tree, ctx):
+        """
+        Convert a tree to a tagged tree.
+
+        Afterwards, `valid_subtrees` maps the ``id`` of each subtree of
+        the result that is known to be valid to the URL of the schema
+        of its tag (or `None` for the subtrees that aren't tagged).
+
+        Parameters
+        ----------
+        tree : object
+            Tree of objects, possibly containing custom data types.
+
+        ctx : AsdfFile
+            The file the tree belongs to.
+
+        Returns
+        -------
+        tagged_tree : tagged tree
+        """
+        version_string = ctx.version_string
+        if version_string != self._version_string:
+            # The types and schemas are different for each version
+            self._entries = {}
+            self._version_string = version_string
+
+        entries = {}
+        valid_subtrees = {}
+        pending = []
+        self._root = self._convert(
+            tree, ctx, entries, valid_subtrees, pending)
+        self._entries = entries
+        self._pending = pending
+        self.valid_subtrees = valid_subtrees
+        return self._root
+
+    def _convert(self, tree, ctx, entries, valid_subtrees, pending):
+        # Converts a tree, reusing the entries of the last conversion.
+        # The entries of the result are added to ``entries``, the
+        # subtrees known to be valid to ``valid_subtrees``, and the
+        # entries that aren't to ``pending``.
+        type_index = ctx.type_index
+        version_string = ctx.version_string
+        old_entries = self._entries
+        ancestors = set()
+        tag_types = {}
+        missing = object()
+
+        def get_tag_type(node):
+            cls = type(node)
+            if cls not in tag_types:
+                tag_type = type_index.from_custom_type(cls, version_string)
+                tag_types[cls] = (
+                    tag_type,
+                    tag_type is None or _has_default_conversion(tag_type))
+            return tag_types[cls]
+
+        def get_entry(node):
+            entry = old_entries.get(id(node))
+            if entry is not None and entry.node is node:
+                return entry
+            return None
+
+        def add_entry(entry):
+            entries[id(entry.node)] = entry
+            if entry.valid:
+                valid_subtrees[id(entry.tagged)] = entry.schema
+            else:
+                pending.append(entry)
+            return entry.tagged
+
+        def add_result(node, result):
+            # Keep the tagged node from before if it's the same
+            entry = get_entry(node)
+            if entry is None or not _same_tagged(result, entry.tagged):
+                entry = _CacheEntry(node, result)
+            return add_entry(entry)
+
+        def convert(node):
+            if isinstance(node, dict):
+                is_dict = True
+            elif isinstance(node, (list, tuple)):
+                is_dict = False
+            else:
+                tag_type, _ = get_tag_type(node)
+                if tag_type is None:
+                    return node
+                return add_result(node, tag_type.to_tree_tagged(node, ctx))
+
+            # A cycle is left as it is, like `treeutil.walk_and_modify`
+            # does
+            if id(node) in ancestors:
+                return node
+            ancestors.add(id(node))
+            if is_dict:
+                values = [(key, convert(val))
+                          for key, val in six.iteritems(node)]
+                values = [(key, val) for key, val in values if val is not None]
+            else:
+                values = [convert(val) for val in node]
+            ancestors.discard(id(node))
+
+            tag_type, default_conversion = get_tag_type(node)
+            entry = get_entry(node)
+            if entry is not None and default_conversion:
+                old = entry.tagged
+                if isinstance(old, tagged.Tagged):
+                    old = old.data
+                if is_dict:
+                    same = len(old) == len(values) and all(
+                        old.get(key, missing) is val for key, val in values)
+                else:
+                    same = len(old) == len(values) and all(
+                        x is y for x, y in zip(old, values))
+                if same:
+                    return add_entry(entry)
+
+            if is_dict:
+                result = node.__class__()
+                for key, val in values:
+                    result[key] = val
+            else:
+                result = node.__class__(values)
+            if hasattr(node, '_tag'):
+                result = tagged.tag_object(node._tag, result)
+            if tag_type is not None:
+                result = tag_type.to_tree_tagged(result, ctx)
+            return add_result(node, result)
+
+        return convert(tree)
+
+    def append(self, parent, node, ctx, validate):
+        """
+        Convert ``node``, which was appended to the list ``parent``
+        after the last conversion, and append it to the tagged list
+        that ``parent`` was converted to, once it passes ``validate``.
+
+        This is only done when that tagged list was found to be valid,
+        so that it stays valid, along with the tagged nodes above it,
+        without validating any of its other items again.  It is up to
+        the caller to make sure that the schemas constrain the items
+        of ``parent`` only one at a time, as they do for the history.
+
+        Parameters
+        ----------
+        parent : list
+            The list that ``node`` was appended to.
+
+        node : object
+            The new item of ``parent``.
+
+        ctx : AsdfFile
+            The file the tree belongs to.
+
+        validate : callable
+            Called with the tagged node that ``node`` is converted to,
+            and raises an exception if it isn't valid.
+
+        Returns
+        -------
+        appended : bool
+            `False` when the tagged list of ``parent`` isn't known to
+            be valid, in which case nothing is done.
+        """
+        entry = self._entries.get(id(parent))
+        if (ctx.version_string != self._version_string or
+                entry is None or entry.node is not parent or
+                not entry.valid):
+            return False
+        tagged_parent = entry.tagged
+        if isinstance(tagged_parent, tagged.Tagged):
+            tagged_parent = tagged_parent.data
+
+        # The entries of the new node are added to those of the last
+        # conversion, so that the next conversion reuses them
+        pending = []
+        tagged_node = self._convert(
+            node, ctx, self._entries, self.valid_subtrees, pending)
+        validate(tagged_node)
+        self._set_valid(pending, ctx)
+        tagged_parent.append(tagged_node)
+        return True
+
+    @property
+    def validated(self):
+        """
+        How much of the tree from the last conversion is known to be
+        valid: ``'full'``, ``'structure'`` or `None`.
+        """
+        if id(self._root) in self.valid_subtrees:
+            return 'full'
+        elif (self._root is not None and
+              self._root is self._structure_validated):
+            return 'structure'
+        return None
+
+    def set_validated(self, ctx, validate='full'):
+        """
+        Record that the tree from the last conversion was found to be
+        valid, either in ``'full'`` or only its ``'structure'``.
+        """
+        if validate == 'full':
+            self._set_valid(self._pending, ctx)
+            self._pending = []
+        else:
+            self._structure_validated = self._root
+
+    def _set_valid(self, entries, ctx):
+        for entry in entries:
+            entry.valid = True
+            tag = getattr(entry.tagged, '_tag', None)
+            if tag is not None:
+                entry.schema = ctx.tag_to_schema_resolver(tag)
+            self.valid_subtrees[id(entry.tagged)] = entry.schema
+
+
+def _copy_tagged_tree(tree):
+    # Copies the containers of a tagged tree from a `TaggedTreeCache`,
+    # so that the copy may be modified.  Nodes that appear more than
+    # once (including in cycles) are copied once, so the copy has the
+    # same shape, and the styles that validation assigned to the tagged
+    # containers are kept.
+    copies = {}
+
+    def copy_node(node):
+        if not isinstance(node, (dict, list, tuple)):
+            return node
+        if id(node) in copies:
+            return copies[id(node)]
+
+        if isinstance(node, (tagged.TaggedDict, tagged.TaggedList)):
+            result = copy.copy(node)
+            result.data = node.data.__class__()
+            copies[id(node)] = result
+            copy_into(node.data, result.data)
+        elif isinstance(node, tuple):
+            # Only reachable from itself through a list or dict, which
+            # then refers to the original
+            copies[id(node)] = node
+            result = copies[id(node)] = node.__class__(
+                [copy_node(val) for val in node])
+        else:
+            result = copies[id(node)] = node.__class__()
+            copy_into(node, result)
+        return result
+
+    def copy_into(node, result):
+        if isinstance(node, dict):
+            for key, val in six.iteritems(node):
+                result[key] = copy_node(val)
+        else:
+            result.extend(copy_node(val) for val in node)
+
+    return copy_node(tree)
+
+
+def _iter_top_level_nodes(loader):
+    # Yields the tag of the top-level mapping, and then its entries
+    # as (key, value) node pairs.  With the pure Python loader, the
+    # entries are composed one at a time, so the caller may stop
+    # parsing early.  The libyaml-based loader can only compose the
+    # document as a whole.
+    if not hasattr(loader, 'compose_node'):
+        node = loader.get_single_node()
+        yield node
+        if isinstance(node, yaml.MappingNode):
+            for key, value in node.value:
+                yield key, value
+        return
+
+    loader.get_event()
+    if loader.check_event(yaml.StreamEndEvent):
+        yield None
+        return
+    loader.get_event()
+    if not loader.check_event(yaml.MappingStartEvent):
+        yield loader.compose_node(None, None)
+        return
+    yield loader.get_event()
+    while not loader.check_event(yaml.MappingEndEvent):
+        key = loader.compose_node(None, None)
+        yield key, loader.compose_node(None, None)
+
+
+def _load_fields(loader, fields):
+    # Constructs only the requested entries of the top-level mapping
+    fields = set(fields)
+    nodes = _iter_top_level_nodes(loader)
+
+    # The root is either a node, or the event that starts the
+    # top-level mapping
+    root = next(nodes)
+    if root is None:
+        return None
+    elif (isinstance(root, yaml.Node) and
+          not isinstance(root, yaml.MappingNode)):
+        return loader.construct_document(root)
+
+    tree = {}
+    for key, value in nodes:
+        key = loader.construct_document(key)
+        if key in fields:
+            tree[key] = loader.construct_document(value)
+            fields.discard(key)
+            if not len(fields):
+                break
+
+    tag = root.tag
+    if tag is not None and tag != loader.DEFAULT_MAPPING_TAG:
+        tag = loader.ctx.type_index.fix_yaml_tag(tag)
+        tree = tagged.tag_object(tag, tree)
+    return tree
+
+
+def load_tree(stream, ctx, fields=None):
     """
     Load YAML, returning a tree of objects.
 
@@ -262,15 +652,27 @@ def load_tree(stream, ctx):
     ----------
     stream : readable file-like object
         Stream containing the raw YAML content.
+
+    fields : list of str, optional
+        When provided, only these keys of the top-level mapping are
+        loaded.  Where the YAML parser supports it, parsing stops as
+        soon as all of them have been found.
     """
     class AsdfLoaderTmp(AsdfLoader):
         pass
     AsdfLoaderTmp.ctx = ctx
 
-    return yaml.load(stream, Loader=AsdfLoaderTmp)
+    if fields is None:
+        return yaml.load(stream, Loader=AsdfLoaderTmp)
+
+    loader = AsdfLoaderTmp(stream)
+    try:
+        return _load_fields(loader, fields)
+    finally:
+        loader.dispose()
 
 
-def dump_tree(tree, fd, ctx):
+def dump_tree(tree, fd, ctx, validate='full'):
     """
     Dump a tree of objects, possibly containing custom types, to YAML.
 
@@ -284,6 +686,10 @@ def dump_tree(tree, fd, ctx):
 
     ctx : Context
         The writing context.
+
+    validate : str, optional
+        How much of the tree to validate: ``full`` (default),
+        ``structure`` or ``none``.  See `AsdfFile.write_to`.
     """
     class AsdfDumperTmp(AsdfDumper):
         pass
@@ -296,8 +702,10 @@ def dump_tree(tree, fd, ctx):
         if tag.strip():
             tags = {'!': tag}
 
-    tree = custom_tree_to_tagged_tree(tree, ctx)
-    schema.validate(tree, ctx)
+    tree = ctx._validate(tree, validate)
+    # The tagged tree is shared with the validation cache of the file,
+    # so the defaults are removed from a copy
+    tree = _copy_tagged_tree(tree)
     schema.remove_defaults(tree, ctx)
 
     yaml_version = tuple(